@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+JsonUtils.extract_json_from_text 的微基准测试。
+构造约4k token、带大量括号的模型响应，对比旧的逐个括号向后扫描实现与当前的单次扫描实现；
+并在一组需要修复的畸形响应（尾部逗号、单引号、后面跟着其他JSON值）上检查两者提取的结果是否一致；
+另外检查嵌套极深或从不闭合的输入不会使解析抛出异常，并测量只有括号、没有JSON的说明文字的耗时。
+
+用法:
+    python benchmarks/bench_json_extract.py [--repeat 20] [--pairs 40]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.json_utils import JsonUtils
+
+
+def legacy_extract_json_from_text(text):
+    """旧实现中的候选查找部分：从每个括号向后扫描匹配括号，再按长度排序逐个尝试。"""
+    json_candidates = []
+    for opener, closer in (('{', '}'), ('[', ']')):
+        open_positions = [pos for pos, char in enumerate(text) if char == opener]
+        for start_pos in open_positions:
+            depth = 0
+            for i in range(start_pos, len(text)):
+                if text[i] == opener:
+                    depth += 1
+                elif text[i] == closer:
+                    depth -= 1
+                    if depth == 0:
+                        json_candidates.append(text[start_pos:i + 1])
+                        break
+    json_candidates.sort(key=len, reverse=True)
+    for candidate in json_candidates:
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            fixed = JsonUtils.fix_json_format(candidate)
+            if fixed:
+                return fixed
+    return None
+
+
+def build_response(num_pairs, seed=0):
+    """构造一段前后夹杂说明文字、引用编号和未闭合括号的QA数组响应。"""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(num_pairs):
+        pairs.append({
+            "question": f"指南第{i}条推荐 [{rng.randint(1, 99)}] 适用于哪些患者（{{分级: {rng.choice('ABC')}}}）？",
+            "answer": f"根据研究 [{rng.randint(1, 99)}][{rng.randint(1, 99)}]，对于 GCS ≤ 8 的重症卒中患者，"
+                      f"建议在 {rng.randint(1, 48)} 小时内完成评估 (Class {rng.choice(['I', 'IIa', 'IIb'])}, "
+                      f"Level {rng.choice('ABC')})。参见表 [{i}] 与 {{附录}}。"
+        })
+    preamble = "以下是根据文档生成的问答对 [见下方]。说明：括号 [ 与 { 在正文中也可能出现 (例如 [1], {注})。\n"
+    epilogue = "\n以上问答对覆盖了 [诊断]、[治疗] 和 {预后} 等方面 [未闭合的括号"
+    return preamble + json.dumps(pairs, ensure_ascii=False, indent=2) + epilogue
+
+
+# 需要修复的畸形响应：(名称, 响应文本)。旧实现从最长的候选开始修复，能保留全部问答对
+MALFORMED_CASES = [
+    ("尾部逗号的数组", '以下是问答对：[{"question":"a","answer":"b"},{"question":"c","answer":"d"},] 完毕'),
+    ("单引号数组后跟对象", "结果如下 [{'question': 'a', 'answer': 'b'}, {'question': 'c', 'answer': 'd'}] {\"note\": 1}"),
+    ("qa_pairs尾部逗号后跟对象",
+     '结果: {"qa_pairs":[{"question":"a","answer":"b"},{"question":"c","answer":"d"},]} {"done": true}'),
+    ("正确数组后跟对象", '结果: [{"question":"a","answer":"b"},{"question":"c","answer":"d"}] {"done": true}'),
+]
+
+
+def check_malformed():
+    """比较两种实现在畸形响应上解析出的结果，返回结果不一致的用例名称。"""
+    mismatches = []
+    for name, text in MALFORMED_CASES:
+        results = []
+        for func in (legacy_extract_json_from_text, JsonUtils.extract_json_from_text):
+            extracted = func(text)
+            results.append(JsonUtils.parse_json(extracted) if extracted else None)
+        same = results[0] == results[1]
+        print(f"{name:<24} 一致: {same}, 结果: {json.dumps(results[1], ensure_ascii=False)}")
+        if not same:
+            mismatches.append(name)
+    return mismatches
+
+
+# 嵌套极深或从不闭合的输入：(名称, 响应文本)。解析失败时应返回空字典，而不是抛出RecursionError
+DEGENERATE_CASES = [
+    ("从不闭合的深层嵌套", "Here: " + "[" * 1500),
+    ("闭合的深层嵌套", "Here: " + "[" * 1500 + "]" * 1500),
+    ("整个响应为深层嵌套", "[" * 1500 + "]" * 1500),
+    ("深层嵌套的对象", 'Here: ' + '{"a":' * 1500 + '1' + '}' * 1500),
+]
+
+
+def check_degenerate():
+    """在深层嵌套的输入上调用safe_parse_json，返回抛出异常或没有返回空字典的用例名称。"""
+    failures = []
+    for name, text in DEGENERATE_CASES:
+        try:
+            # safe_parse_json会打印解析错误，这里不需要
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = JsonUtils.safe_parse_json(text)
+            ok = result == {}
+            detail = json.dumps(result)[:40]
+        except Exception as e:
+            ok = False
+            detail = type(e).__name__
+        print(f"{name:<24} 通过: {ok}, 结果: {detail}")
+        if not ok:
+            failures.append(name)
+    return failures
+
+
+def build_prose(repeat=400):
+    """构造只有引用编号、注释括号，没有JSON的说明文字。"""
+    return "见[1]、[2]（{注}）以及[表3]，详见 {附录} 与 [未闭合 " * repeat
+
+
+def timed(func, text, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="extract_json_from_text 微基准测试")
+    parser.add_argument("--repeat", type=int, default=20, help="每种实现重复次数，取最快一次 (默认: 20)")
+    parser.add_argument("--pairs", type=int, default=40, help="响应中的QA对数量 (默认: 40，约4k token)")
+    args = parser.parse_args()
+
+    text = build_response(args.pairs)
+    brackets = sum(text.count(c) for c in '{}[]')
+    print(f"响应长度: {len(text)} 字符, 括号数: {brackets}")
+
+    legacy_time, legacy_result = timed(legacy_extract_json_from_text, text, args.repeat)
+    current_time, current_result = timed(JsonUtils.extract_json_from_text, text, args.repeat)
+
+    same = json.loads(legacy_result) == json.loads(current_result)
+    print(f"旧实现:   {legacy_time * 1000:8.2f} ms")
+    print(f"单次扫描: {current_time * 1000:8.2f} ms")
+    print(f"加速比:   {legacy_time / max(current_time, 1e-9):8.1f}x, 结果一致: {same}")
+
+    prose = build_prose()
+    legacy_time, _ = timed(legacy_extract_json_from_text, prose, args.repeat)
+    current_time, _ = timed(JsonUtils.extract_json_from_text, prose, args.repeat)
+    print(f"\n括号密集的说明文字（{len(prose)} 字符，无JSON）:")
+    print(f"旧实现:   {legacy_time * 1000:8.2f} ms")
+    print(f"单次扫描: {current_time * 1000:8.2f} ms")
+
+    print("\n畸形响应:")
+    mismatches = check_malformed()
+    print("\n深层嵌套:")
+    failures = check_degenerate()
+    if mismatches or failures:
+        print(f"未通过: {', '.join(mismatches + failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+乱码检测的准确率与耗时基准。
+在带标注的语料（benchmarks/data/garbled_corpus.jsonl）上比较src.utils.text_quality.is_garbled
+与原先基于re.findall全文统计的实现：报告两者各自的准确率、按类别的结果和判定不一致的样本，
+并把语料拼接成长文档测量单次检测耗时。
+
+语料每行为一个JSON对象：id、category、garbled（标注是否乱码）和text。
+
+用法:
+    python benchmarks/garbled_accuracy.py [--corpus benchmarks/data/garbled_corpus.jsonl] [--long-chars 2000000]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from src.utils.text_quality import is_garbled
+
+
+def legacy_is_garbled(text: str) -> bool:
+    """原先DocumentProcessor.is_text_garbled的实现，作为准确率和耗时的对照。"""
+    chinese_characters = re.findall(r'[\u4e00-\u9fff]', text)
+    symbol_characters = re.findall(r'[\u0000-\u0020\u3000\uFFFD]', text)
+
+    if len(chinese_characters) > 0:
+        chinese_ratio = len(chinese_characters) / max(len(text), 1)
+        symbol_ratio = len(symbol_characters) / max(len(text), 1)
+        return chinese_ratio < 0.2 or symbol_ratio > 0.3
+
+    non_ascii_ratio = sum(1 for char in text if ord(char) > 127) / max(len(text), 1)
+    return non_ascii_ratio > 0.3
+
+
+DETECTORS: Dict[str, Callable[[str], bool]] = {"legacy": legacy_is_garbled, "sampled": is_garbled}
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(corpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """在标注语料上计算各检测器的准确率、按类别的正确数和判定不一致的样本。"""
+    result = {"samples": len(corpus), "accuracy": {}, "categories": {}, "disagreements": []}
+    correct = defaultdict(int)
+    categories = defaultdict(lambda: defaultdict(int))
+    for item in corpus:
+        predictions = {name: detector(item["text"]) for name, detector in DETECTORS.items()}
+        categories[item["category"]]["total"] += 1
+        for name, predicted in predictions.items():
+            if predicted == item["garbled"]:
+                correct[name] += 1
+                categories[item["category"]][name] += 1
+        if len(set(predictions.values())) > 1:
+            result["disagreements"].append({"id": item["id"], "label": item["garbled"], **predictions})
+    result["accuracy"] = {name: round(correct[name] / max(len(corpus), 1), 4) for name in DETECTORS}
+    result["categories"] = {category: dict(counts) for category, counts in sorted(categories.items())}
+    return result
+
+
+def time_detectors(corpus: List[Dict[str, Any]], long_chars: int, page_chars: int = 2000) -> Dict[str, Any]:
+    """
+    测量检测耗时：把同一标注的样本拼接成约long_chars字符的长文档各检测一次，
+    并按page_chars切成页逐页检测。
+    """
+    timings = {}
+    for label in (False, True):
+        texts = [item["text"] for item in corpus if item["garbled"] == label]
+        document = "\n\n".join(texts)
+        document = (document * (long_chars // max(len(document), 1) + 1))[:long_chars]
+        pages = [document[i:i + page_chars] for i in range(0, len(document), page_chars)]
+        key = "garbled" if label else "clean"
+        timings[key] = {}
+        for name, detector in DETECTORS.items():
+            started = time.perf_counter()
+            verdict = detector(document)
+            document_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            garbled_pages = sum(1 for page in pages if detector(page))
+            pages_seconds = time.perf_counter() - started
+            timings[key][name] = {
+                "document_seconds": round(document_seconds, 5),
+                "document_verdict": verdict,
+                "per_page_ms": round(pages_seconds / max(len(pages), 1) * 1000, 4),
+                "garbled_pages": f"{garbled_pages}/{len(pages)}"
+            }
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="乱码检测的准确率与耗时基准")
+    parser.add_argument("--corpus", default=os.path.join(BENCHMARK_DIR, "data", "garbled_corpus.jsonl"),
+                        help="带标注的语料文件 (默认: benchmarks/data/garbled_corpus.jsonl)")
+    parser.add_argument("--long-chars", type=int, default=2000000, help="耗时测试中长文档的字符数 (默认: 2000000)")
+    parser.add_argument("--json-output", default=None, help="把结果另存为JSON文件")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    result = evaluate(corpus)
+    result["timings"] = time_detectors(corpus, args.long_chars)
+
+    print(f"\n乱码检测基准（{result['samples']} 个标注样本）:")
+    print("-" * 60)
+    for name, accuracy in result["accuracy"].items():
+        print(f"{name:<10} 准确率 {accuracy:.2%}")
+    for category, counts in result["categories"].items():
+        print(f"  {category:<20} " + "  ".join(f"{name} {counts.get(name, 0)}/{counts['total']}" for name in DETECTORS))
+    for item in result["disagreements"]:
+        print(f"判定不一致: {item}")
+    for key, timings in result["timings"].items():
+        for name, stats in timings.items():
+            print(f"{key}长文档 {name:<10} 整篇 {stats['document_seconds']:.5f} 秒, "
+                  f"逐页 {stats['per_page_ms']:.4f} 毫秒/页, 乱码页 {stats['garbled_pages']}")
+    print("-" * 60)
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.json_output}")
+
+
+if __name__ == "__main__":
+    main()
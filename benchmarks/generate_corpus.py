@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+合成基准测试语料生成器。
+按指定的数量和大小生成PDF、DOCX、TXT和MD文档，内容为中英文混合的临床指南风格文本
+（仿照sample_data中的重症脑卒中管理指南），用于在本地衡量解析、分块和调度的吞吐量。
+
+PDF依赖PyMuPDF，DOCX依赖python-docx；缺少依赖时跳过对应格式。
+
+用法:
+    python benchmarks/generate_corpus.py --output /tmp/qa_corpus [--docs 20] [--size-kb 50] [--formats pdf,docx,txt,md]
+"""
+
+import argparse
+import os
+import random
+from typing import Dict, List
+
+FORMATS = ("pdf", "docx", "txt", "md")
+
+_ZH_SUBJECTS = ["重症脑卒中患者", "急性缺血性卒中患者", "脑出血患者", "蛛网膜下腔出血患者", "老年卒中患者", "接受机械取栓的患者"]
+_ZH_ACTIONS = ["应在入院后24小时内完成", "推荐常规进行", "不推荐常规进行", "可考虑进行", "应尽早开始", "需要密切监测"]
+_ZH_OBJECTS = ["颅内压监测", "血压管理", "吞咽功能评估", "深静脉血栓预防", "血糖控制", "早期康复训练", "气道保护与机械通气", "体温管理"]
+_ZH_REASONS = ["以降低病死率", "以改善神经功能预后", "以减少肺部感染等并发症", "以缩短住院时间", "证据等级为B级", "专家共识推荐等级为Ⅱa级"]
+_ZH_HEADINGS = ["概述", "病情评估", "监测", "血压管理", "颅内压管理", "并发症防治", "营养支持", "康复治疗", "预后评估"]
+
+_EN_SUBJECTS = ["Patients with severe stroke", "Patients after thrombectomy", "Elderly patients", "Patients with intracerebral hemorrhage"]
+_EN_ACTIONS = ["should receive", "may benefit from", "should not routinely receive", "require close monitoring of"]
+_EN_OBJECTS = ["intensive blood pressure control", "early enteral nutrition", "intracranial pressure monitoring", "venous thromboembolism prophylaxis"]
+_EN_REASONS = ["to reduce mortality.", "to improve functional outcome.", "according to class IIa evidence.", "to prevent secondary brain injury."]
+
+
+def make_sentence(rng: random.Random, english_ratio: float = 0.2) -> str:
+    """生成一个中文或英文的指南风格句子。"""
+    if rng.random() < english_ratio:
+        return " ".join([rng.choice(_EN_SUBJECTS), rng.choice(_EN_ACTIONS), rng.choice(_EN_OBJECTS), rng.choice(_EN_REASONS)]) + " "
+    return f"{rng.choice(_ZH_SUBJECTS)}{rng.choice(_ZH_ACTIONS)}{rng.choice(_ZH_OBJECTS)}，{rng.choice(_ZH_REASONS)}。"
+
+
+def make_sections(rng: random.Random, size_bytes: int) -> List[Dict[str, object]]:
+    """
+    生成总大小约为size_bytes（UTF-8编码）的章节列表。
+
+    返回:
+        章节列表，每项包含title和paragraphs
+    """
+    sections = []
+    total = 0
+    while total < size_bytes:
+        section = {"title": f"{len(sections) + 1}. {rng.choice(_ZH_HEADINGS)}", "paragraphs": []}
+        for _ in range(rng.randint(2, 5)):
+            paragraph = "".join(make_sentence(rng) for _ in range(rng.randint(3, 8)))
+            section["paragraphs"].append(paragraph)
+            total += len(paragraph.encode('utf-8'))
+            if total >= size_bytes:
+                break
+        sections.append(section)
+    return sections
+
+
+def write_txt(path: str, title: str, sections: List[Dict[str, object]]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(title + "\n\n")
+        for section in sections:
+            f.write(section["title"] + "\n\n")
+            for paragraph in section["paragraphs"]:
+                f.write(paragraph + "\n\n")
+
+
+def write_md(path: str, title: str, sections: List[Dict[str, object]]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# {title}\n\n")
+        for section in sections:
+            f.write(f"## {section['title']}\n\n")
+            for paragraph in section["paragraphs"]:
+                f.write(paragraph + "\n\n")
+
+
+def write_docx(path: str, title: str, sections: List[Dict[str, object]]) -> None:
+    import docx
+    document = docx.Document()
+    document.add_heading(title, level=0)
+    for section in sections:
+        document.add_heading(section["title"], level=1)
+        for paragraph in section["paragraphs"]:
+            document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_pdf(path: str, title: str, sections: List[Dict[str, object]],
+              chars_per_line: int = 45, lines_per_page: int = 60) -> None:
+    import fitz
+    lines = [title, ""]
+    for section in sections:
+        lines.extend([section["title"], ""])
+        for paragraph in section["paragraphs"]:
+            # 按固定字符数折行，中文使用内置的china-s字体
+            lines.extend(paragraph[i:i + chars_per_line] for i in range(0, len(paragraph), chars_per_line))
+            lines.append("")
+
+    document = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        page = document.new_page()
+        page.insert_text((50, 60), "\n".join(lines[start:start + lines_per_page]),
+                         fontsize=10, fontname="china-s")
+    document.save(path)
+    document.close()
+
+
+WRITERS = {"txt": write_txt, "md": write_md, "docx": write_docx, "pdf": write_pdf}
+
+
+def generate_corpus(output_dir: str, docs: int = 20, size_kb: float = 50, formats=FORMATS, seed: int = 0) -> List[str]:
+    """
+    生成合成语料。
+
+    参数:
+        output_dir: 输出目录
+        docs: 文档总数，按formats轮流分配格式
+        size_kb: 每个文档正文的近似大小（KB，按UTF-8计）
+        formats: 要生成的格式
+        seed: 随机数种子
+
+    返回:
+        已生成的文件路径列表
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    available = []
+    for fmt in formats:
+        try:
+            if fmt == "pdf":
+                import fitz  # noqa: F401
+            elif fmt == "docx":
+                import docx  # noqa: F401
+            available.append(fmt)
+        except ImportError:
+            print(f"警告: 缺少生成 {fmt} 所需的依赖，跳过该格式")
+    if not available:
+        return []
+
+    paths = []
+    for i in range(docs):
+        fmt = available[i % len(available)]
+        title = f"重症脑卒中管理指南 第{i + 1}部分"
+        sections = make_sections(rng, int(size_kb * 1024))
+        path = os.path.join(output_dir, f"doc_{i:04d}.{fmt}")
+        WRITERS[fmt](path, title, sections)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成基准测试用的合成语料")
+    parser.add_argument("--output", "-o", required=True, help="输出目录")
+    parser.add_argument("--docs", type=int, default=20, help="文档数量 (默认: 20)")
+    parser.add_argument("--size-kb", type=float, default=50, help="每个文档正文的近似大小（KB） (默认: 50)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="要生成的格式，逗号分隔 (默认: pdf,docx,txt,md)")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子 (默认: 0)")
+    args = parser.parse_args()
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip() in FORMATS]
+    paths = generate_corpus(args.output, args.docs, args.size_kb, formats, args.seed)
+    print(f"已生成 {len(paths)} 个文档: {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
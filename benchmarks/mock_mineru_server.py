@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+本地MinerU模拟服务，同时支持web_api和local_api两种模式，用于在本地压测PDF解析流程。
+
+web_api模式（MINERU_MODE=web_api，MINERU_API_URL=http://127.0.0.1:8001/api/v4）:
+    POST /api/v4/file-urls/batch            申请上传地址
+    PUT  /upload/<batch_id>/<index>          上传文件
+    GET  /api/v4/extract-results/batch/<id>  查询解析状态
+    GET  /download/<batch_id>/<index>.zip    下载包含Markdown的结果压缩包
+
+local_api模式（MINERU_MODE=local_api，MINERU_API_URL=http://127.0.0.1:8001/pdf_parse?parse_method=auto）:
+    POST /pdf_parse                          上传pdf_file并直接返回md_content
+
+安装了PyMuPDF时返回PDF的真实文本，否则返回按文件大小生成的占位Markdown。
+
+用法:
+    python benchmarks/mock_mineru_server.py [--port 8001] [--seconds-per-page 0.05]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Dict, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_openai_server import parse_multipart
+
+
+def pdf_to_markdown(content: bytes, filename: str) -> Tuple[str, int]:
+    """
+    将PDF内容转换为Markdown。
+
+    返回:
+        (Markdown文本, 页数)
+    """
+    try:
+        import fitz
+        with fitz.open(stream=content, filetype="pdf") as document:
+            pages = [page.get_text() for page in document]
+        return f"# {filename}\n\n" + "\n\n".join(pages), len(pages)
+    except ImportError:
+        pages = max(1, len(content) // 3000)
+        paragraphs = [f"第{i + 1}页：模拟的MinerU解析结果，重症脑卒中患者应尽早开始早期康复训练。" for i in range(pages)]
+        return f"# {filename}\n\n" + "\n\n".join(paragraphs), pages
+
+
+class MineruState:
+    def __init__(self, seconds_per_page: float = 0.05):
+        """
+        模拟服务的共享状态。
+
+        参数:
+            seconds_per_page: 每页的模拟解析耗时（秒）
+        """
+        self.seconds_per_page = seconds_per_page
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def parse(self, content: bytes, filename: str) -> str:
+        """同步解析一个PDF，按页数模拟耗时。"""
+        markdown, pages = pdf_to_markdown(content, filename)
+        time.sleep(self.seconds_per_page * pages)
+        return markdown
+
+    def process_upload(self, batch_id: str, index: int, content: bytes) -> None:
+        """在后台线程中解析上传的文件，完成后把状态置为done。"""
+        item = self.batches[batch_id]["files"][index]
+        with self.lock:
+            item["state"] = "running"
+        try:
+            markdown = self.parse(content, item["name"])
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as z:
+                z.writestr("full.md", markdown)
+            with self.lock:
+                item["zip"] = buffer.getvalue()
+                item["state"] = "done"
+        except Exception as e:
+            with self.lock:
+                item["state"] = "failed"
+                item["err_msg"] = str(e)
+
+
+class MockMineruHandler(BaseHTTPRequestHandler):
+    state: MineruState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), "application/json")
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        body = self._read_body()
+
+        if path.endswith("/file-urls/batch"):
+            request = json.loads(body or b"{}")
+            batch_id = uuid.uuid4().hex
+            files = [{"name": f.get("name"), "data_id": f.get("data_id"), "state": "waiting-file"}
+                     for f in request.get("files", [])]
+            with self.state.lock:
+                self.state.batches[batch_id] = {"files": files}
+            file_urls = [f"{self._base_url()}/upload/{batch_id}/{i}" for i in range(len(files))]
+            self._send_json(200, {"code": 0, "msg": "ok", "data": {"batch_id": batch_id, "file_urls": file_urls}})
+        elif path.endswith("/pdf_parse"):
+            _, files = parse_multipart(self.headers.get("Content-Type", ""), body)
+            if "pdf_file" not in files:
+                self._send_json(400, {"error": "缺少pdf_file字段"})
+                return
+            filename, content = files["pdf_file"]
+            self._send_json(200, {"md_content": self.state.parse(content, filename), "content_list": []})
+        else:
+            self._send_json(404, {"code": -1, "msg": f"未知接口: {path}"})
+
+    def do_PUT(self):
+        match = re.search(r"/upload/([^/]+)/(\d+)$", self.path)
+        body = self._read_body()
+        if not match or match.group(1) not in self.state.batches:
+            self._send_json(404, {"code": -1, "msg": "上传地址无效"})
+            return
+        batch_id, index = match.group(1), int(match.group(2))
+        threading.Thread(target=self.state.process_upload, args=(batch_id, index, body), daemon=True).start()
+        self._send(200, b"", "text/plain")
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        match = re.search(r"/extract-results/batch/([^/]+)$", path)
+        if match:
+            batch = self.state.batches.get(match.group(1))
+            if batch is None:
+                self._send_json(404, {"code": -1, "msg": "批次不存在"})
+                return
+            results = []
+            with self.state.lock:
+                for i, item in enumerate(batch["files"]):
+                    result = {"file_name": item["name"], "data_id": item["data_id"], "state": item["state"]}
+                    if item["state"] == "done":
+                        result["full_zip_url"] = f"{self._base_url()}/download/{match.group(1)}/{i}.zip"
+                    if item["state"] == "failed":
+                        result["err_msg"] = item.get("err_msg", "")
+                    results.append(result)
+            self._send_json(200, {"code": 0, "msg": "ok", "data": {"batch_id": match.group(1), "extract_result": results}})
+            return
+
+        match = re.search(r"/download/([^/]+)/(\d+)\.zip$", path)
+        if match:
+            batch = self.state.batches.get(match.group(1))
+            index = int(match.group(2))
+            if batch is None or index >= len(batch["files"]) or "zip" not in batch["files"][index]:
+                self._send_json(404, {"code": -1, "msg": "结果不存在"})
+                return
+            self._send(200, batch["files"][index]["zip"], "application/zip")
+            return
+
+        self._send_json(404, {"code": -1, "msg": f"未知接口: {path}"})
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8001, seconds_per_page: float = 0.05) -> ThreadingHTTPServer:
+    """
+    创建模拟服务，调用方负责serve_forever()和shutdown()。
+
+    参数:
+        host: 监听地址
+        port: 监听端口，为0时自动选择空闲端口
+        seconds_per_page: 每页的模拟解析耗时（秒）
+
+    返回:
+        HTTP服务对象
+    """
+    state = MineruState(seconds_per_page=seconds_per_page)
+    handler = type("BoundMockMineruHandler", (MockMineruHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地MinerU模拟服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8001, help="监听端口 (默认: 8001)")
+    parser.add_argument("--seconds-per-page", type=float, default=0.05, help="每页的模拟解析耗时（秒） (默认: 0.05)")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.seconds_per_page)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"模拟MinerU服务已启动: web_api {base_url}/api/v4, local_api {base_url}/pdf_parse?parse_method=auto")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
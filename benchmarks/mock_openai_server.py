@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+本地OpenAI兼容模拟服务，用于在不消耗API额度的情况下测试和压测问答提取流程。
+实现了聊天补全（包括stream=True的SSE流式输出）、文件上传/下载和批处理接口，响应内容根据用户消息中的文本块确定性地生成。
+
+用法:
+    python benchmarks/mock_openai_server.py [--port 8000] [--batch-delay 1.0] [--latency 0.5] [--error-rate 0.05]
+
+然后设置环境变量：
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock
+"""
+
+import argparse
+import email
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+_PACKED_CHUNK_PATTERN = re.compile(r'<chunk id="(\d+)">\n(.*?)\n</chunk>', re.S)
+
+
+def build_qa_pairs(text: str, max_pairs: int = 3) -> List[Dict[str, Any]]:
+    """根据文本内容生成确定性的问答对。"""
+    sentences = [s.strip() for s in re.split(r'(?<=[。！？.!?])\s*', text) if len(s.strip()) > 4]
+    pairs = []
+    for i, sentence in enumerate(sentences[-max_pairs:] or [text[-200:]]):
+        pairs.append({
+            "question": f"问题{i + 1}：{sentence[:40]}说的是什么？",
+            "answer": sentence[:200]
+        })
+    return pairs
+
+
+def build_qa_content(user_content: str, max_pairs: int = 3) -> str:
+    """
+    根据文本块内容生成确定性的问答对JSON数组。
+    合并请求（文本块用<chunk id="N">标签包围）为每个文本块分别生成问答对并带上chunk_id。
+    """
+    packed = _PACKED_CHUNK_PATTERN.findall(user_content)
+    if not packed:
+        return json.dumps(build_qa_pairs(user_content, max_pairs), ensure_ascii=False)
+    pairs = [dict(pair, chunk_id=int(chunk_id)) for chunk_id, text in packed for pair in build_qa_pairs(text, max_pairs)]
+    return json.dumps(pairs, ensure_ascii=False)
+
+
+# 模拟模型没有按要求输出JSON时的回复
+NON_JSON_REPLY = "抱歉，这段文本主要是页眉、页脚和版权声明，缺少可以据此提出问题的实质内容。" * 20
+
+
+def build_chat_completion(body: Dict[str, Any], non_json: bool = False) -> Dict[str, Any]:
+    """按聊天补全请求体构造响应体，non_json为True时回复一段不是JSON的文字。"""
+    messages = body.get("messages") or []
+    user_content = messages[-1].get("content", "") if messages else ""
+    content = NON_JSON_REPLY if non_json else build_qa_content(user_content)
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 2
+    completion_tokens = len(content) // 2
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+class MockState:
+    def __init__(self, batch_delay: float = 1.0, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, non_json_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        模拟服务的共享状态。
+
+        参数:
+            batch_delay: 批处理从创建到完成的模拟耗时（秒）
+            latency: 聊天补全请求的平均延迟（秒）
+            latency_jitter: 延迟的随机波动幅度（秒），实际延迟在latency±jitter之间均匀分布
+            error_rate: 聊天补全请求返回500错误的概率
+            rate_limit_rate: 聊天补全请求返回429限流（附带Retry-After）的概率
+            non_json_rate: 成功的聊天补全回复一段不是JSON的文字的概率
+            seed: 随机数种子，便于复现
+        """
+        self.batch_delay = batch_delay
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.non_json_rate = non_json_rate
+        self.random = random.Random(seed)
+        self.request_counts = {"chat": 0, "errors": 0, "rate_limited": 0, "non_json": 0,
+                               "prompt_tokens": 0, "completion_tokens": 0}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.file_contents: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def next_chat_outcome(self) -> Tuple[float, Optional[int]]:
+        """抽取一次聊天补全请求的模拟延迟和错误状态码（无错误时为None，回复非JSON文字时为0）。"""
+        with self.lock:
+            self.request_counts["chat"] += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.latency_jitter, self.latency_jitter))
+            roll = self.random.random()
+            if roll < self.rate_limit_rate:
+                self.request_counts["rate_limited"] += 1
+                return delay, 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.request_counts["errors"] += 1
+                return delay, 500
+            if roll < self.rate_limit_rate + self.error_rate + self.non_json_rate:
+                self.request_counts["non_json"] += 1
+                return delay, 0
+            return delay, None
+
+    def count_tokens(self, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """累计实际收到的提示词token和实际发出的输出token。"""
+        with self.lock:
+            self.request_counts["prompt_tokens"] += prompt_tokens
+            self.request_counts["completion_tokens"] += completion_tokens
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        file_object = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        with self.lock:
+            self.files[file_id] = file_object
+            self.file_contents[file_id] = content
+        return file_object
+
+    def create_batch(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        input_file_id = body.get("input_file_id")
+        if input_file_id not in self.file_contents:
+            return None
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": input_file_id,
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "validating",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "errors": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return batch
+
+    def _run_batch(self, batch_id: str) -> None:
+        """在后台线程中执行批处理：逐行生成响应，写出结果文件和错误文件。"""
+        batch = self.batches[batch_id]
+        lines = [line for line in self.file_contents[batch["input_file_id"]].decode('utf-8').splitlines() if line.strip()]
+        with self.lock:
+            batch["status"] = "in_progress"
+            batch["request_counts"]["total"] = len(lines)
+
+        outputs, errors = [], []
+        for i, line in enumerate(lines):
+            if batch["status"] == "cancelling":
+                break
+            request = json.loads(line)
+            record = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": request.get("custom_id")}
+            if request.get("url") != "/v1/chat/completions":
+                record.update(response=None, error={"code": "invalid_url", "message": f"不支持的接口: {request.get('url')}"})
+                errors.append(record)
+                counter = "failed"
+            else:
+                record.update(response={"status_code": 200, "request_id": uuid.uuid4().hex,
+                                        "body": build_chat_completion(request.get("body") or {})}, error=None)
+                outputs.append(record)
+                counter = "completed"
+            with self.lock:
+                batch["request_counts"][counter] += 1
+            time.sleep(self.batch_delay / max(len(lines), 1))
+
+        def dump(records: List[Dict[str, Any]]) -> bytes:
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode('utf-8')
+
+        output_file = self.add_file(f"{batch_id}_output.jsonl", "batch_output", dump(outputs)) if outputs else None
+        error_file = self.add_file(f"{batch_id}_error.jsonl", "batch_output", dump(errors)) if errors else None
+        with self.lock:
+            batch["output_file_id"] = output_file["id"] if output_file else None
+            batch["error_file_id"] = error_file["id"] if error_file else None
+            batch["status"] = "cancelled" if batch["status"] == "cancelling" else "completed"
+            batch["completed_at"] = int(time.time())
+
+
+def parse_multipart(content_type: str, body: bytes) -> Tuple[Dict[str, str], Dict[str, Tuple[str, bytes]]]:
+    """解析multipart/form-data请求体，返回(普通字段, 文件字段)。"""
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + body,
+        policy=email.policy.HTTP
+    )
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b''
+        if filename:
+            files[name] = (filename, payload)
+        else:
+            fields[name] = payload.decode('utf-8')
+    return fields, files
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": {"message": message, "type": "invalid_request_error"}})
+
+    def _send_stream(self, completion: Dict[str, Any], delay: float, include_usage: bool) -> None:
+        """
+        以SSE流式返回聊天补全，把模拟延迟平均分摊到各段输出上。
+        客户端提前断开时停止发送，只有已发出的部分计入输出token。
+        """
+        content = completion["choices"][0]["message"]["content"]
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def event(payload: Dict[str, Any]) -> None:
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        base = {key: completion[key] for key in ("id", "created", "model")}
+        sent_chars = 0
+        try:
+            for piece in pieces:
+                time.sleep(delay / len(pieces))
+                event(dict(base, object="chat.completion.chunk",
+                           choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+                sent_chars += len(piece)
+            event(dict(base, object="chat.completion.chunk",
+                       choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+            if include_usage:
+                event(dict(base, object="chat.completion.chunk", choices=[], usage=completion["usage"]))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.state.count_tokens(completion_tokens=sent_chars // 2)
+        self.close_connection = True
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        body = self._read_body()
+
+        if path.endswith("/chat/completions"):
+            request = json.loads(body or b"{}")
+            delay, error_status = self.state.next_chat_outcome()
+            if not (request.get("stream") and not error_status):
+                time.sleep(delay)
+            if error_status == 429:
+                payload = json.dumps({"error": {"message": "请求过于频繁", "type": "rate_limit_error"}}).encode('utf-8')
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            elif error_status:
+                self._send_json(error_status, {"error": {"message": "模拟的服务端错误", "type": "server_error"}})
+            else:
+                completion = build_chat_completion(request, non_json=error_status == 0)
+                if request.get("stream"):
+                    self.state.count_tokens(prompt_tokens=completion["usage"]["prompt_tokens"])
+                    include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                    self._send_stream(completion, delay, include_usage)
+                else:
+                    self.state.count_tokens(completion["usage"]["prompt_tokens"], completion["usage"]["completion_tokens"])
+                    self._send_json(200, completion)
+        elif path.endswith("/files"):
+            fields, files = parse_multipart(self.headers.get("Content-Type", ""), body)
+            if "file" not in files:
+                self._send_error(400, "缺少file字段")
+                return
+            filename, content = files["file"]
+            self._send_json(200, self.state.add_file(filename, fields.get("purpose", "batch"), content))
+        elif path.endswith("/batches"):
+            batch = self.state.create_batch(json.loads(body or b"{}"))
+            if batch is None:
+                self._send_error(404, "输入文件不存在")
+                return
+            self._send_json(200, batch)
+        elif re.search(r"/batches/[^/]+/cancel$", path):
+            batch = self.state.batches.get(path.split("/")[-2])
+            if batch is None:
+                self._send_error(404, "批处理不存在")
+                return
+            with self.state.lock:
+                if batch["status"] in ("validating", "in_progress"):
+                    batch["status"] = "cancelling"
+            self._send_json(200, batch)
+        else:
+            self._send_error(404, f"未知接口: {path}")
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        match = re.search(r"/files/([^/]+)(/content)?$", path)
+        if match:
+            file_id = match.group(1)
+            if file_id not in self.state.files:
+                self._send_error(404, "文件不存在")
+                return
+            if match.group(2):
+                content = self.state.file_contents[file_id]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+            else:
+                self._send_json(200, self.state.files[file_id])
+            return
+
+        match = re.search(r"/batches/([^/]+)$", path)
+        if match:
+            batch = self.state.batches.get(match.group(1))
+            if batch is None:
+                self._send_error(404, "批处理不存在")
+                return
+            with self.state.lock:
+                self._send_json(200, batch)
+            return
+
+        self._send_error(404, f"未知接口: {path}")
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8000, **state_options: Any) -> ThreadingHTTPServer:
+    """
+    创建模拟服务，调用方负责serve_forever()和shutdown()。服务的共享状态可通过server.state访问。
+
+    参数:
+        host: 监听地址
+        port: 监听端口，为0时自动选择空闲端口
+        state_options: 传给MockState的参数，如batch_delay、latency、error_rate
+
+    返回:
+        HTTP服务对象
+    """
+    state = MockState(**state_options)
+    handler = type("BoundMockOpenAIHandler", (MockOpenAIHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口 (默认: 8000)")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="批处理的模拟耗时（秒） (默认: 1.0)")
+    parser.add_argument("--latency", type=float, default=0.0, help="聊天补全的平均延迟（秒） (默认: 0)")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="延迟的随机波动幅度（秒） (默认: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500错误的概率 (默认: 0)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回429限流的概率 (默认: 0)")
+    parser.add_argument("--non-json-rate", type=float, default=0.0, help="回复非JSON文字的概率 (默认: 0)")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    args = parser.parse_args()
+
+    server = create_server(
+        args.host, args.port,
+        batch_delay=args.batch_delay,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        non_json_rate=args.non_json_rate,
+        seed=args.seed
+    )
+    print(f"模拟OpenAI服务已启动: http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
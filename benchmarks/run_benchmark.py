@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+端到端吞吐量基准测试。
+生成（或使用已有的）合成语料，在本进程中启动模拟的OpenAI服务和MinerU服务，
+以子进程方式运行extract_qa.py，并根据summary.json报告：
+文档/秒、文本块/秒、各阶段（解析、提取、单块提取）的p50/p95耗时和子进程的峰值RSS。
+
+用法:
+    python benchmarks/run_benchmark.py [--docs 20] [--size-kb 50] [--latency 0.3] [--error-rate 0.02]
+                                      [--mineru-mode web_api] [--json-output result.json] -- [extract_qa.py的其他参数]
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import mock_mineru_server
+import mock_openai_server
+from generate_corpus import FORMATS, generate_corpus
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """按最近秩法计算百分位数，空列表返回0。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def start_server(server) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def summarize(summary: Dict[str, Any], wall_seconds: float, peak_rss_kb: int) -> Dict[str, Any]:
+    """根据summary.json和运行耗时计算基准指标。"""
+    documents = summary.get("documents", [])
+    total_chunks = sum(doc.get("chunks", 0) for doc in documents)
+    stages = {
+        "parse": [doc.get("parse_seconds", 0.0) for doc in documents],
+        "extract": [doc.get("extract_seconds", 0.0) for doc in documents],
+        "extract_per_chunk": [doc.get("extract_seconds", 0.0) / doc["chunks"] for doc in documents if doc.get("chunks")]
+    }
+    stage_stats = {
+        name: {"p50": round(percentile(values, 50), 4), "p95": round(percentile(values, 95), 4)}
+        for name, values in stages.items()
+    }
+    # summary.json中的metrics包含更细的阶段（各PDF后端、单次大模型请求、JSON解析、写出等）
+    for name, timing in summary.get("metrics", {}).get("timings", {}).items():
+        stage_stats[name] = {"p50": timing["p50_seconds"], "p95": timing["p95_seconds"]}
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "documents": len(documents),
+        "chunks": total_chunks,
+        "qa_pairs": summary.get("total_qa_pairs", 0),
+        "docs_per_second": round(len(documents) / wall_seconds, 3) if wall_seconds else 0.0,
+        "chunks_per_second": round(total_chunks / wall_seconds, 3) if wall_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_kb / 1024.0, 1),
+        "stages": stage_stats
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端吞吐量基准测试")
+    parser.add_argument("--corpus", default=None, help="已有语料目录，不指定时生成合成语料")
+    parser.add_argument("--docs", type=int, default=20, help="合成文档数量 (默认: 20)")
+    parser.add_argument("--size-kb", type=float, default=50, help="每个合成文档的近似大小（KB） (默认: 50)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="合成语料的格式 (默认: pdf,docx,txt,md)")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟大模型的平均延迟（秒） (默认: 0.2)")
+    parser.add_argument("--latency-jitter", type=float, default=0.1, help="模拟大模型延迟的波动幅度（秒） (默认: 0.1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟大模型返回500的概率 (默认: 0)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模拟大模型返回429的概率 (默认: 0)")
+    parser.add_argument("--non-json-rate", type=float, default=0.0, help="模拟大模型回复非JSON文字的概率 (默认: 0)")
+    parser.add_argument("--mineru-mode", choices=["none", "web_api", "local_api"], default="none",
+                        help="PDF是否经过模拟MinerU服务解析 (默认: none)")
+    parser.add_argument("--mineru-seconds-per-page", type=float, default=0.05, help="模拟MinerU每页耗时（秒） (默认: 0.05)")
+    parser.add_argument("--json-output", default=None, help="把基准结果另存为JSON文件，便于对比回归")
+    parser.add_argument("--keep-output", action="store_true", help="保留extract_qa.py的输出目录")
+    parser.add_argument("extra", nargs=argparse.REMAINDER, help="传给extract_qa.py的其他参数，写在--之后")
+    args = parser.parse_args()
+    extra = [arg for arg in args.extra if arg != "--"]
+
+    work_dir = tempfile.mkdtemp(prefix="qa_bench_")
+    corpus_dir = args.corpus
+    if corpus_dir is None:
+        corpus_dir = os.path.join(work_dir, "corpus")
+        formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip() in FORMATS]
+        paths = generate_corpus(corpus_dir, args.docs, args.size_kb, formats)
+        print(f"已生成 {len(paths)} 个合成文档: {corpus_dir}")
+    output_dir = os.path.join(work_dir, "output")
+
+    openai_server = mock_openai_server.create_server(
+        port=0,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        non_json_rate=args.non_json_rate
+    )
+    mineru_server = mock_mineru_server.create_server(port=0, seconds_per_page=args.mineru_seconds_per_page)
+    start_server(openai_server)
+    start_server(mineru_server)
+
+    mineru_base = f"http://127.0.0.1:{mineru_server.server_address[1]}"
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_server.server_address[1]}/v1",
+        "OPENAI_MODEL_NAME": env.get("OPENAI_MODEL_NAME", "gpt-4o"),
+        "MINERU_MODE": "" if args.mineru_mode == "none" else args.mineru_mode,
+        "MINERU_API_URL": f"{mineru_base}/api/v4" if args.mineru_mode == "web_api" else f"{mineru_base}/pdf_parse?parse_method=auto",
+        "MINERU_API_KEY": "mock"
+    })
+
+    command = [sys.executable, os.path.join(REPO_ROOT, "extract_qa.py"), corpus_dir, "-o", output_dir, "-r"] + extra
+    print(f"运行: {' '.join(command)}")
+    log_path = os.path.join(work_dir, "extract_qa.log")
+    started = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log_file:
+        returncode = subprocess.call(command, cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    wall_seconds = time.perf_counter() - started
+    # Linux下ru_maxrss单位为KB，是所有已回收子进程中的最大值
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    openai_server.shutdown()
+    mineru_server.shutdown()
+
+    summary_files = sorted(glob.glob(os.path.join(output_dir, "*", "summary.json")))
+    if returncode != 0 or not summary_files:
+        print(f"错误: extract_qa.py 运行失败（返回码 {returncode}），日志: {log_path}")
+        sys.exit(1)
+    with open(summary_files[-1], 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+
+    result = summarize(summary, wall_seconds, peak_rss_kb)
+    result["mock_llm_requests"] = dict(openai_server.state.request_counts)
+    result["config"] = {
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "mineru_mode": args.mineru_mode,
+        "extra_args": extra
+    }
+
+    print("\n基准结果:")
+    print("-" * 60)
+    print(f"耗时: {result['wall_seconds']} 秒, 峰值RSS: {result['peak_rss_mb']} MB")
+    print(f"文档: {result['documents']} ({result['docs_per_second']} 个/秒)")
+    print(f"文本块: {result['chunks']} ({result['chunks_per_second']} 个/秒)")
+    print(f"QA对: {result['qa_pairs']}, 模拟大模型请求: {result['mock_llm_requests']}")
+    if result['qa_pairs']:
+        print(f"每个QA对的提示词token: {result['mock_llm_requests']['prompt_tokens'] / result['qa_pairs']:.1f}")
+    for name, stats in result["stages"].items():
+        print(f"{name:<36} p50 {stats['p50']:.4f} 秒  p95 {stats['p95']:.4f} 秒")
+    print("-" * 60)
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.json_output}")
+    if args.keep_output:
+        print(f"输出目录: {work_dir}")
+    else:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+命令行冷启动基准测试。
+以子进程方式多次运行extract_qa.py处理单个小文本文件（大模型请求由零延迟的模拟OpenAI服务应答），
+报告端到端耗时的中位数，并借助python -X importtime统计模块导入耗时，
+列出本次运行实际导入的重量级后端库（PDF、DOCX、编码检测、HTTP、openai等）。
+
+用法:
+    python benchmarks/startup_benchmark.py [--repeat 5] [--json-output startup.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import mock_openai_server
+
+# 只处理文本文件时理应不需要导入的后端库
+HEAVY_MODULES = ("docx", "chardet", "PyPDF2", "pdfplumber", "fitz", "pymupdf4llm", "requests", "openai", "tiktoken")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """
+    解析-X importtime的输出。
+
+    返回:
+        字典，total_import_seconds为所有顶层导入的累计耗时之和，
+        modules为顶层包名到累计耗时（秒）的映射
+    """
+    modules: Dict[str, float] = {}
+    total = 0.0
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative_us, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        # 缩进为一个空格的是顶层导入，更深的缩进已计入其父模块的累计耗时
+        if len(indent) == 1:
+            total += cumulative_us / 1e6
+        top_level = name.split(".")[0]
+        modules[top_level] = max(modules.get(top_level, 0.0), cumulative_us / 1e6)
+    return {"total_import_seconds": round(total, 4), "modules": modules}
+
+
+def run_once(input_path: str, output_dir: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """运行一次extract_qa.py，返回耗时和导入统计。"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    command = [sys.executable, "-X", "importtime", os.path.join(REPO_ROOT, "extract_qa.py"),
+               input_path, "-o", output_dir]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"extract_qa.py 运行失败（返回码 {completed.returncode}）:\n{completed.stderr[-2000:]}")
+    result = parse_importtime(completed.stderr)
+    result["wall_seconds"] = wall_seconds
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令行冷启动基准测试")
+    parser.add_argument("--repeat", type=int, default=5, help="重复运行次数，取中位数 (默认: 5)")
+    parser.add_argument("--json-output", default=None, help="把基准结果另存为JSON文件，便于对比回归")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="qa_startup_")
+    input_path = os.path.join(work_dir, "note.txt")
+    with open(input_path, 'w', encoding='utf-8') as f:
+        f.write("重症脑卒中患者应在入院后24小时内完成吞咽功能评估，以减少肺部感染等并发症。\n")
+
+    server = mock_openai_server.create_server(port=0, latency=0.0, latency_jitter=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1",
+        "MINERU_MODE": ""
+    })
+
+    runs: List[Dict[str, Any]] = []
+    try:
+        for _ in range(max(1, args.repeat)):
+            runs.append(run_once(input_path, os.path.join(work_dir, "output"), env))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    imported = {name: round(statistics.median(run["modules"].get(name, 0.0) for run in runs), 4)
+                for name in HEAVY_MODULES if any(name in run["modules"] for run in runs)}
+    result = {
+        "repeat": len(runs),
+        "wall_seconds_median": round(statistics.median(run["wall_seconds"] for run in runs), 4),
+        "wall_seconds_min": round(min(run["wall_seconds"] for run in runs), 4),
+        "import_seconds_median": round(statistics.median(run["total_import_seconds"] for run in runs), 4),
+        "heavy_modules_imported": imported
+    }
+
+    print("\n冷启动基准结果（单个TXT文件）:")
+    print("-" * 60)
+    print(f"端到端耗时: 中位数 {result['wall_seconds_median']} 秒, 最小 {result['wall_seconds_min']} 秒")
+    print(f"模块导入耗时: 中位数 {result['import_seconds_median']} 秒")
+    if imported:
+        for name, seconds in sorted(imported.items(), key=lambda item: -item[1]):
+            print(f"已导入后端 {name:<16} {seconds:.4f} 秒")
+    else:
+        print("未导入任何重量级后端库")
+    print("-" * 60)
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.json_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,24 +9,30 @@ import os
 import sys
 import json
 import argparse
+import time
 from pathlib import Path
 import datetime
 from typing import List, Dict, Any
-from dotenv import load_dotenv
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # 导入我们的模块
-from src.core import DocumentProcessor, QAExtractor
-from src.utils.logger import BeijingLogger
+from src.core import QAExtractor
+from src.core.pipeline import iter_parsed_documents
+from src.utils.logger import LazyLogger
+from src.utils.llm_cache import LLMResponseCache
+from src.utils.jsonl_writer import JsonlWriter
+from src.utils.rate_limiter import RateLimiter
+from src.utils.metrics import metrics
+from src.utils.qa_dedup import QADeduplicator
+from src.utils.chunk_dedup import ChunkDeduplicator
+from src.utils import qa_format
+from src.utils.run_manifest import (RunManifest, STATUS_COMPLETED, STATUS_FAILED, STATUS_PARTIAL,
+                                    STATUS_BUDGET_EXHAUSTED, hash_text)
 
-# 加载环境变量
-load_dotenv()
-
-# 配置日志
-logger_instance = BeijingLogger()
-logger = logger_instance.get_logger()
+# 配置日志（第一次写日志时才创建处理器）
+logger = LazyLogger()
 
 def parse_args():
     """解析命令行参数。"""
@@ -47,8 +53,26 @@ def parse_args():
         "--chunk-size",
         "-c",
         type=int,
-        default=5000,
-        help="文档处理的最大块大小 (默认: 5000)"
+        default=None,
+        help="文档处理的最大块大小 (默认: chars模式为5000字符；tokens模式为根据上下文窗口计算的预算)"
+    )
+    parser.add_argument(
+        "--chunk-unit",
+        choices=["chars", "tokens"],
+        default="chars",
+        help="块大小的计量单位：chars按字符，tokens使用本地分词器按token计数 (默认: chars)"
+    )
+    parser.add_argument(
+        "--chunk-strategy",
+        choices=["paragraph", "heading"],
+        default="paragraph",
+        help="分块策略：paragraph按段落打包；heading按Markdown标题打包完整章节并在每块前加上标题路径，适合MinerU/pymupdf4llm输出和MD文件 (默认: paragraph)"
+    )
+    parser.add_argument(
+        "--context-window",
+        type=int,
+        default=None,
+        help="tokens模式下模型的上下文窗口大小，用于计算每块的token预算 (默认: 按模型名称推断)"
     )
     parser.add_argument(
         "--prompt",
@@ -63,6 +87,146 @@ def parse_args():
         action="store_true",
         help="递归处理目录"
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="每个文档并发调用大模型处理文本块的线程数 (默认: 1，即顺序处理)"
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["json", "jsonl", "json-v2"],
+        default="json",
+        help="输出格式：json在文档处理完后整体写出；jsonl在每个文本块完成后立即逐行追加；json-v2每个文本块的原文只保存一次，问答对通过chunk_id引用，紧凑写出 (默认: json)"
+    )
+    parser.add_argument(
+        "--llm-cache",
+        type=str,
+        default=None,
+        help="大模型响应缓存的SQLite文件路径，相同请求命中缓存时不再调用API (默认: 不启用)"
+    )
+    parser.add_argument(
+        "--llm-cache-size-mb",
+        type=int,
+        default=512,
+        help="响应缓存的最大大小（MB），超出后按LRU淘汰 (默认: 512)"
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=None,
+        help="每分钟最大请求数，启用后在所有线程间共享限流并根据429自适应调整并发 (默认: 不限制)"
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=None,
+        help="每分钟最大token数，按提示词的预估token数扣减预算 (默认: 不限制)"
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="使用离线批处理接口提交所有文本块，成本更低但需等待批处理完成"
+    )
+    parser.add_argument(
+        "--batch-poll-interval",
+        type=float,
+        default=30.0,
+        help="批处理模式下轮询批处理状态的间隔秒数 (默认: 30)"
+    )
+    parser.add_argument(
+        "--batch-max-wait",
+        type=float,
+        default=24 * 3600,
+        help="批处理模式下等待批处理完成的最长秒数，超时后取消 (默认: 86400)"
+    )
+    parser.add_argument(
+        "--parse-cache",
+        type=str,
+        default=None,
+        help="文档解析结果缓存目录，内容未变化的文件不再重新解析 (默认: 不启用)"
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="并行解析文档的进程数，解析与大模型提取流水线并行 (默认: 0，即CPU核数；1表示在主进程中顺序解析)"
+    )
+    parser.add_argument(
+        "--parse-prefetch",
+        type=int,
+        default=None,
+        help="已解析但尚未提取的文档数上限 (默认: 与解析进程数相同)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="使用流式输出：边接收边增量解析问答对，响应开头明显不是JSON时立即中止请求，不再为无效输出付费"
+    )
+    parser.add_argument(
+        "--stream-abort-chars",
+        type=int,
+        default=1000,
+        help="流式输出达到该字符数仍没有出现JSON对象时中止请求，0表示不中止 (默认: 1000)"
+    )
+    parser.add_argument(
+        "--pack-chunks",
+        type=int,
+        default=1,
+        help="单个请求最多合并的文本块数，大于1时把连续的小文本块合并为一个请求，减少请求数和重复的系统提示词开销 (默认: 1，不合并)"
+    )
+    parser.add_argument(
+        "--pack-max-tokens",
+        type=int,
+        default=2000,
+        help="合并请求中文本块的总token数上限，超过该值的文本块单独请求 (默认: 2000)"
+    )
+    parser.add_argument(
+        "--chunk-dedup",
+        action="store_true",
+        help="调用大模型前对文本块去重：规范化后内容相同的文本块（页眉页脚、免责声明等）在本次运行中只调用一次API，其余复用结果"
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="写出前用MinHash/LSH去除近似重复的问答对（跨文本块和本次运行的所有文档），丢弃数量记录在summary.json中"
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="规范化后问题和答案的字符3-gram估计Jaccard相似度不低于该值时视为重复 (默认: 0.8)"
+    )
+    parser.add_argument(
+        "--dedup-index",
+        type=str,
+        default=None,
+        help="把去重索引保存到SQLite文件，内存占用与问答对数量无关，并可与之后的运行共享 (默认: 保存在内存中)"
+    )
+    parser.add_argument(
+        "--dedup-memory-limit",
+        type=int,
+        default=100000,
+        help="内存去重索引最多保存的问答对数（每个约4KB），超出时淘汰最早的问答对，它们不再参与去重；0表示不限制，未指定--dedup-index时生效 (默认: 100000)"
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=None,
+        help="本次运行的token预算（提示词与输出token之和），用完后不再调度新的文本块和文件，跳过的部分记录在运行清单中，重新运行时继续处理 (默认: 不限制)"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        default=None,
+        help="运行结束后把各阶段耗时和计数指标写入Prometheus文本格式文件，供node exporter读取 (默认: 不写出)"
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="忽略输出目录中的运行清单，重新处理所有文件"
+    )
     return parser.parse_args()
 
 def collect_files(input_path: str, recursive: bool = False) -> List[Dict[str, str]]:
@@ -122,10 +286,34 @@ def collect_files(input_path: str, recursive: bool = False) -> List[Dict[str, st
     
     return all_files
 
+def build_output_path(base_output_dir: str, rel_path: str, extension: str) -> str:
+    """
+    根据输入文件的相对路径生成输出文件路径，保留原始目录结构。
+    
+    参数:
+        base_output_dir: 本次运行的输出目录
+        rel_path: 输入文件的相对路径
+        extension: 输出文件扩展名（如 .json）
+        
+    返回:
+        输出文件路径
+    """
+    output_dir = os.path.join(base_output_dir, os.path.dirname(rel_path))
+    os.makedirs(output_dir, exist_ok=True)
+    base_name, _ = os.path.splitext(os.path.basename(rel_path))
+    return os.path.join(output_dir, f"{base_name}{extension}")
+
 def main():
     """运行命令行工具的主函数。"""
+    # 控制台输出统一使用UTF-8编码（只在命令行入口设置，导入模块时不改动sys.stdout）
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
     args = parse_args()
     
+    # 加载环境变量（只在命令行入口加载，导入模块时不读取.env）
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     # 检查OpenAI API密钥是否设置
     if not os.getenv("OPENAI_API_KEY"):
         logger.error("环境变量中未找到OPENAI_API_KEY")
@@ -135,6 +323,7 @@ def main():
     # 获取当前日期（北京时间）
     beijing_now = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=8)
     date_str = beijing_now.strftime('%Y-%m-%d')
+    run_started = time.perf_counter()
     
     # 创建基本输出目录
     base_output_dir = os.path.join(args.output, date_str)
@@ -151,76 +340,313 @@ def main():
     logger.info(f"找到 {len(files)} 个文件要处理")
     print(f"处理 {len(files)} 个文件...")
     
-    # 初始化文档处理器和QA提取器
-    processor = DocumentProcessor(max_chunk_size=args.chunk_size)
-    extractor = QAExtractor()
+    # 初始化QA提取器，文档处理器在解析流水线中创建
+    llm_cache = None
+    if args.llm_cache:
+        llm_cache = LLMResponseCache(args.llm_cache, max_size_bytes=args.llm_cache_size_mb * 1024 * 1024)
+        logger.info(f"启用大模型响应缓存: {args.llm_cache}")
+    rate_limiter = None
+    if args.rpm or args.tpm:
+        rate_limiter = RateLimiter(rpm=args.rpm, tpm=args.tpm, max_concurrency=args.workers)
+        logger.info(f"启用限流: RPM={args.rpm or '不限'}, TPM={args.tpm or '不限'}")
+    chunk_deduplicator = ChunkDeduplicator() if args.chunk_dedup else None
+    extractor = QAExtractor(max_workers=args.workers, cache=llm_cache, rate_limiter=rate_limiter,
+                            chunk_deduplicator=chunk_deduplicator,
+                            pack_size=args.pack_chunks, pack_max_tokens=args.pack_max_tokens,
+                            stream=args.stream, token_budget=args.token_budget,
+                            stream_abort_chars=args.stream_abort_chars)
+    deduplicator = None
+    if args.dedup:
+        deduplicator = QADeduplicator(threshold=args.dedup_threshold, index_path=args.dedup_index,
+                                      max_entries=args.dedup_memory_limit)
+        logger.info(f"启用问答对去重: 阈值 {args.dedup_threshold}，索引 {args.dedup_index or '内存'}")
+    
+    # 确定块大小：tokens模式下按上下文窗口减去提示词和输出开销得到的预算打包
+    if args.chunk_unit == "tokens":
+        token_budget = extractor.chunk_token_budget(args.prompt, context_window=args.context_window)
+        chunk_size = min(args.chunk_size, token_budget) if args.chunk_size else token_budget
+        logger.info(f"按token分块，每块预算: {chunk_size} tokens")
+    else:
+        chunk_size = args.chunk_size or 5000
+    
+    # 运行清单：跳过未变化且已完成的文件，从中断处继续处理未完成的文件
+    manifest = RunManifest(args.output)
+    run_settings = {
+        "chunk_size": chunk_size,
+        "chunk_unit": args.chunk_unit,
+        "prompt_hash": hash_text(args.prompt),
+        "chunk_strategy": args.chunk_strategy,
+        "model": extractor.model_name
+    }
     
     # 处理文件并提取QA对
     total_qa_pairs = 0
     processed_docs_info = []
+    skipped_docs = 0
+    # 已开始处理的文件，token预算用完后其余文件记录为未完成
+    started_files = set()
     
+    pending_files = []
     for file_info in files:
+        try:
+            file_info['fingerprint'] = manifest.fingerprint(file_info['abs_path'], file_info['rel_path'])
+        except OSError as e:
+            logger.error(f"读取 {file_info['abs_path']} 时出错: {e}")
+            print(f"错误: 读取 {file_info['rel_path']} 时出错: {e}")
+            continue
+        if not args.no_resume and manifest.is_completed(file_info['rel_path'], file_info['fingerprint'], run_settings):
+            logger.info(f"文件未变化且已处理完成，跳过: {file_info['abs_path']}")
+            print(f"跳过（未变化）: {file_info['rel_path']}")
+            skipped_docs += 1
+            continue
+        pending_files.append(file_info)
+    
+    # 解析在进程池中进行，解析完成的文档依次交给大模型提取阶段
+    parsed_documents = iter_parsed_documents(
+        pending_files,
+        max_chunk_size=chunk_size,
+        cache_dir=args.parse_cache,
+        workers=args.parse_workers,
+        prefetch=args.parse_prefetch,
+        chunk_unit=args.chunk_unit,
+        chunk_strategy=args.chunk_strategy
+    )
+    
+    if args.batch:
+        # 批处理模式：先解析全部文档，把所有未完成的文本块一次性提交到批处理接口。
+        # 批处理ID创建后立即写入清单；每个批处理结束时它的结果就写入进度文件，由下面的逐文档循环直接复用，
+        # 批处理中失败的文本块、以及批处理整体出错时所有未完成的文本块再实时调用补齐
+        parsed_documents = list(parsed_documents)
+        batch_jobs = [(file_info, doc) for file_info, doc, parse_error in parsed_documents
+                      if parse_error is None and doc]
+        for file_info, doc in batch_jobs:
+            doc['file_path'] = file_info['rel_path']
+            file_info['completed_chunks'] = manifest.start(
+                file_info['rel_path'], file_info['fingerprint'], run_settings, resume=not args.no_resume
+            )
+        
+        def record_batch_chunk(position: int, chunk_index: int, qa_pairs: List[Dict[str, Any]]) -> None:
+            file_info = batch_jobs[position][0]
+            manifest.record_chunk(file_info['rel_path'], chunk_index, qa_pairs)
+            file_info['completed_chunks'][chunk_index] = qa_pairs
+        
+        print(f"以批处理模式提交 {len(batch_jobs)} 个文档...")
+        try:
+            extractor.extract_qa_pairs_batch(
+                [doc for _, doc in batch_jobs],
+                args.prompt,
+                completed_chunks=[dict(file_info['completed_chunks']) for file_info, _ in batch_jobs],
+                poll_interval=args.batch_poll_interval,
+                max_wait=args.batch_max_wait,
+                on_chunk_done=record_batch_chunk,
+                on_batch_update=manifest.record_batch
+            )
+        except Exception as e:
+            # 已经交付的文本块都已写入进度文件，其余的由下面的逐文档循环实时调用
+            logger.error(f"批处理出错，未完成的文本块改为实时调用: {e}")
+            print(f"警告: 批处理出错（{e}），未完成的文本块改为实时调用")
+    
+    for file_info, doc, parse_error in parsed_documents:
         file_path = file_info['abs_path']
         rel_path = file_info['rel_path']
+        fingerprint = file_info['fingerprint']
+        
+        # 批处理模式下的文档都已提交过，仍逐个收尾：已由批处理完成的文档不需要再调用API
+        if extractor.token_usage.exhausted and not args.batch:
+            break
+        started_files.add(rel_path)
         
         try:
             # 处理文档
             logger.info(f"处理文件: {file_path}")
             print(f"处理文件: {rel_path}")
             
-            doc = processor.process_single_file(file_path)
+            if parse_error is not None:
+                raise parse_error
             if not doc:
                 logger.warning(f"处理失败: {file_path}")
                 print(f"警告: 处理失败 {rel_path}")
+                manifest.finish(rel_path, STATUS_FAILED, **fingerprint, **run_settings)
                 continue
             
-            # 提取QA对
+            # 提取QA对，已完成的文本块从进度文件中恢复；token用量按相对路径归集
+            doc['file_path'] = rel_path
+            completed_chunks = file_info.pop('completed_chunks', None)
+            if completed_chunks is None:
+                completed_chunks = manifest.start(rel_path, fingerprint, run_settings, resume=not args.no_resume)
+            output_extension = qa_format.FILE_EXTENSION if args.output_format == "json-v2" else f".{args.output_format}"
+            output_file = build_output_path(base_output_dir, rel_path, output_extension)
             logger.info(f"从 {doc.get('file_name', 'unknown')} 中提取QA对")
-            qa_pairs = extractor.extract_qa_pairs(doc, args.prompt)
+            extract_started = time.perf_counter()
             
-            if not qa_pairs:
-                logger.warning(f"从 {file_path} 中没有生成QA对")
-                print(f"警告: 从 {rel_path} 中没有生成QA对")
-                continue
+            # 进度文件保存去重前的问答对，重新处理文档前先移除它上一次留在索引中的问答对
+            if deduplicator is not None:
+                deduplicator.remove_document(rel_path)
+                dropped_before = deduplicator.dropped
             
-            # 确定输出路径，保留原始目录结构
-            rel_dir = os.path.dirname(rel_path)
-            output_dir = os.path.join(base_output_dir, rel_dir)
-            os.makedirs(output_dir, exist_ok=True)
+            def deduplicate(pairs, rel_path=rel_path):
+                return deduplicator.filter(pairs, rel_path) if deduplicator is not None else pairs
             
-            # 准备输出文件名
-            file_name = os.path.basename(file_path)
-            base_name, _ = os.path.splitext(file_name)
-            output_file = os.path.join(output_dir, f"{base_name}.json")
-            
-            # 保存QA对到JSON文件
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
-            
-            total_qa_pairs += len(qa_pairs)
-            
-            logger.info(f"从 {file_path} 提取了 {len(qa_pairs)} 个QA对")
-            print(f"成功: 从 {rel_path} 提取了 {len(qa_pairs)} 个QA对")
+            if args.output_format == "jsonl":
+                # 每个文本块完成后立即追加写出，内存中不保留整篇文档的问答对
+                with JsonlWriter(output_file, mode='w') as writer:
+                    for index in sorted(completed_chunks):
+                        writer.write_many(dict(pair, chunk_index=index) for pair in deduplicate(completed_chunks[index]))
+                    
+                    def on_chunk_done(index, pairs, rel_path=rel_path, writer=writer):
+                        manifest.record_chunk(rel_path, index, pairs)
+                        writer.write_many(dict(pair, chunk_index=index) for pair in deduplicate(pairs))
+                    
+                    extractor.extract_qa_pairs(
+                        doc,
+                        args.prompt,
+                        completed_chunks=completed_chunks,
+                        on_chunk_done=on_chunk_done,
+                        collect_results=False
+                    )
+                qa_pair_count = writer.records_written
+            elif args.output_format == "json-v2":
+                # 按文本块收集结果，写出时每个文本块的原文只保存一次
+                chunks = doc.get('chunks') or [doc.get('file_content', '')]
+                chunk_results = {index: pairs for index, pairs in completed_chunks.items() if index < len(chunks)}
+                
+                def on_chunk_done(index, pairs, rel_path=rel_path, chunk_results=chunk_results):
+                    manifest.record_chunk(rel_path, index, pairs)
+                    chunk_results[index] = pairs
+                
+                extractor.extract_qa_pairs(
+                    doc,
+                    args.prompt,
+                    completed_chunks=completed_chunks,
+                    on_chunk_done=on_chunk_done,
+                    collect_results=False
+                )
+                chunk_results = {index: deduplicate(chunk_results[index]) for index in sorted(chunk_results)}
+                qa_pair_count = sum(len(pairs) for pairs in chunk_results.values())
+            else:
+                qa_pairs = extractor.extract_qa_pairs(
+                    doc,
+                    args.prompt,
+                    completed_chunks=completed_chunks,
+                    on_chunk_done=lambda index, pairs, rel_path=rel_path: manifest.record_chunk(rel_path, index, pairs)
+                )
+                qa_pairs = deduplicate(qa_pairs)
+                qa_pair_count = len(qa_pairs)
+            extract_seconds = time.perf_counter() - extract_started
+            qa_pairs_dropped = deduplicator.dropped - dropped_before if deduplicator is not None else 0
+            if qa_pairs_dropped:
+                logger.info(f"{file_path} 去除了 {qa_pairs_dropped} 个近似重复的QA对")
             
             # 记录处理信息用于汇总
-            processed_docs_info.append({
+            doc_info = {
                 "file_path": rel_path,
                 "chunks": len(doc.get('chunks', [])),
-                "qa_pairs": len(qa_pairs)
-            })
+                "qa_pairs": qa_pair_count,
+                "parse_seconds": round(doc.get('parse_seconds', 0.0), 3),
+                "extract_seconds": round(extract_seconds, 3)
+            }
+            if deduplicator is not None:
+                doc_info["qa_pairs_dropped"] = qa_pairs_dropped
+            doc_usage = extractor.token_usage.document(rel_path)
+            chunks_skipped = doc_usage.pop("chunks_skipped")
+            doc_info["token_usage"] = doc_usage
+            # 进度文件中记录的已完成文本块数少于总数时（因token预算跳过或重试后仍失败），
+            # 文件不标记为完成，进度文件保留，下次运行时只重新处理缺少的文本块
+            chunks_total = len(doc.get('chunks', []))
+            chunks_failed = max(chunks_total - (manifest.get(rel_path) or {}).get("chunks_done", 0) - chunks_skipped, 0)
+            status = STATUS_COMPLETED
+            if chunks_skipped:
+                status = STATUS_BUDGET_EXHAUSTED
+                doc_info["chunks_skipped"] = chunks_skipped
+                logger.warning(f"token预算已用完，{file_path} 跳过了 {chunks_skipped} 个文本块")
+                print(f"警告: token预算已用完，{rel_path} 跳过了 {chunks_skipped} 个文本块，重新运行时继续处理")
+            if chunks_failed:
+                status = status if chunks_skipped else STATUS_PARTIAL
+                doc_info["chunks_failed"] = chunks_failed
+                logger.warning(f"{file_path} 有 {chunks_failed} 个文本块处理失败")
+                print(f"警告: {rel_path} 有 {chunks_failed} 个文本块处理失败，重新运行时只处理这些文本块")
+            
+            if not qa_pair_count:
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+                manifest.finish(rel_path, status, output_file=None, chunks_total=chunks_total, qa_pairs=0,
+                                chunks_skipped=chunks_skipped, chunks_failed=chunks_failed)
+                if qa_pairs_dropped:
+                    # 问答对全部与已保留的问答对重复，不写出文件，但仍计入汇总
+                    print(f"成功: {rel_path} 的 {qa_pairs_dropped} 个QA对均为重复，已全部去除")
+                    processed_docs_info.append(doc_info)
+                elif status == STATUS_COMPLETED:
+                    logger.warning(f"从 {file_path} 中没有生成QA对")
+                    print(f"警告: 从 {rel_path} 中没有生成QA对")
+                continue
+            
+            if args.output_format == "json":
+                # 保存QA对到JSON文件
+                with metrics.span("output_write", format="json"), open(output_file, 'w', encoding='utf-8') as f:
+                    json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
+            elif args.output_format == "json-v2":
+                with metrics.span("output_write", format="json-v2"):
+                    qa_format.write_document(qa_format.build_document(chunk_results, chunks, rel_path), output_file)
+            
+            total_qa_pairs += qa_pair_count
+            manifest.finish(rel_path, status, output_file=os.path.abspath(output_file),
+                            chunks_total=chunks_total, qa_pairs=qa_pair_count,
+                            chunks_skipped=chunks_skipped, chunks_failed=chunks_failed)
+            
+            logger.info(f"从 {file_path} 提取了 {qa_pair_count} 个QA对")
+            print(f"成功: 从 {rel_path} 提取了 {qa_pair_count} 个QA对")
+            processed_docs_info.append(doc_info)
             
         except Exception as e:
             logger.error(f"处理 {file_path} 时出错: {e}", exc_info=True)
             print(f"错误: 处理 {rel_path} 时出错: {e}")
     
+    # token预算用完后剩余的文件不再解析和提取，在清单中记录为未完成，下次运行时处理
+    budget_skipped_files = []
+    if extractor.token_usage.exhausted:
+        close = getattr(parsed_documents, 'close', None)
+        if close is not None:
+            close()
+        for file_info in pending_files:
+            if file_info['rel_path'] in started_files:
+                continue
+            budget_skipped_files.append(file_info['rel_path'])
+            manifest.finish(file_info['rel_path'], STATUS_BUDGET_EXHAUSTED,
+                            **file_info['fingerprint'], **run_settings)
+        if budget_skipped_files:
+            logger.warning(f"token预算已用完，跳过 {len(budget_skipped_files)} 个文件")
+    
+    if deduplicator is not None:
+        deduplicator.close()
+    if llm_cache is not None:
+        llm_cache.close()
+    
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
+        logger.info(f"指标已写入: {args.metrics_file}")
+    
     # 创建汇总文件
     if processed_docs_info:
         summary = {
             "date": date_str,
+            "elapsed_seconds": round(time.perf_counter() - run_started, 3),
             "total_documents": len(processed_docs_info),
             "total_qa_pairs": total_qa_pairs,
+            "skipped_documents": skipped_docs,
             "documents": processed_docs_info
         }
+        if llm_cache is not None:
+            summary["llm_cache"] = llm_cache.stats()
+        if rate_limiter is not None:
+            summary["rate_limiter"] = rate_limiter.stats()
+        if chunk_deduplicator is not None:
+            summary["chunk_dedup"] = chunk_deduplicator.stats()
+        if deduplicator is not None:
+            summary["dedup"] = deduplicator.stats()
+        summary["token_usage"] = extractor.token_usage.stats()
+        if args.token_budget is not None:
+            summary["token_usage"]["skipped_files"] = budget_skipped_files
+        summary["metrics"] = metrics.summary()
         
         summary_file = os.path.join(base_output_dir, "summary.json")
         with open(summary_file, 'w', encoding='utf-8') as f:
@@ -239,6 +665,29 @@ def main():
             print(f"{file_name[:47] + '...' if len(file_name) > 50 else file_name:<50} | {doc['chunks']:<10} | {doc['qa_pairs']:<10}")
         print("-" * 80)
         print(f"总计: {len(processed_docs_info)} 个文档, {total_qa_pairs} 个QA对")
+        if llm_cache is not None:
+            cache_stats = llm_cache.stats()
+            print(f"响应缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次")
+        if chunk_deduplicator is not None:
+            chunk_stats = chunk_deduplicator.stats()
+            print(f"文本块去重: {chunk_stats['unique_chunks']} 个不同的文本块, 节省 {chunk_stats['api_calls_saved']} 次API调用")
+        if deduplicator is not None:
+            print(f"去重: 保留 {deduplicator.kept} 个QA对, 去除 {deduplicator.dropped} 个近似重复的QA对")
+            evicted = deduplicator.stats()['evicted']
+            if evicted:
+                print(f"去重: 内存索引达到上限，淘汰了 {evicted} 个最早的QA对；"
+                      f"需要全量去重时请调大--dedup-memory-limit或使用--dedup-index")
+        usage_stats = extractor.token_usage.stats()
+        print(f"token用量: {usage_stats['requests']} 次请求, 提示词 {usage_stats['prompt_tokens']} "
+              f"(缓存命中 {usage_stats['cached_tokens']}), 输出 {usage_stats['completion_tokens']}")
+        if extractor.token_usage.exhausted:
+            print(f"token预算 {args.token_budget} 已用完: 跳过 {usage_stats['chunks_skipped']} 个文本块和 "
+                  f"{len(budget_skipped_files)} 个文件，重新运行同一命令即可继续处理")
+    elif budget_skipped_files:
+        print(f"\ntoken预算 {args.token_budget} 已用完，{len(budget_skipped_files)} 个文件未处理，重新运行同一命令即可继续处理。")
+    elif skipped_docs:
+        logger.info(f"所有 {skipped_docs} 个文件均未变化且已处理完成")
+        print(f"\n所有 {skipped_docs} 个文件均未变化且已处理完成，无需重新处理。")
     else:
         logger.error("没有成功处理任何文档")
         print("错误: 没有成功处理任何文档。")
@@ -3,6 +3,6 @@ Core modules for QA document extraction.
 """
 
 from .document_processor import DocumentProcessor
-from .qa_extractor import QAExtractor
+from .qa_extractor import QAExtractor, StreamAbortedError
 
-__all__ = ['DocumentProcessor', 'QAExtractor'] 
\ No newline at end of file
+__all__ = ['DocumentProcessor', 'QAExtractor', 'StreamAbortedError'] 
\ No newline at end of file
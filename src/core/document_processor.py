@@ -1,38 +1,155 @@
 import os
 import re
+import codecs
 import zipfile
-import docx
-import chardet
-import PyPDF2
-import pdfplumber
-import fitz  # PyMuPDF
 import io
-import requests
-from typing import Dict, List, Any, Optional
-from ..utils.logger import BeijingLogger
-from dotenv import load_dotenv
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple, Union
+from ..utils.logger import LazyLogger
+from ..utils.metrics import metrics
+from ..utils.parse_cache import ParsedDocumentCache
+from ..utils.run_manifest import hash_file
+from ..utils.text_quality import is_garbled
+from ..utils.tokenizer import count_tokens, split_text_by_tokens
 import time
 from io import BytesIO
 
-# 加载环境变量
-load_dotenv()
+# docx、chardet、PyPDF2、pdfplumber、PyMuPDF和requests都在首次使用时才导入，
+# 只处理文本文件的任务不必为PDF等后端支付导入开销
 
 # 设置日志记录器
-beijing_logger = BeijingLogger()
-logger = beijing_logger.get_logger()
+logger = LazyLogger()
+
+class _PdfSources:
+    """
+    同一个PDF文件在各提取库中的句柄，按需打开，且每个库只打开一次。
+    """
+    
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._fitz_document = None
+        self._pdfplumber_document = None
+        self._pypdf2_reader = None
+        self._pypdf2_file = None
+    
+    @property
+    def fitz_document(self):
+        if self._fitz_document is None:
+            import fitz  # PyMuPDF
+            self._fitz_document = fitz.open(self.filepath)
+        return self._fitz_document
+    
+    @property
+    def pdfplumber_document(self):
+        if self._pdfplumber_document is None:
+            import pdfplumber
+            self._pdfplumber_document = pdfplumber.open(self.filepath)
+        return self._pdfplumber_document
+    
+    @property
+    def pypdf2_reader(self):
+        if self._pypdf2_reader is None:
+            import PyPDF2
+            self._pypdf2_file = open(self.filepath, 'rb')
+            self._pypdf2_reader = PyPDF2.PdfReader(self._pypdf2_file)
+        return self._pypdf2_reader
+    
+    @property
+    def num_pages(self) -> int:
+        """优先使用PyMuPDF获取页数，失败时回退到PyPDF2。"""
+        try:
+            return len(self.fitz_document)
+        except Exception:
+            return len(self.pypdf2_reader.pages)
+    
+    def close(self) -> None:
+        for handle in (self._fitz_document, self._pdfplumber_document, self._pypdf2_file):
+            if handle is not None:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
+
 
 class DocumentProcessor:
-    def __init__(self, max_chunk_size: int = 1000):
+    # 各类文件按优先级排列的提取后端名称，用于解析缓存的查找
+    PDF_BACKENDS = ['pymupdf4llm', 'pymupdf', 'pdfplumber', 'pypdf2']
+    DOCX_BACKENDS = ['python-docx']
+    TEXT_BACKENDS = ['text']
+    
+    # 扩展名 -> (读取方法名或可调用对象, 可能胜出的提取后端)。
+    # 读取方法只在处理对应类型的文件时才导入所需的第三方库
+    READERS: Dict[str, tuple] = {
+        '.pdf': ('read_pdf', PDF_BACKENDS),
+        '.docx': ('read_docx', DOCX_BACKENDS),
+        '.txt': ('read_text_file', TEXT_BACKENDS),
+        '.md': ('read_text_file', TEXT_BACKENDS),
+    }
+    DEFAULT_READER = ('read_text_file', TEXT_BACKENDS)
+    
+    CHUNK_UNITS = ('chars', 'tokens')
+    # 分块策略：paragraph按段落打包；heading按Markdown标题打包完整章节，并在每块前加上标题路径
+    CHUNK_STRATEGIES = ('paragraph', 'heading')
+    # heading策略下，块的填充率低于该比例时允许从下一章节的段落边界处切开来补满
+    HEADING_MIN_FILL = 0.5
+    # 本地PDF后端试探时的采样页数
+    PDF_SAMPLE_PAGES = 5
+    # MinerU处理时每份PDF的页数
+    MINERU_PAGES_PER_PART = 20
+    # MinerU Web API并发上传/下载的线程数
+    MINERU_TRANSFER_WORKERS = 8
+    # 文本文件编码检测的采样字节数，以及流式解码时每次读取的字节数
+    TEXT_SAMPLE_BYTES = 64 * 1024
+    TEXT_READ_BLOCK_BYTES = 1024 * 1024
+    # 不超过该大小的文本文件在结果中保留全文，更大的文件只保留文本块
+    TEXT_FULL_CONTENT_MAX_BYTES = 32 * 1024 * 1024
+    # 流式分块时一个段落最多缓冲的字符数，超过后在最后一个换行处提前切开
+    STREAM_MAX_PARAGRAPH_CHARS = 1024 * 1024
+    # 字节顺序标记及对应的编码
+    TEXT_BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+    
+    def __init__(self, max_chunk_size: int = 1000, cache: Optional[ParsedDocumentCache] = None,
+                 chunk_unit: str = 'chars', chunk_strategy: str = 'paragraph'):
         """
         初始化文档处理器，设置最大分块大小。
         
         参数:
-            max_chunk_size (int): 每个文本块的最大token数量，默认为1000
+            max_chunk_size (int): 每个文本块的最大长度，默认为1000，单位由chunk_unit决定
+            cache (ParsedDocumentCache, optional): 可选的解析结果缓存，命中时跳过文档解析
+            chunk_unit (str): 分块长度单位，'chars'按字符计数（默认），'tokens'使用本地分词器按token计数
+            chunk_strategy (str): 分块策略，'paragraph'按段落打包（默认），'heading'按Markdown标题打包章节，
+                                  没有标题的文本仍按段落打包
         """
+        if chunk_unit not in self.CHUNK_UNITS:
+            raise ValueError(f"不支持的分块单位: {chunk_unit}")
+        if chunk_strategy not in self.CHUNK_STRATEGIES:
+            raise ValueError(f"不支持的分块策略: {chunk_strategy}")
         self.max_chunk_size = max_chunk_size
+        self.chunk_unit = chunk_unit
+        self.chunk_strategy = chunk_strategy
+        self.cache = cache
         # 从环境变量获取MinerU API URL
         self.ocr_api_url = os.getenv('MINERU_API_URL', '')
     
+    @classmethod
+    def register_reader(cls, extension: str, reader: Union[str, Callable[["DocumentProcessor", str], Dict[str, Any]]],
+                        backends: List[str]) -> None:
+        """
+        为扩展名注册读取方法，已注册的扩展名会被覆盖。
+        使用多进程解析时应在模块导入阶段注册，以便工作进程中同样生效。
+        
+        参数:
+            extension (str): 文件扩展名，如'.html'
+            reader: DocumentProcessor的方法名，或以(processor, file_path)调用并返回文档字典的函数；
+                    函数所需的第三方库应在函数内部导入
+            backends (list): 该读取方法可能写入extractor字段的后端名称，用于解析缓存的查找
+        """
+        # 复制后再修改，避免子类注册时改动父类的注册表
+        cls.READERS = dict(cls.READERS)
+        cls.READERS[extension.lower()] = (reader, list(backends))
+    
     def process_uploaded_files(self, files_list) -> List[Dict[str, Any]]:
         """
         处理从Gradio上传的文件列表。
@@ -67,181 +184,280 @@ class DocumentProcessor:
             包含提取内容的字典，包括文件名、文件内容和分块信息
         """
         file_extension = os.path.splitext(file_path)[1].lower()
+        with metrics.span("parse_document", extension=file_extension.lstrip('.') or 'none'):
+            return self._process_single_file(file_path, file_extension)
+    
+    def _process_single_file(self, file_path: str, file_extension: str) -> Dict[str, Any]:
+        """
+        处理单个文件，优先使用解析缓存。
+        """
+        if self.cache is None or file_extension == '.zip':
+            return self._process_file_by_extension(file_path, file_extension)
         
+        content_hash = hash_file(file_path)
+        cached_doc = self.cache.load(file_path, self._candidate_backends(file_extension),
+                                     self.chunking_key, content_hash=content_hash)
+        if cached_doc:
+            logger.info(f"命中解析缓存 ({cached_doc['extractor']}): {file_path}")
+            metrics.increment("parse_cache_hits")
+            return cached_doc
+        
+        result = self._process_file_by_extension(file_path, file_extension)
+        if result:
+            try:
+                self.cache.store(file_path, result, self.chunking_key, content_hash=content_hash)
+            except Exception as e:
+                logger.error(f"写入解析缓存失败 {file_path}: {e}")
+        return result
+    
+    @property
+    def chunking_key(self) -> str:
+        """
+        描述分块参数的字符串，用作解析缓存键的一部分。
+        """
+        key = f"{self.max_chunk_size}t" if self.chunk_unit == 'tokens' else str(self.max_chunk_size)
+        if self.chunk_strategy != 'paragraph':
+            key += f"-{self.chunk_strategy}"
+        return key
+    
+    def _candidate_backends(self, file_extension: str) -> List[str]:
+        """
+        返回当前环境下该类文件可能胜出的提取后端，按优先级排列。
+        """
+        backends = list(self.READERS.get(file_extension, self.DEFAULT_READER)[1])
         if file_extension == '.pdf':
-            return self.read_pdf(file_path)
-        elif file_extension == '.docx':
-            return self.read_docx(file_path)
-        elif file_extension in ['.txt', '.md']:
-            return self.read_text_file(file_path)
-        elif file_extension == '.zip':
+            mineru_mode = os.getenv('MINERU_MODE', '')
+            if mineru_mode:
+                backends.insert(0, f"mineru_{mineru_mode}")
+        return backends
+    
+    def _process_file_by_extension(self, file_path: str, file_extension: str) -> Dict[str, Any]:
+        """
+        根据文件扩展名在READERS中选择读取方法，不经过解析缓存。
+        """
+        if file_extension == '.zip':
             extract_path = self.unzip_file(file_path)
             # 如果需要处理解压后的文件，可以在这里添加相关逻辑
             return {"file_name": os.path.basename(file_path), "message": "ZIP文件已解压"}
-        else:
-            return self.read_text_file(file_path)  # 尝试作为文本文件读取
+        
+        # 未注册的扩展名尝试作为文本文件读取
+        reader = self.READERS.get(file_extension, self.DEFAULT_READER)[0]
+        if isinstance(reader, str):
+            return getattr(self, reader)(file_path)
+        return reader(self, file_path)
+    
+    @staticmethod
+    def _clean_text(text: str) -> str:
+        """
+        清理文本，处理可能的编码问题。
+        依次尝试UTF-8、GBK编码，确保文本可读。
+        """
+        try:
+            return text.encode('utf-8', 'ignore').decode('utf-8')
+        except UnicodeDecodeError:
+            try:
+                return text.encode('utf-8', 'ignore').decode('gbk')
+            except UnicodeDecodeError:
+                return text
     
     def read_pdf(self, filepath: str) -> Dict[str, Any]:
         """
         使用多种方法从PDF文件中提取内容。
         首先尝试OCR API，然后依次尝试pymupdf4llm、PyMuPDF、pdfplumber和PyPDF2，直到成功提取内容。
+        本地后端先在少量采样页上试探，采样结果只决定尝试顺序：采样正常的后端立即提取全文，
+        采样为空或乱码的后端推迟到最后，仍以全文的乱码检测为准；每个库对同一文件只打开一次。
         """
         filename = os.path.basename(filepath)
         result = {'file_extension': 'pdf', 'file_name': filename}
-
-        def clean_text(text):
-            """
-            清理文本，处理可能的编码问题。
-            依次尝试UTF-8、GBK编码，确保文本可读。
-            """
+        sources = _PdfSources(filepath)
+        
+        try:
+            # 0. 首先尝试使用Mineru API处理
+            mineru_mode = os.getenv('MINERU_MODE', '')
+            if mineru_mode:
+                with metrics.span("pdf_backend", backend=f"mineru_{mineru_mode}", pages="full"):
+                    markdown_text = self._read_pdf_with_mineru(sources, filename, mineru_mode)
+                if markdown_text:
+                    return self._build_pdf_result(result, f"mineru_{mineru_mode}", markdown_text)
+            else:
+                logger.info(f"MINERU_MODE环境变量未设置，跳过Mineru API处理步骤")
+            
+            # 1. 依次试探本地提取后端
             try:
-                return text.encode('utf-8', 'ignore').decode('utf-8')
-            except UnicodeDecodeError:
+                sample_pages = self._sample_pdf_pages(sources.num_pages)
+            except Exception as e:
+                logger.error(f"读取 {filename} 页数失败: {e}")
+                sample_pages = None
+            
+            # 采样页中没有文本（例如采样恰好落在图片页上）或像乱码（例如采样落在公式、表格密集的页上）的后端
+            # 不直接放弃，推迟到采样正常的后端之后再按全文判断，其中采样为空的先于采样乱码的尝试
+            empty_sample_backends = []
+            garbled_sample_backends = []
+            for backend in self.PDF_BACKENDS:
                 try:
-                    return text.encode('utf-8', 'ignore').decode('gbk')
-                except UnicodeDecodeError:
-                    return text
-                    
-        # 0. 首先尝试使用Mineru API处理
-        mineru_mode = os.getenv('MINERU_MODE', '')
-        if mineru_mode:
-            try:
-                logger.info(f"尝试使用Mineru API ({mineru_mode})提取文件 {filename}...")
-                with open(filepath, 'rb') as file:
-                    pdf = PyPDF2.PdfReader(file)
-                    num_pages = len(pdf.pages)
-                    all_markdown_content = []
-                    
-                    for i in range(0, num_pages, 20):
-                        logger.info(f"正在处理第 {i//20+1} 页到第 {min(i + 20, num_pages)//20+1} 页")
-                        end_page = min(i + 20, num_pages)
-                        
-                        # 创建一个新的 PDF 写入器
-                        pdf_writer = PyPDF2.PdfWriter()
-                        for page_num in range(i, end_page):
-                            pdf_writer.add_page(pdf.pages[page_num])
-                        
-                        # 将切分后的 PDF 保存到内存中
-                        temp_pdf = io.BytesIO()
-                        pdf_writer.write(temp_pdf)
-                        temp_pdf.seek(0)
-                        
-                        # 根据MINERU_MODE处理该部分PDF
-                        temp_file_path = f"/tmp/{filename}_part_{i//20+1}.pdf"
-                        with open(temp_file_path, 'wb') as tmp_file:
-                            tmp_file.write(temp_pdf.getvalue())
-                        
-                        try:
-                            markdown_content = ""
-                            if mineru_mode == 'web_api':
-                                markdown_content = self.parse_pdf_to_markdown_mineru_web_api(temp_file_path)
-                            elif mineru_mode == 'local_api':
-                                markdown_content = self.parse_pdf_to_markdown_mineru_local_api(temp_file_path)
-                            else:
-                                logger.info(f"未知的MINERU_MODE值: {mineru_mode}，跳过Mineru API处理")
-                                
-                            if markdown_content:
-                                all_markdown_content.append(markdown_content)
-                            
-                            # 删除临时文件
-                            if os.path.exists(temp_file_path):
-                                os.remove(temp_file_path)
-                                
-                        except Exception as e:
-                            logger.error(f"处理PDF部分 {i//20+1} 失败: {e}")
-                            # 继续处理其他部分
+                    if sample_pages is not None:
+                        sample_text = self._clean_text(self._extract_pdf_text(backend, sources, sample_pages))
+                        if not sample_text.strip():
+                            logger.info(f"{backend}在采样页中未提取到文本，推迟尝试，文件: {filename}")
+                            empty_sample_backends.append(backend)
+                            continue
+                        if self.is_text_garbled(sample_text):
+                            logger.info(f"{backend}采样页结果疑似乱码，推迟尝试，文件: {filename}")
+                            garbled_sample_backends.append(backend)
+                            continue
                     
-                    if all_markdown_content:
-                        combined_ocr_text = clean_text("".join(all_markdown_content))
-                        logger.info(f"Mineru API提取内容: {combined_ocr_text[:50]}...")
-                        if combined_ocr_text and not self.is_text_garbled(combined_ocr_text):
-                            result['file_content'] = combined_ocr_text
-                            result['chunks'] = self.split_content_to_chunks(combined_ocr_text)
-                            return result
-                    logger.info(f"Mineru API结果为空或乱码，文件: {filename}")
-                
-            except Exception as e:
-                logger.error(f"Mineru API ({mineru_mode})处理 {filename} 失败: {e}")
-        else:
-            logger.info(f"MINERU_MODE环境变量未设置，跳过Mineru API处理步骤")
-
-        # 0.5. 尝试使用pymupdf4llm
-        try:
-            import pymupdf4llm
-            logger.info(f"尝试使用pymupdf4llm提取文件 {filename}...")
+                    text = self._extract_full_pdf_text(backend, sources, filename)
+                    if text:
+                        return self._build_pdf_result(result, backend, text)
+                except ImportError:
+                    logger.info(f"{backend}未安装，跳过此提取方法")
+                except Exception as e:
+                    logger.error(f"{backend} 处理 {filename} 失败: {e}")
+            
+            for backend in empty_sample_backends + garbled_sample_backends:
+                try:
+                    text = self._extract_full_pdf_text(backend, sources, filename)
+                    if text:
+                        return self._build_pdf_result(result, backend, text)
+                except Exception as e:
+                    logger.error(f"{backend} 处理 {filename} 失败: {e}")
+        finally:
+            sources.close()
+        
+        logger.error(f"所有提取方法对 {filename} 都失败了")
+        return {}
+    
+    def _build_pdf_result(self, result: Dict[str, Any], backend: str, text: str) -> Dict[str, Any]:
+        """
+        用胜出后端提取的全文填充PDF读取结果。
+        """
+        result['extractor'] = backend
+        result['file_content'] = text
+        result['chunks'] = self.split_content_to_chunks(text)
+        return result
+    
+    def _sample_pdf_pages(self, num_pages: int) -> Optional[List[int]]:
+        """
+        从文档中均匀选取PDF_SAMPLE_PAGES个页码用于试探。
+        页数不多于采样数时返回None，表示直接提取全文。
+        """
+        if num_pages <= self.PDF_SAMPLE_PAGES:
+            return None
+        return sorted({int((i + 0.5) * num_pages / self.PDF_SAMPLE_PAGES) for i in range(self.PDF_SAMPLE_PAGES)})
+    
+    def _extract_full_pdf_text(self, backend: str, sources: "_PdfSources", filename: str) -> str:
+        """
+        使用指定后端提取全文，结果为空或乱码时返回空字符串。
+        """
+        text = self._clean_text(self._extract_pdf_text(backend, sources))
+        logger.info(f"{backend}提取内容: {text[:50]}...")
+        if text and not self.is_text_garbled(text):
+            return text
+        logger.info(f"{backend}结果为空或乱码，文件: {filename}")
+        return ""
+    
+    def _extract_pdf_text(self, backend: str, sources: "_PdfSources", pages: Optional[List[int]] = None) -> str:
+        """
+        使用指定后端提取PDF文本。
+        
+        参数:
+            backend (str): 后端名称，取值见PDF_BACKENDS
+            sources (_PdfSources): 已打开的PDF句柄
+            pages (list, optional): 要提取的页码（从0开始），为None时提取全部页面
             
-            # 使用pymupdf4llm提取PDF内容为Markdown格式
-            md_text = pymupdf4llm.to_markdown(
-                filepath,
+        返回:
+            提取的文本
+        """
+        with metrics.span("pdf_backend", backend=backend, pages="sample" if pages is not None else "full"):
+            return self._extract_pdf_text_with_backend(backend, sources, pages)
+    
+    def _extract_pdf_text_with_backend(self, backend: str, sources: "_PdfSources", pages: Optional[List[int]]) -> str:
+        """
+        按后端名称分派到对应库的文本提取实现。
+        """
+        if backend == 'pymupdf4llm':
+            import pymupdf4llm
+            # 使用pymupdf4llm提取PDF内容为Markdown格式，复用已打开的PyMuPDF文档
+            return pymupdf4llm.to_markdown(
+                sources.fitz_document,
+                pages=pages,
                 force_text=True,
                 show_progress=False,  # 不显示进度条
                 write_images=False,   # 不写出图片
                 embed_images=False    # 不嵌入图片
             )
-            
-            if md_text:
-                # 清理文本
-                md_text = clean_text(md_text)
-                logger.info(f"pymupdf4llm提取内容: {md_text[:50]}...")
-                
-                if md_text and not self.is_text_garbled(md_text):
-                    result['file_content'] = md_text
-                    result['chunks'] = self.split_content_to_chunks(md_text)
-                    return result
-                logger.info(f"pymupdf4llm结果为空或乱码，文件: {filename}")
-        except ImportError:
-            logger.info("pymupdf4llm未安装，跳过此提取方法")
-        except Exception as e:
-            logger.error(f"pymupdf4llm处理 {filename} 失败: {e}")
         
-        # 1. 尝试使用 PyMuPDF (fitz)
-        try:
-            document = fitz.open(filepath)
-            content = []
-            for page in document:
-                content.append(clean_text(page.get_text()))
-            combined_text = clean_text("".join(content))
-            logger.info(f"PyMuPDF提取内容: {combined_text[:50]}...")
-            if combined_text and not self.is_text_garbled(combined_text):
-                result['file_content'] = combined_text
-                result['chunks'] = self.split_content_to_chunks(combined_text)
-                return result
-        except Exception as e:
-            logger.error(f"PyMuPDF (fitz) 处理 {filename} 失败: {e}")
-
-        # 2. 尝试使用 pdfplumber
-        try:
-            with pdfplumber.open(filepath) as pdf:
-                content = []
-                for page in pdf.pages:
-                    content.append(clean_text(page.extract_text() or ""))
-            combined_text = clean_text("".join(content))
-            logger.info(f"pdfplumber提取内容: {combined_text[:50]}...")
-            if combined_text and not self.is_text_garbled(combined_text):
-                result['file_content'] = combined_text
-                result['chunks'] = self.split_content_to_chunks(combined_text)
-                return result
-        except Exception as e:
-            logger.error(f"pdfplumber 处理 {filename} 失败: {e}")
-
-        # 3. 尝试使用 PyPDF2
+        if backend == 'pymupdf':
+            document = sources.fitz_document
+            page_indices = pages if pages is not None else range(len(document))
+            return "".join(self._clean_text(document[i].get_text()) for i in page_indices)
+        
+        if backend == 'pdfplumber':
+            pdf_pages = sources.pdfplumber_document.pages
+            selected = [pdf_pages[i] for i in pages] if pages is not None else pdf_pages
+            return "".join(self._clean_text(page.extract_text() or "") for page in selected)
+        
+        if backend == 'pypdf2':
+            reader_pages = sources.pypdf2_reader.pages
+            selected = [reader_pages[i] for i in pages] if pages is not None else reader_pages
+            return "".join(self._clean_text(page.extract_text() or "") for page in selected)
+        
+        raise ValueError(f"未知的PDF提取后端: {backend}")
+    
+    def _read_pdf_with_mineru(self, sources: "_PdfSources", filename: str, mineru_mode: str) -> str:
+        """
+        使用Mineru API提取PDF内容，失败、为空或乱码时返回空字符串。
+        """
+        temp_dir = tempfile.mkdtemp(prefix="mineru_")
         try:
-            with open(filepath, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                content = []
-                for page in reader.pages:
-                    content.append(clean_text(page.extract_text() or ""))
-            combined_text = clean_text("".join(content))
-            logger.info(f"PyPDF2提取内容: {combined_text[:50]}...")
-            if combined_text and not self.is_text_garbled(combined_text):
-                result['file_content'] = combined_text
-                result['chunks'] = self.split_content_to_chunks(combined_text)
-                return result
+            logger.info(f"尝试使用Mineru API ({mineru_mode})提取文件 {filename}...")
+            import PyPDF2
+            pdf = sources.pypdf2_reader
+            num_pages = len(pdf.pages)
+            
+            # 按每份MINERU_PAGES_PER_PART页切分PDF，先全部写出再统一提交
+            part_paths = []
+            for i in range(0, num_pages, self.MINERU_PAGES_PER_PART):
+                end_page = min(i + self.MINERU_PAGES_PER_PART, num_pages)
+                pdf_writer = PyPDF2.PdfWriter()
+                for page_num in range(i, end_page):
+                    pdf_writer.add_page(pdf.pages[page_num])
+                
+                part_path = os.path.join(temp_dir, f"{filename}_part_{len(part_paths)+1}.pdf")
+                with open(part_path, 'wb') as tmp_file:
+                    pdf_writer.write(tmp_file)
+                part_paths.append(part_path)
+            
+            logger.info(f"{filename} 共 {num_pages} 页，切分为 {len(part_paths)} 份")
+            
+            all_markdown_content = []
+            if mineru_mode == 'web_api':
+                # 所有部分在一个批次中提交，OCR耗时取决于最慢的部分而不是所有部分之和
+                part_results = self.parse_pdf_parts_to_markdown_mineru_web_api(part_paths)
+                all_markdown_content = [content for content in part_results if content]
+            elif mineru_mode == 'local_api':
+                for index, part_path in enumerate(part_paths):
+                    try:
+                        markdown_content = self.parse_pdf_to_markdown_mineru_local_api(part_path)
+                        if markdown_content:
+                            all_markdown_content.append(markdown_content)
+                    except Exception as e:
+                        logger.error(f"处理PDF部分 {index+1} 失败: {e}")
+                        # 继续处理其他部分
+            else:
+                logger.info(f"未知的MINERU_MODE值: {mineru_mode}，跳过Mineru API处理")
+            
+            if all_markdown_content:
+                combined_ocr_text = self._clean_text("".join(all_markdown_content))
+                logger.info(f"Mineru API提取内容: {combined_ocr_text[:50]}...")
+                if combined_ocr_text and not self.is_text_garbled(combined_ocr_text):
+                    return combined_ocr_text
+            logger.info(f"Mineru API结果为空或乱码，文件: {filename}")
         except Exception as e:
-            logger.error(f"PyPDF2 处理 {filename} 失败: {e}")
-
-        logger.error(f"所有提取方法对 {filename} 都失败了")
-        return {}
+            logger.error(f"Mineru API ({mineru_mode})处理 {filename} 失败: {e}")
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return ""
 
     def read_docx(self, filepath: str) -> Dict[str, Any]:
         """
@@ -250,7 +466,8 @@ class DocumentProcessor:
         """
         try:
             filename = os.path.basename(filepath)
-            result = {'file_extension': 'docx', 'file_name': filename}
+            result = {'file_extension': 'docx', 'file_name': filename, 'extractor': 'python-docx'}
+            import docx
             doc = docx.Document(filepath)
             full_text = []
             for para in doc.paragraphs:
@@ -266,35 +483,171 @@ class DocumentProcessor:
     def read_text_file(self, filepath: str) -> Dict[str, Any]:
         """
         从文本文件（TXT、MD等）中提取内容。
-        支持多种编码格式，包括UTF-8、GBK等。
+        编码根据文件的少量采样字节检测（UTF-8、GBK，失败时使用chardet），随后用增量解码器流式严格解码；
+        采样之外出现无法解码的字节时，依次改用GBK和chardet对全文的检测结果从头重新读取，不会静默丢弃内容。
+        超过TEXT_FULL_CONTENT_MAX_BYTES的文件通过iter_text_file_chunks边读边分块，结果中只保留文本块而不保留全文，
+        省去全文及其切分时的副本；文本块列表本身仍与文件大小成正比。
         """
         try:
             filename = os.path.basename(filepath)
             file_extension = os.path.splitext(filename)[1].lower()
-            result = {'file_extension': file_extension, 'file_name': filename}
+            result = {'file_extension': file_extension, 'file_name': filename, 'extractor': 'text'}
             
-            # 首先尝试使用UTF-8编码
-            try:
-                with open(filepath, 'r', encoding='utf-8') as file:
-                    file_content = file.read()
-            except UnicodeDecodeError:
-                # 如果UTF-8失败，尝试使用GBK编码
+            full_content = os.path.getsize(filepath) <= self.TEXT_FULL_CONTENT_MAX_BYTES
+            for encoding, errors in self._decoding_attempts(filepath, self.detect_text_encoding(filepath)):
                 try:
-                    with open(filepath, 'r', encoding='gbk') as file:
-                        file_content = file.read()
-                except Exception:
-                    # 如果GBK也失败，使用chardet检测编码
-                    with open(filepath, 'rb') as file:
-                        raw_data = file.read()
-                        encoding = chardet.detect(raw_data)['encoding']
-                        file_content = raw_data.decode(encoding or 'utf-8', errors='ignore')
-            
-            result['file_content'] = file_content
-            result['chunks'] = self.split_content_to_chunks(file_content)
+                    if full_content:
+                        file_content = "".join(self.iter_text_blocks(filepath, encoding, errors))
+                        result['file_content'] = file_content
+                        result['chunks'] = self.split_content_to_chunks(file_content)
+                    else:
+                        logger.info(f"{filename} 较大，按 {encoding} 编码流式分块")
+                        with metrics.span("chunking", unit=self.chunk_unit, strategy=self.chunk_strategy):
+                            result['chunks'] = list(self.iter_text_file_chunks(filepath, encoding, errors))
+                    break
+                except UnicodeDecodeError as e:
+                    logger.warning(f"{filename} 按 {encoding} 编码解码失败（{e}），换用其他编码重新读取")
             return result
         except Exception as e:
             logger.error(f"读取 {filepath} 时出错: {e}")
             return {}
+    
+    def detect_text_encoding(self, filepath: str) -> str:
+        """
+        根据文件开头及中间几处的采样字节检测文本编码，不读取整个文件。
+        
+        参数:
+            filepath (str): 文本文件路径
+            
+        返回:
+            编码名称，依次尝试字节顺序标记、UTF-8、GBK，都不符合时使用chardet对采样的检测结果
+        """
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(self.TEXT_SAMPLE_BYTES)
+            # 大文件再从中间均匀取三段较小的采样，避免只有开头是ASCII时误判为UTF-8
+            windows = []
+            if size > 2 * self.TEXT_SAMPLE_BYTES:
+                for i in range(1, 4):
+                    f.seek(size * i // 4)
+                    windows.append(f.read(self.TEXT_SAMPLE_BYTES // 4))
+        
+        for bom, encoding in self.TEXT_BOMS:
+            if head.startswith(bom):
+                return encoding
+        
+        complete = size <= len(head)
+        # 中间的采样可能从一个多字节字符的中部开始，先去掉开头的UTF-8后续字节
+        if (self._decodes(head, 'utf-8', complete)
+                and all(self._decodes(window.lstrip(bytes(range(0x80, 0xC0))), 'utf-8') for window in windows)):
+            return 'utf-8'
+        if self._decodes(head, 'gbk', complete):
+            return 'gbk'
+        
+        import chardet
+        return chardet.detect(head + b"".join(windows))['encoding'] or 'utf-8'
+    
+    def _decoding_attempts(self, filepath: str, encoding: str) -> Iterator[Tuple[str, str]]:
+        """
+        依次产出读取文本文件时尝试的(编码, 错误处理方式)：先严格按检测到的编码，再严格按GBK，
+        最后按chardet对整个文件的检测结果并忽略无法解码的字节。chardet只在前面的尝试都失败时才运行。
+        """
+        yield encoding, 'strict'
+        if codecs.lookup(encoding).name != codecs.lookup('gbk').name:
+            yield 'gbk', 'strict'
+        
+        import chardet
+        detector = chardet.UniversalDetector()
+        with open(filepath, 'rb') as f:
+            for data in iter(lambda: f.read(self.TEXT_READ_BLOCK_BYTES), b''):
+                detector.feed(data)
+                if detector.done:
+                    break
+        detector.close()
+        yield detector.result['encoding'] or 'utf-8', 'ignore'
+    
+    @staticmethod
+    def _decodes(data: bytes, encoding: str, final: bool = False) -> bool:
+        """
+        判断采样字节能否按指定编码解码。final为False时允许结尾是被截断的多字节字符。
+        """
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(data, final=final)
+            return True
+        except UnicodeDecodeError:
+            return False
+    
+    def iter_text_blocks(self, filepath: str, encoding: str, errors: str = 'strict') -> Iterator[str]:
+        """
+        按块读取并增量解码文本文件，换行符统一转换为LF，内存占用与文件大小无关。
+        
+        参数:
+            filepath (str): 文本文件路径
+            encoding (str): 文件编码，通常由detect_text_encoding得到
+            errors (str): 解码错误的处理方式，默认'strict'，遇到无法解码的字节时抛出UnicodeDecodeError
+            
+        返回:
+            生成器，逐个产出解码后的文本片段
+        """
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(errors=errors), translate=True)
+        with open(filepath, 'rb') as f:
+            while True:
+                data = f.read(self.TEXT_READ_BLOCK_BYTES)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    
+    def iter_paragraphs(self, blocks: Iterable[str]) -> Iterator[str]:
+        """
+        把流式文本片段按空行切分为段落，与_split_paragraphs_to_chunks对全文按空行切分的结果一致（空段落除外）。
+        没有空行的内容超过STREAM_MAX_PARAGRAPH_CHARS时在最后一个换行处提前切开。
+        
+        参数:
+            blocks: 文本片段的可迭代对象
+            
+        返回:
+            生成器，逐个产出段落
+        """
+        pending = ""
+        for block in blocks:
+            pieces = re.split(r'\n\s*\n', pending + block)
+            # 最后一段可能还没读完，留到下一个片段再切分
+            pending = pieces.pop()
+            for piece in pieces:
+                if piece.strip():
+                    yield piece
+            if len(pending) > self.STREAM_MAX_PARAGRAPH_CHARS:
+                cut = pending.rfind("\n") + 1 or len(pending)
+                yield pending[:cut]
+                pending = pending[cut:]
+        if pending.strip():
+            yield pending
+    
+    def iter_text_file_chunks(self, filepath: str, encoding: Optional[str] = None,
+                              errors: str = 'strict') -> Iterator[str]:
+        """
+        以恒定内存对文本文件分块：增量解码，按分块策略流式切分为段落（paragraph）或章节（heading），
+        再按max_chunk_size组装文本块。生成器本身只缓冲当前段落或章节以及正在组装的文本块。
+        heading策略无法预先知道全文是否有标题，没有标题的文件按无标题章节打包，与paragraph策略的结果基本一致。
+        
+        参数:
+            filepath (str): 文本文件路径
+            encoding (str, optional): 文件编码，为None时调用detect_text_encoding检测
+            errors (str): 解码错误的处理方式，默认'strict'
+            
+        返回:
+            生成器，逐个产出文本块
+        """
+        encoding = encoding or self.detect_text_encoding(filepath)
+        blocks = self.iter_text_blocks(filepath, encoding, errors)
+        if self.chunk_strategy == 'heading':
+            return self._iter_section_chunks(self.iter_markdown_sections(blocks))
+        return self._iter_paragraph_chunks(self.iter_paragraphs(blocks))
 
     def unzip_file(self, zip_file_path: str) -> str:
         """
@@ -314,6 +667,7 @@ class DocumentProcessor:
                         filename = zip_info.filename.encode('cp437').decode('gbk')
                     except UnicodeDecodeError:
                         try:
+                            import chardet
                             detected_encoding = chardet.detect(zip_info.filename.encode('utf-8'))
                             encoding = detected_encoding['encoding']
                             filename = zip_info.filename.encode('utf-8').decode(encoding)
@@ -329,73 +683,218 @@ class DocumentProcessor:
     def is_text_garbled(self, text: str) -> bool:
         """
         检查提取的文本是否乱码。
-        通过分析中文字符比例和特殊符号比例来判断文本质量。
+        通过分析中文字符比例和特殊符号比例来判断文本质量；长文本只统计分层采样的字符直方图，
+        开销与文本长度基本无关，也可以对单页调用。
         """
-        chinese_characters = re.findall(r'[\u4e00-\u9fff]', text)
-        symbol_characters = re.findall(r'[\u0000-\u0020\u3000\uFFFD]', text)
-
-        if len(chinese_characters) > 0:
-            chinese_ratio = len(chinese_characters) / max(len(text), 1)
-            symbol_ratio = len(symbol_characters) / max(len(text), 1)
-            return chinese_ratio < 0.2 or symbol_ratio > 0.3
-
-        non_ascii_ratio = sum(1 for char in text if ord(char) > 127) / max(len(text), 1)
-        return non_ascii_ratio > 0.3
+        return is_garbled(text)
+    
+    def measure(self, text: str) -> int:
+        """
+        按当前分块单位计算文本长度：chars模式为字符数，tokens模式为token数。
+        """
+        if self.chunk_unit == 'tokens':
+            return count_tokens(text)
+        return len(text)
+    
+    def _hard_split(self, text: str, max_size: Optional[int] = None) -> List[str]:
+        """
+        将无法按句子切分的超长文本硬切分为不超过max_size（默认max_chunk_size）的片段。
+        """
+        max_size = max_size or self.max_chunk_size
+        if self.chunk_unit == 'tokens':
+            return split_text_by_tokens(text, max_size)
+        return [text[i:i+max_size] for i in range(0, len(text), max_size)]
     
     def split_content_to_chunks(self, content: str) -> List[str]:
         """
         根据max_chunk_size将内容分割成多个块。
         
-        实现了一个基于段落和句子的简单分割策略。
-        在生产环境中可以使用更复杂的分割方法。
+        paragraph策略基于段落和句子分割；heading策略按Markdown标题打包完整章节，
+        内容中没有标题时回退到paragraph策略。长度按chunk_unit计量（字符或token）。
+        """
+        with metrics.span("chunking", unit=self.chunk_unit, strategy=self.chunk_strategy):
+            if self.chunk_strategy == 'heading':
+                sections = self.split_markdown_by_headings(content)
+                if any(section['heading_level'] > 0 for section in sections):
+                    return self._split_sections_to_chunks(sections)
+            return self._split_paragraphs_to_chunks(content)
+    
+    def _split_paragraphs_to_chunks(self, content: str, max_size: Optional[int] = None) -> List[str]:
+        """
+        split_content_to_chunks的实现：先按段落累积，超长段落再按句子和硬切分处理。
         """
         # 按段落分割内容
-        paragraphs = re.split(r'\n\s*\n', content)
-        chunks = []
+        return list(self._iter_paragraph_chunks(re.split(r'\n\s*\n', content), max_size))
+    
+    def _iter_paragraph_chunks(self, paragraphs: Iterable[str], max_size: Optional[int] = None) -> Iterator[str]:
+        """
+        将段落序列组装为文本块的生成器，段落可以来自完整文本，也可以来自流式读取。
+        每块不超过max_size，默认为max_chunk_size。
+        """
+        max_size = max_size or self.max_chunk_size
         current_chunk = ""
+        current_size = 0
         
         for paragraph in paragraphs:
             paragraph = paragraph.strip()
             if not paragraph:
                 continue
-                
+            
+            paragraph_size = self.measure(paragraph)
+            
             # 如果段落可以放入当前块，则添加
-            if len(current_chunk) + len(paragraph) <= self.max_chunk_size:
+            if current_size + paragraph_size <= max_size:
                 current_chunk += paragraph + "\n\n"
+                current_size += self.measure(paragraph + "\n\n")
             else:
                 # 如果当前块不为空，将其添加到块列表中
                 if current_chunk:
-                    chunks.append(current_chunk.strip())
+                    yield current_chunk.strip()
                 
                 # 如果段落小于max_chunk_size，用它开始新的块
-                if len(paragraph) <= self.max_chunk_size:
+                if paragraph_size <= max_size:
                     current_chunk = paragraph + "\n\n"
+                    current_size = self.measure(current_chunk)
                 else:
                     # 将大段落分割成句子
                     sentences = re.split(r'(?<=[.!?。！？])\s+', paragraph)
                     current_chunk = ""
+                    current_size = 0
                     
                     for sentence in sentences:
-                        if len(current_chunk) + len(sentence) <= self.max_chunk_size:
+                        sentence_size = self.measure(sentence)
+                        if current_size + sentence_size <= max_size:
                             current_chunk += sentence + " "
+                            current_size += self.measure(sentence + " ")
                         else:
                             if current_chunk:
-                                chunks.append(current_chunk.strip())
+                                yield current_chunk.strip()
                             
                             # 如果句子太长，进一步分割
-                            if len(sentence) > self.max_chunk_size:
-                                sentence_chunks = [sentence[i:i+self.max_chunk_size] 
-                                                 for i in range(0, len(sentence), self.max_chunk_size)]
-                                chunks.extend(sentence_chunks[:-1])
+                            if sentence_size > max_size:
+                                sentence_chunks = self._hard_split(sentence, max_size)
+                                yield from sentence_chunks[:-1]
                                 current_chunk = sentence_chunks[-1] + " "
                             else:
                                 current_chunk = sentence + " "
+                            current_size = self.measure(current_chunk)
         
         # 如果最后一个块不为空，添加它
         if current_chunk:
-            chunks.append(current_chunk.strip())
+            yield current_chunk.strip()
+    
+    def _split_sections_to_chunks(self, sections: List[Dict[str, Any]]) -> List[str]:
+        """
+        heading策略的实现，见_iter_section_chunks。
+        """
+        return list(self._iter_section_chunks(sections))
+    
+    def _iter_section_chunks(self, sections: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """
+        heading策略的文本块生成器，章节可以来自完整文本，也可以来自流式读取：把相邻的完整章节打包到max_chunk_size以内，每块以首个章节的标题路径
+        （如"# 指南 > 2. 病情评估"）开头，块内其余章节保留各自的标题行。
+        下一章节放不下时另起一块；只有当前块不足一半时才在段落边界处切开章节补满。
+        单个章节超出预算时按段落切分，每一片都带上该章节的标题路径。
+        
+        参数:
+            sections: split_markdown_by_headings或iter_markdown_sections产出的章节
+            
+        返回:
+            生成器，逐个产出文本块
+        """
+        separator_size = self.measure("\n\n")
+        current_units: List[str] = []
+        current_size = 0
+        # 当前所在的标题栈，元素为(级别, 标题)
+        heading_stack: List[tuple] = []
+        # 没有正文的标题行
+        bare_headings = set()
+        
+        def flush() -> Optional[str]:
+            """结束当前块，返回它的文本；当前块为空时返回None。"""
+            nonlocal current_units, current_size
+            # 块尾只有标题、没有正文的章节移到下一块，它们会出现在下一块的标题路径中
+            while current_units and current_units[-1] in bare_headings:
+                current_units.pop()
+            chunk = "\n\n".join(current_units) if current_units else None
+            current_units = []
+            current_size = 0
+            return chunk
         
-        return chunks
+        for section in sections:
+            level = section['heading_level']
+            content = section['content']
+            if level > 0:
+                while heading_stack and heading_stack[-1][0] >= level:
+                    heading_stack.pop()
+                heading_stack.append((level, section['heading']))
+                heading_line = f"{'#' * level} {section['heading']}"
+            else:
+                # 没有标题的部分（如第一个标题之前的前言）归属于当前的标题路径
+                heading_line = ""
+            path = " > ".join(heading for _, heading in heading_stack)
+            path_line = f"# {path}" if path else ""
+            
+            unit = "\n\n".join(part for part in (heading_line, content) if part)
+            if not unit:
+                continue
+            if not content:
+                bare_headings.add(unit)
+            unit_size = self.measure(unit)
+            
+            if current_units and current_size + separator_size + unit_size <= self.max_chunk_size:
+                current_units.append(unit)
+                current_size += separator_size + unit_size
+                continue
+            
+            # 当前块不足HEADING_MIN_FILL时，先用该章节开头的若干段落把它补满，
+            # 剩余段落再带着标题路径进入新块，避免留下大量半空的块
+            if current_units and current_size < self.max_chunk_size * self.HEADING_MIN_FILL:
+                parts = ([heading_line] if heading_line else []) + [
+                    paragraph.strip() for paragraph in re.split(r'\n\s*\n', content) if paragraph.strip()]
+                taken = 0
+                size = current_size
+                for part in parts:
+                    part_size = separator_size + self.measure(part)
+                    if size + part_size > self.max_chunk_size:
+                        break
+                    size += part_size
+                    taken += 1
+                # 至少要带上一个正文段落，不能只在块尾留下孤立的标题
+                if taken > (1 if heading_line else 0):
+                    current_units.extend(parts[:taken])
+                    chunk = flush()
+                    if chunk:
+                        yield chunk
+                    heading_line = ""
+                    content = unit = "\n\n".join(parts[taken:])
+                    if not content:
+                        continue
+            
+            # 新块以标题路径开头，章节自己的标题已包含在路径中
+            chunk = flush()
+            if chunk:
+                yield chunk
+            head = path_line or heading_line
+            body = content if heading_line else unit
+            head_size = self.measure(head) + separator_size if head else 0
+            if head_size + self.measure(body) <= self.max_chunk_size:
+                current_units = [part for part in (head, body) if part]
+                current_size = self.measure("\n\n".join(current_units))
+                continue
+            
+            # 章节本身超出预算：按段落切分正文，每片都加上标题路径；
+            # 最后一片保持打开，后续的小章节可以继续打包进来，避免产生许多零碎的尾块
+            pieces = self._split_paragraphs_to_chunks(body, max(self.max_chunk_size - head_size, 1)) if body else []
+            pieces = [f"{head}\n\n{piece}" if head else piece for piece in pieces]
+            yield from pieces[:-1]
+            if pieces:
+                current_units = [pieces[-1]]
+                current_size = self.measure(pieces[-1])
+        
+        chunk = flush()
+        if chunk:
+            yield chunk
     
     def split_markdown_by_headings(self, markdown_text: str) -> List[Dict[str, str]]:
         """
@@ -426,34 +925,58 @@ class DocumentProcessor:
 
         # 使用正则表达式按标题分割markdown
         headings = re.split(r'\n\s*(?=#)', markdown_text.strip())
-        result = []
-        
-        for i, section in enumerate(headings):
-            if not section.strip():
-                continue
-                
-            # 解析标题级别和内容
-            match = re.match(r'(#+)\s+(.+)', section)
-            if match:
-                heading_level = len(match.group(1))
-                heading_content = match.group(2).strip()
-                section_content = section[len(match.group(0)):].strip()
-                
-                # 添加带结构的标题和内容到结果中
-                result.append({
-                    'heading_level': heading_level,
-                    'heading': heading_content,
-                    'content': section_content
-                })
-            else:
-                # 处理没有正确标题的部分
-                result.append({
-                    'heading_level': 0,
-                    'heading': f"Section {i+1}",
-                    'content': section.strip()
-                })
+        return [self._parse_section(section, i) for i, section in enumerate(headings) if section.strip()]
+    
+    def iter_markdown_sections(self, blocks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """
+        split_markdown_by_headings的流式版本：在流式文本片段中按标题切分章节。
+        没有标题的内容超过STREAM_MAX_PARAGRAPH_CHARS时在最后一个空行（没有空行时在最后一个换行）处提前切开，
+        后半部分作为无标题章节产出，归属于当前的标题路径。
         
-        return result
+        参数:
+            blocks: 文本片段的可迭代对象
+            
+        返回:
+            生成器，逐个产出与split_markdown_by_headings格式相同的章节
+        """
+        pending = ""
+        index = 0
+        for block in blocks:
+            pieces = re.split(r'\n\s*(?=#)', pending + block)
+            # 最后一个章节可能还没读完，留到下一个片段再切分
+            pending = pieces.pop()
+            for piece in pieces:
+                if piece.strip():
+                    yield self._parse_section(piece, index)
+                index += 1
+            if len(pending) > self.STREAM_MAX_PARAGRAPH_CHARS:
+                cut = pending.rfind("\n\n") + 1 or pending.rfind("\n") + 1 or len(pending)
+                if pending[:cut].strip():
+                    yield self._parse_section(pending[:cut], index)
+                index += 1
+                pending = pending[cut:]
+        if pending.strip():
+            yield self._parse_section(pending, index)
+    
+    @staticmethod
+    def _parse_section(section: str, index: int) -> Dict[str, Any]:
+        """
+        解析按标题切分出的一段文本的标题级别、标题和内容，没有标题行时级别为0。
+        """
+        match = re.match(r'(#+)\s+(.+)', section.strip())
+        if match:
+            section = section.strip()
+            return {
+                'heading_level': len(match.group(1)),
+                'heading': match.group(2).strip(),
+                'content': section[len(match.group(0)):].strip()
+            }
+        # 处理没有正确标题的部分
+        return {
+            'heading_level': 0,
+            'heading': f"Section {index+1}",
+            'content': section.strip()
+        }
     
     def parse_pdf_to_markdown_mineru_web_api(self, pdf_path, is_ocr=False, enable_formula=True, enable_table=True, save_to_file=False, output_dir="output/mineru"):
         """
@@ -470,47 +993,116 @@ class DocumentProcessor:
         返回:
             str: PDF的Markdown内容
         """
-        # 步骤1: 获取文件上传URL
-        upload_url = f"{os.getenv('MINERU_API_URL')}/file-urls/batch"
+        try:
+            markdown_content = self.parse_pdf_parts_to_markdown_mineru_web_api(
+                [pdf_path], is_ocr=is_ocr, enable_formula=enable_formula,
+                enable_table=enable_table, raise_on_error=True
+            )[0]
+        except Exception as e:
+            raise Exception(f"解析PDF出错: {str(e)}")
+        
+        # 如果需要，将Markdown保存到文件
+        if save_to_file:
+            # 如果输出目录不存在，创建它
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # 生成输出文件名
+            base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
+            output_path = os.path.join(output_dir, f"{base_filename}.md")
+            
+            # 将Markdown内容保存到文件
+            with open(output_path, 'w', encoding='utf-8') as file:
+                file.write(markdown_content)
+            print(f"Markdown内容已保存至: {output_path}")
+        
+        return markdown_content
+    
+    def parse_pdf_parts_to_markdown_mineru_web_api(self, pdf_paths, is_ocr=False, enable_formula=True, enable_table=True,
+                                                   raise_on_error=False, max_wait=600, min_poll_interval=2, max_poll_interval=30):
+        """
+        使用Mineru Web API在一个批次中解析多个PDF文件（通常是同一文档切分出的多个部分）
+        
+        所有文件通过一次file-urls/batch请求申请上传地址并并发上传，随后由一个共享的轮询循环
+        以自适应退避的间隔查询整个批次的状态，已完成的部分立即并发下载。
+        
+        参数:
+            pdf_paths (list): 本地PDF文件路径列表，文件名需互不相同
+            is_ocr (bool, optional): 是否使用OCR。默认为False
+            enable_formula (bool, optional): 是否启用公式识别。默认为True
+            enable_table (bool, optional): 是否启用表格识别。默认为True
+            raise_on_error (bool, optional): 任一部分失败时是否抛出异常。默认为False，失败的部分返回空字符串
+            max_wait (int, optional): 整个批次的最长等待秒数。默认为600
+            min_poll_interval (float, optional): 最短轮询间隔（秒）。默认为2
+            max_poll_interval (float, optional): 最长轮询间隔（秒）。默认为30
+            
+        返回:
+            list: 与pdf_paths顺序一致的Markdown内容列表
+        """
+        if not pdf_paths:
+            return []
+        
+        import requests
+        api_url = os.getenv('MINERU_API_URL')
         headers = {
             'Content-Type': 'application/json',
             'Authorization': f"Bearer {os.getenv('MINERU_API_KEY')}"
         }
+        filenames = [os.path.basename(path) for path in pdf_paths]
+        results = [""] * len(pdf_paths)
+        errors = {}
         
-        filename = os.path.basename(pdf_path)
+        # 步骤1: 一次请求获取所有文件的上传URL
         data = {
             "enable_formula": enable_formula,
             "enable_table": enable_table,
-            "files": [{"name": filename, "is_ocr": is_ocr}]
+            "files": [{"name": name, "is_ocr": is_ocr, "data_id": str(index)} for index, name in enumerate(filenames)]
         }
+        response = requests.post(f"{api_url}/file-urls/batch", headers=headers, json=data)
+        if response.status_code != 200:
+            raise Exception(f"获取上传URL失败: {response.text}")
         
-        try:
-            response = requests.post(upload_url, headers=headers, json=data)
-            if response.status_code != 200:
-                raise Exception(f"获取上传URL失败: {response.text}")
-            
-            result = response.json()
-            if result["code"] != 0:
-                raise Exception(f"API错误: {result['msg']}")
-            
-            batch_id = result["data"]["batch_id"]
-            file_url = result["data"]["file_urls"][0]
-            
-            # 步骤2: 上传文件
-            with open(pdf_path, 'rb') as f:
-                upload_response = requests.put(file_url, data=f)
-                if upload_response.status_code != 200:
-                    raise Exception(f"上传文件失败: {upload_response.text}")
+        result = response.json()
+        if result["code"] != 0:
+            raise Exception(f"API错误: {result['msg']}")
+        
+        batch_id = result["data"]["batch_id"]
+        file_urls = result["data"]["file_urls"]
+        
+        def upload(index):
+            with open(pdf_paths[index], 'rb') as f:
+                upload_response = requests.put(file_urls[index], data=f)
+            if upload_response.status_code != 200:
+                raise Exception(f"上传文件失败: {upload_response.text}")
+        
+        def download(index, zip_url):
+            zip_response = requests.get(zip_url)
+            if zip_response.status_code != 200:
+                raise Exception(f"下载结果失败: {zip_response.text}")
+            return self._read_markdown_from_zip(zip_response.content)
+        
+        workers = min(self.MINERU_TRANSFER_WORKERS, len(pdf_paths))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 步骤2: 并发上传所有文件
+            upload_futures = {index: executor.submit(upload, index) for index in range(len(pdf_paths))}
+            for index, future in upload_futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[index] = str(e)
             
-            # 步骤3: 轮询结果
-            status_url = f"{os.getenv('MINERU_API_URL')}/extract-results/batch/{batch_id}"
-            max_retries = 60  # 最大等待时间: 10分钟
-            wait_time = 10  # 秒
+            # 步骤3: 共享的轮询循环，状态无变化时逐步拉长间隔
+            status_url = f"{api_url}/extract-results/batch/{batch_id}"
+            index_by_name = {name: index for index, name in enumerate(filenames)}
+            downloads = {}
+            pending = set(range(len(pdf_paths))) - set(errors)
+            poll_interval = min_poll_interval
+            deadline = time.monotonic() + max_wait
             
-            for _ in range(max_retries):
-                time.sleep(wait_time)
+            wait_started = time.perf_counter()
+            while pending and time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                metrics.increment("mineru_polls")
                 status_response = requests.get(status_url, headers=headers)
-                
                 if status_response.status_code != 200:
                     raise Exception(f"获取任务状态失败: {status_response.text}")
                 
@@ -518,49 +1110,51 @@ class DocumentProcessor:
                 if status_result["code"] != 0:
                     raise Exception(f"API错误: {status_result['msg']}")
                 
-                extract_results = status_result["data"]["extract_result"]
-                for result in extract_results:
-                    if result["file_name"] == filename:
-                        if result["state"] == "done":
-                            # 步骤4: 下载结果
-                            zip_url = result["full_zip_url"]
-                            zip_response = requests.get(zip_url)
-                            
-                            if zip_response.status_code != 200:
-                                raise Exception(f"下载结果失败: {zip_response.text}")
-                            
-                            # 步骤5: 提取Markdown内容
-                            with zipfile.ZipFile(BytesIO(zip_response.content)) as z:
-                                markdown_files = [f for f in z.namelist() if f.endswith('.md')]
-                                if not markdown_files:
-                                    raise Exception("在结果中未找到Markdown文件")
-                                
-                                # 获取Markdown内容
-                                markdown_content = z.read(markdown_files[0]).decode('utf-8')
-                                
-                                # 如果需要，将Markdown保存到文件
-                                if save_to_file:
-                                    # 如果输出目录不存在，创建它
-                                    os.makedirs(output_dir, exist_ok=True)
-                                    
-                                    # 生成输出文件名
-                                    base_filename = os.path.splitext(filename)[0]
-                                    output_path = os.path.join(output_dir, f"{base_filename}.md")
-                                    
-                                    # 将Markdown内容保存到文件
-                                    with open(output_path, 'w', encoding='utf-8') as file:
-                                        file.write(markdown_content)
-                                    print(f"Markdown内容已保存至: {output_path}")
-                                
-                                return markdown_content
-                        
-                        elif result["state"] == "failed":
-                            raise Exception(f"任务失败: {result.get('err_msg', '未知错误')}")
-            
-            raise Exception("任务处理超时")
+                progressed = False
+                for item in status_result["data"]["extract_result"]:
+                    index = index_by_name.get(item.get("file_name"))
+                    if index is None or index not in pending:
+                        continue
+                    if item["state"] == "done":
+                        # 步骤4: 已完成的部分立即开始下载，不等待其他部分
+                        downloads[index] = executor.submit(download, index, item["full_zip_url"])
+                        pending.discard(index)
+                        progressed = True
+                    elif item["state"] == "failed":
+                        errors[index] = f"任务失败: {item.get('err_msg', '未知错误')}"
+                        pending.discard(index)
+                        progressed = True
+                
+                poll_interval = min_poll_interval if progressed else min(poll_interval * 1.5, max_poll_interval)
+            
+            metrics.observe("mineru_wait", time.perf_counter() - wait_started)
+            for index in pending:
+                errors[index] = "任务处理超时"
+            
+            # 步骤5: 按原始顺序收集Markdown内容
+            for index, future in downloads.items():
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors[index] = str(e)
         
-        except Exception as e:
-            raise Exception(f"解析PDF出错: {str(e)}")
+        for index, error in sorted(errors.items()):
+            logger.error(f"Mineru处理 {filenames[index]} 失败: {error}")
+        if errors and raise_on_error:
+            raise Exception("; ".join(errors[index] for index in sorted(errors)))
+        
+        return results
+    
+    @staticmethod
+    def _read_markdown_from_zip(zip_content: bytes) -> str:
+        """
+        从MinerU返回的结果压缩包中读取Markdown内容。
+        """
+        with zipfile.ZipFile(BytesIO(zip_content)) as z:
+            markdown_files = [f for f in z.namelist() if f.endswith('.md')]
+            if not markdown_files:
+                raise Exception("在结果中未找到Markdown文件")
+            return z.read(markdown_files[0]).decode('utf-8')
 
     def parse_pdf_to_markdown_mineru_local_api(self, pdf_path, api_url=None, save_to_file=False, output_dir="output/mineru"):
         """
@@ -593,6 +1187,7 @@ class DocumentProcessor:
             }
             
             # 发送请求
+            import requests
             response = requests.request("POST", url, headers=headers, data=payload, files=files, timeout=600)
             
             # 检查响应状态
@@ -0,0 +1,134 @@
+"""
+文档解析流水线。
+在进程池中并行解析文档，通过有界队列把解析好的文档交给调用方（大模型提取阶段），
+使CPU密集的PDF解析与网络密集的问答提取互不阻塞。
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .document_processor import DocumentProcessor
+from ..utils.parse_cache import ParsedDocumentCache
+from ..utils.logger import disable_log_queue
+from ..utils.metrics import metrics
+
+# 每个工作进程各自持有一个文档处理器，由进程池的initializer创建
+_worker_processor: Optional[DocumentProcessor] = None
+# 工作进程不直接从主进程fork：主进程中的提取线程可能正持有指标、日志等模块的锁，
+# fork出的子进程会继承已被锁住的锁而死锁。forkserver从干净的服务进程fork，不支持时使用spawn
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _init_parse_worker(max_chunk_size: int, cache_dir: Optional[str], chunk_unit: str, chunk_strategy: str) -> None:
+    """进程池初始化函数，在每个工作进程中改为同步写日志并创建文档处理器。"""
+    global _worker_processor
+    # 工作进程退出时不执行atexit，队列模式下最后几条日志可能来不及写出
+    disable_log_queue()
+    cache = ParsedDocumentCache(cache_dir) if cache_dir else None
+    _worker_processor = DocumentProcessor(max_chunk_size=max_chunk_size, cache=cache, chunk_unit=chunk_unit,
+                                          chunk_strategy=chunk_strategy)
+
+
+def _timed_parse(processor: DocumentProcessor, file_path: str) -> Dict[str, Any]:
+    """解析单个文件，并在结果中记录解析耗时parse_seconds。"""
+    started = time.perf_counter()
+    doc = processor.process_single_file(file_path)
+    if doc:
+        doc['parse_seconds'] = time.perf_counter() - started
+    return doc
+
+
+def _parse_in_worker(file_path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """在工作进程中解析单个文件，连同本次解析产生的指标一起返回，由主进程合并。"""
+    try:
+        return _timed_parse(_worker_processor, file_path), metrics.snapshot(reset=True)
+    except Exception:
+        metrics.reset()
+        raise
+
+
+def default_parse_workers() -> int:
+    """返回默认的解析进程数，即CPU核数。"""
+    return os.cpu_count() or 1
+
+
+def iter_parsed_documents(file_infos: List[Dict[str, Any]], max_chunk_size: int,
+                          cache_dir: Optional[str] = None, workers: Optional[int] = None,
+                          prefetch: Optional[int] = None, chunk_unit: str = 'chars',
+                          chunk_strategy: str = 'paragraph') -> Iterator[Tuple[Dict[str, Any], Dict[str, Any], Optional[Exception]]]:
+    """
+    解析文件列表，按解析完成的顺序逐个产出结果。
+
+    参数:
+        file_infos: collect_files返回的文件信息列表，每项至少包含abs_path
+        max_chunk_size: 分块大小
+        cache_dir: 可选的解析缓存目录
+        workers: 解析进程数，默认等于CPU核数；为1时在当前进程中顺序解析
+        prefetch: 已解析但尚未被消费的文档数上限，默认等于workers
+        chunk_unit: 分块长度单位，'chars'或'tokens'
+        chunk_strategy: 分块策略，'paragraph'或'heading'
+
+    返回:
+        生成器，每项为(文件信息, 文档字典, 异常)，文档字典附带解析耗时parse_seconds；
+        解析失败时文档字典为空、异常非None
+    """
+    workers = min(workers or default_parse_workers(), max(len(file_infos), 1))
+
+    if workers <= 1:
+        cache = ParsedDocumentCache(cache_dir) if cache_dir else None
+        processor = DocumentProcessor(max_chunk_size=max_chunk_size, cache=cache, chunk_unit=chunk_unit,
+                                      chunk_strategy=chunk_strategy)
+        for file_info in file_infos:
+            try:
+                yield file_info, _timed_parse(processor, file_info['abs_path']), None
+            except Exception as e:
+                yield file_info, {}, e
+        return
+
+    prefetch = prefetch if prefetch is not None else workers
+    # 正在解析和已解析待消费的文档总数不超过workers + prefetch，避免解析结果在内存中堆积
+    slots = threading.BoundedSemaphore(workers + prefetch)
+    ready: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(_START_METHOD),
+        initializer=_init_parse_worker,
+        initargs=(max_chunk_size, cache_dir, chunk_unit, chunk_strategy)
+    )
+
+    def submit_all():
+        for file_info in file_infos:
+            slots.acquire()
+            if stop.is_set():
+                return
+            future = executor.submit(_parse_in_worker, file_info['abs_path'])
+            future.add_done_callback(lambda f, file_info=file_info: ready.put((file_info, f)))
+
+    producer = threading.Thread(target=submit_all, name="parse-submitter", daemon=True)
+    producer.start()
+
+    try:
+        for _ in range(len(file_infos)):
+            file_info, future = ready.get()
+            slots.release()
+            try:
+                doc, worker_metrics = future.result()
+            except Exception as e:
+                yield file_info, {}, e
+                continue
+            metrics.merge(worker_metrics)
+            yield file_info, doc, None
+    finally:
+        stop.set()
+        # 唤醒可能阻塞在slots上的提交线程，使其退出
+        try:
+            slots.release()
+        except ValueError:
+            pass
+        executor.shutdown(wait=True, cancel_futures=True)
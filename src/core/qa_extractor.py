@@ -3,26 +3,76 @@ import json
 import logging
 import time
 import re
-from typing import List, Dict, Any, Tuple
-from openai import OpenAI
-from dotenv import load_dotenv
-from ..utils.logger import BeijingLogger
-from ..utils.json_utils import JsonUtils
-
-# 加载环境变量
-load_dotenv()
+import tempfile
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Callable
+from ..utils.logger import LazyLogger
+from ..utils.json_utils import JsonUtils, IncrementalJsonArrayParser
+from ..utils.llm_cache import LLMResponseCache
+from ..utils.jsonl_writer import JsonlWriter
+from ..utils.tokenizer import count_tokens, context_window_for
+from ..utils.rate_limiter import RateLimiter
+from ..utils.metrics import metrics
+from ..utils.chunk_dedup import ChunkDeduplicator
+from ..utils.token_usage import TokenUsage
 
 # 设置日志记录器
-beijing_logger = BeijingLogger()
-logger = beijing_logger.get_logger()
+logger = LazyLogger()
+
+
+class StreamAbortedError(RuntimeError):
+    """流式输出在stream_abort_chars个字符内没有出现JSON对象，请求已被中止。"""
+
 
 class QAExtractor:
-    def __init__(self):
+    # 每次请求中消息格式本身占用的token数估计（角色标记、分隔符等）
+    MESSAGE_OVERHEAD_TOKENS = 16
+    # 合并请求中模型返回的chunk_id，容忍"2"、"chunk 2"等写法
+    _CHUNK_ID_PATTERN = re.compile(r'\d+')
+    # 批处理状态查询和结果下载失败时的重试次数，以及首次重试前的等待秒数（之后指数增长）
+    BATCH_API_RETRIES = 5
+    BATCH_RETRY_DELAY = 2.0
+    # 流式输出达到该字符数仍未出现JSON对象时中止请求，留出足够的长度容纳数组前的简短说明
+    STREAM_NOT_JSON_CHARS = 1000
+    
+    def __init__(self, max_workers: int = 1, cache: Optional[LLMResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 chunk_deduplicator: Optional[ChunkDeduplicator] = None,
+                 pack_size: int = 1, pack_max_tokens: int = 2000, stream: bool = False,
+                 token_budget: Optional[int] = None, stream_abort_chars: int = STREAM_NOT_JSON_CHARS):
         """
         初始化QA提取器，配置OpenAI API凭证。
         设置API密钥、基础URL和模型名称等关键参数。
         如果环境变量中没有API密钥，将抛出异常。
+        
+        参数:
+            max_workers: 并发处理文本块的最大线程数，默认为1（顺序处理）
+            cache: 可选的大模型响应缓存，命中时跳过API调用
+            rate_limiter: 可选的限流器，在多个线程间共享RPM/TPM预算并自适应调整并发
+            chunk_deduplicator: 可选的文本块去重器，内容相同的文本块在本次运行中只调用一次API
+            pack_size: 单个请求最多合并的文本块数，大于1时把连续的小文本块合并为一个请求
+            pack_max_tokens: 合并请求中文本块的总token数上限，超过该值的文本块单独请求
+            stream: 是否使用流式输出，边接收边解析问答对，响应明显不是JSON时提前中止以节省输出token
+            token_budget: 可选的token预算（提示词与输出token之和），用完后不再调度新的文本块，
+                          跳过的文本块按失败处理并记录在token_usage中
+            stream_abort_chars: 流式输出达到该字符数仍未出现JSON对象时中止请求，为0时不中止
         """
+        self.max_workers = max(1, int(max_workers))
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.chunk_deduplicator = chunk_deduplicator
+        self.pack_size = max(1, int(pack_size))
+        self.pack_max_tokens = pack_max_tokens
+        self.stream = stream
+        self.stream_abort_chars = max(0, int(stream_abort_chars))
+        # 流式请求是否携带stream_options.include_usage；服务端拒绝该参数时关闭，之后按本地分词器估算用量
+        self._stream_include_usage = True
+        # 每次请求的token用量，按文档和文本块归集
+        self.token_usage = TokenUsage(budget=token_budget)
+        self.temperature = 0.7
+        self.max_tokens = 4000
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
         self.model_name = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
@@ -30,14 +80,32 @@ class QAExtractor:
         if not self.api_key:
             raise ValueError("在环境变量中未找到OpenAI API密钥")
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
+        # openai SDK导入较慢，客户端在第一次请求时才创建，全部命中缓存时不必导入
+        self._client = None
+        self._client_lock = threading.Lock()
         
-        logger.info(f"QA提取器已初始化，使用模型: {self.model_name}")
+        logger.info(f"QA提取器已初始化，使用模型: {self.model_name}，并发数: {self.max_workers}")
+    
+    @property
+    def client(self):
+        """OpenAI客户端，首次访问时导入openai并创建。"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    # 使用限流器时关闭SDK内置的重试，使每次429都能被限流器观察到并统一退避
+                    client_options = {"max_retries": 0} if self.rate_limiter is not None else {}
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        **client_options
+                    )
+        return self._client
     
-    def extract_qa_pairs(self, document: Dict[str, Any], prompt: str) -> List[Dict[str, Any]]:
+    def extract_qa_pairs(self, document: Dict[str, Any], prompt: str,
+                         completed_chunks: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+                         on_chunk_done: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
+                         collect_results: bool = True) -> List[Dict[str, Any]]:
         """
         使用OpenAI从文档中提取问答对。
         
@@ -45,12 +113,17 @@ class QAExtractor:
             document: 包含文档内容和元数据的字典
                      必须包含'chunks'或'file_content'字段
             prompt: 自定义提示词，用于指导AI生成问答对
+            completed_chunks: 可选，已完成的文本块结果（键为块序号），这些块不再调用API
+            on_chunk_done: 可选回调，每个文本块成功完成后以(块序号, 问答对列表)调用，
+                          并发模式下可能在工作线程中调用
+            collect_results: 为False时不在内存中保留问答对，结果只通过on_chunk_done交付，
+                            适用于流式写出的大文档
             
         返回:
-            问答对列表，每个问答对为字典格式，包含问题和答案
+            问答对列表，每个问答对为字典格式，包含问题和答案；collect_results为False时返回空列表
         """
-        all_qa_pairs = []
         chunks = document.get('chunks', [])
+        completed_chunks = completed_chunks or {}
         
         if not chunks and 'file_content' in document:
             # 如果没有分块但存在文件内容，则使用整个文档作为一个块
@@ -60,39 +133,257 @@ class QAExtractor:
             logger.error(f"在文档中未找到内容: {document.get('file_name', 'unknown')}")
             return []
         
-        # 处理每个文本块
-        for i, chunk in enumerate(chunks):
-            logger.info(f"正在处理 {document.get('file_name', 'unknown')} 的第 {i+1}/{len(chunks)} 个文本块")
-            try:
-                qa_pairs = self._generate_qa_from_chunk(
-                    chunk=chunk, 
-                    prompt=prompt,
-                    document_metadata={
-                        'file_name': document.get('file_name', ''),
-                        'file_extension': document.get('file_extension', '')
-                    }
-                )
-                all_qa_pairs.extend(qa_pairs)
-            except Exception as e:
-                logger.error(f"从第 {i+1} 个文本块提取问答对时出错: {e}")
+        document_metadata = {
+            'file_name': document.get('file_name', ''),
+            'file_extension': document.get('file_extension', ''),
+            'document_id': self._document_id(document)
+        }
+        
+        results: Dict[int, List[Dict[str, Any]]] = {
+            i: pairs for i, pairs in completed_chunks.items() if i < len(chunks)
+        }
+        pending = [i for i in range(len(chunks)) if i not in results]
+        if results:
+            logger.info(f"{document.get('file_name', 'unknown')} 已完成 {len(results)}/{len(chunks)} 个文本块，继续处理剩余部分")
+            if self.chunk_deduplicator is not None:
+                # 已完成的文本块也登记到去重器，之后出现的相同文本块直接复用
+                for i, pairs in results.items():
+                    self.chunk_deduplicator.seed(ChunkDeduplicator.make_key(chunks[i], prompt), pairs)
         
+        # 启用合并时连续的小文本块组成一个请求，否则每个文本块一个请求
+        units = [[pending[j] for j in group] for group in self._pack_groups([chunks[i] for i in pending])]
+        
+        # 处理每个请求；并发模式下按原始顺序收集结果，单个块失败不影响其他块
+        if self.max_workers > 1 and len(units) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(units))) as executor:
+                futures = [
+                    executor.submit(self._process_unit, document, unit, len(chunks), chunks, prompt,
+                                    document_metadata, on_chunk_done)
+                    for unit in units
+                ]
+                for future in futures:
+                    for i, qa_pairs in future.result().items():
+                        if collect_results:
+                            results[i] = qa_pairs or []
+        else:
+            for unit in units:
+                for i, qa_pairs in self._process_unit(
+                    document, unit, len(chunks), chunks, prompt, document_metadata, on_chunk_done
+                ).items():
+                    if collect_results:
+                        results[i] = qa_pairs or []
+        
+        if not collect_results:
+            return []
+        
+        all_qa_pairs = []
+        for i in range(len(chunks)):
+            all_qa_pairs.extend(results.get(i, []))
         return all_qa_pairs
     
-    def _generate_qa_from_chunk(self, chunk: str, prompt: str, document_metadata: Dict[str, str]) -> List[Dict[str, Any]]:
+    def _pack_groups(self, chunks: List[str]) -> List[List[int]]:
         """
-        从单个文本块生成问答对。
+        把连续的文本块分组，每组作为一个请求：组内最多pack_size个文本块，总token数不超过pack_max_tokens；
+        单个超过上限的文本块自成一组。未启用合并时每个文本块一组。
         
         参数:
+            chunks: 文本块列表
+            
+        返回:
+            分组列表，每组为文本块在chunks中的下标
+        """
+        if self.pack_size <= 1:
+            return [[i] for i in range(len(chunks))]
+        groups: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, chunk in enumerate(chunks):
+            tokens = count_tokens(chunk)
+            if current and (len(current) >= self.pack_size or current_tokens + tokens > self.pack_max_tokens):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+    
+    @staticmethod
+    def _document_id(document: Dict[str, Any]) -> str:
+        """返回文档在token用量统计中的标识：优先使用调用方设置的file_path（如相对路径），否则使用文件名。"""
+        return document.get('file_path') or document.get('file_name', '')
+    
+    @staticmethod
+    def _select_chunks(document_metadata: Dict[str, Any], positions: List[int]) -> Dict[str, Any]:
+        """返回只保留指定位置文本块序号的文档元数据副本，使请求的token用量归集到实际发送的文本块。"""
+        chunk_indices = document_metadata.get('chunk_indices')
+        if chunk_indices is None:
+            return document_metadata
+        return dict(document_metadata, chunk_indices=[chunk_indices[position] for position in positions])
+    
+    def _process_unit(self, document: Dict[str, Any], indices: List[int], total: int, chunks: List[str],
+                      prompt: str, document_metadata: Dict[str, str],
+                      on_chunk_done: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None) -> Dict[int, Optional[List[Dict[str, Any]]]]:
+        """
+        处理一个请求单元：单个文本块交给_process_chunk，多个文本块合并为一个请求。
+        
+        参数:
+            document: 文档字典
+            indices: 本单元包含的文本块序号
+            total: 文本块总数
+            chunks: 文档的全部文本块
+            prompt: 自定义提示词
+            document_metadata: 文档元数据
+            on_chunk_done: 可选回调，每个成功的文本块以(块序号, 问答对列表)调用
+            
+        返回:
+            字典，键为文本块序号，值为问答对列表，失败或因token预算用完而跳过的文本块为None
+        """
+        if self.token_usage.exhausted:
+            logger.info(f"token预算已用完，跳过 {document.get('file_name', 'unknown')} 的第 "
+                        f"{', '.join(str(i + 1) for i in indices)}/{total} 个文本块")
+            self.token_usage.skip(document_metadata.get('document_id', ''), len(indices))
+            return {i: None for i in indices}
+        
+        # 文本块序号随元数据传到实际发出请求的位置，用于归集token用量
+        document_metadata = dict(document_metadata, chunk_indices=list(indices))
+        if len(indices) == 1:
+            index = indices[0]
+            return {index: self._process_chunk(document, index, total, chunks[index], prompt,
+                                               document_metadata, on_chunk_done)}
+        
+        logger.info(f"正在处理 {document.get('file_name', 'unknown')} 的第 "
+                    f"{', '.join(str(i + 1) for i in indices)}/{total} 个文本块（合并为一个请求）")
+        try:
+            packed = self._generate_qa_from_chunks([chunks[i] for i in indices], prompt, document_metadata)
+        except Exception as e:
+            logger.error(f"从第 {', '.join(str(i + 1) for i in indices)} 个文本块提取问答对时出错: {e}")
+            return {i: None for i in indices}
+        
+        for i, qa_pairs in zip(indices, packed):
+            if on_chunk_done is not None:
+                on_chunk_done(i, qa_pairs)
+        return dict(zip(indices, packed))
+    
+    def _process_chunk(self, document: Dict[str, Any], index: int, total: int, chunk: str,
+                       prompt: str, document_metadata: Dict[str, str],
+                       on_chunk_done: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        处理单个文本块，捕获所有异常，保证失败的块不会中断其他块。
+        
+        参数:
+            document: 文档字典
+            index: 文本块序号（从0开始）
+            total: 文本块总数
             chunk: 文本块内容
             prompt: 自定义提示词
-            document_metadata: 文档的额外元数据，包含文件名和扩展名等信息
+            document_metadata: 文档元数据
+            on_chunk_done: 可选回调，成功时以(块序号, 问答对列表)调用
             
         返回:
-            问答对列表，每个问答对包含问题、答案和原文本块
+            该文本块的问答对列表，失败时返回None
+        """
+        logger.info(f"正在处理 {document.get('file_name', 'unknown')} 的第 {index+1}/{total} 个文本块")
+        try:
+            qa_pairs = self._generate_qa_once(chunk, prompt, document_metadata)
+        except Exception as e:
+            logger.error(f"从第 {index+1} 个文本块提取问答对时出错: {e}")
+            return None
+        
+        if on_chunk_done is not None:
+            on_chunk_done(index, qa_pairs)
+        return qa_pairs
+    
+    def _generate_qa_once(self, chunk: str, prompt: str, document_metadata: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        启用文本块去重时，内容相同的文本块只有第一次出现时调用_generate_qa_from_chunk，
+        其余出现位置（包括其他线程中同时处理的）等待并复用它的结果；第一次处理失败时由下一个出现位置重新调用。
+        
+        参数:
+            chunk: 文本块内容
+            prompt: 自定义提示词
+            document_metadata: 文档元数据
+            
+        返回:
+            问答对列表，每个问答对包含问题、答案和本文本块的原文
+        """
+        if self.chunk_deduplicator is None:
+            return self._generate_qa_from_chunk(chunk=chunk, prompt=prompt, document_metadata=document_metadata)
+        
+        key = ChunkDeduplicator.make_key(chunk, prompt)
+        while True:
+            future, first = self.chunk_deduplicator.claim(key)
+            if first:
+                break
+            qa_pairs = future.result()
+            if qa_pairs is not None:
+                logger.info(f"{document_metadata.get('file_name', '')} 的文本块与已处理的文本块相同，复用其结果")
+                metrics.increment("chunk_dedup_reused")
+                return self.chunk_deduplicator.reuse(qa_pairs, chunk)
+        
+        try:
+            qa_pairs = self._generate_qa_from_chunk(chunk=chunk, prompt=prompt, document_metadata=document_metadata)
+        except BaseException:
+            self.chunk_deduplicator.resolve(key, future, None)
+            raise
+        self.chunk_deduplicator.resolve(key, future, qa_pairs)
+        return qa_pairs
+    
+    def _generate_qa_from_chunks(self, chunks: List[str], prompt: str,
+                                 document_metadata: Dict[str, str]) -> List[List[Dict[str, Any]]]:
+        """
+        用一个合并请求为多个文本块生成问答对。启用文本块去重时先登记全部文本块，
+        请求中只包含首次出现的文本块，其余在交付本请求的结果之后再等待并复用，避免线程间互相等待。
+        
+        参数:
+            chunks: 文本块列表
+            prompt: 自定义提示词
+            document_metadata: 文档元数据
+            
+        返回:
+            与chunks一一对应的问答对列表
+        """
+        if self.chunk_deduplicator is None:
+            return self._generate_qa_from_pack(chunks, prompt, document_metadata)
+        
+        keys = [ChunkDeduplicator.make_key(chunk, prompt) for chunk in chunks]
+        claims = [self.chunk_deduplicator.claim(key) for key in keys]
+        owned = [i for i, (_, first) in enumerate(claims) if first]
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunks)
+        try:
+            if owned:
+                packed = self._generate_qa_from_pack([chunks[i] for i in owned], prompt,
+                                                     self._select_chunks(document_metadata, owned))
+                for i, qa_pairs in zip(owned, packed):
+                    results[i] = qa_pairs
+        finally:
+            for i in owned:
+                self.chunk_deduplicator.resolve(keys[i], claims[i][0], results[i])
+        
+        for i, (future, first) in enumerate(claims):
+            if first:
+                continue
+            qa_pairs = future.result()
+            if qa_pairs is None:
+                results[i] = self._generate_qa_once(chunks[i], prompt, self._select_chunks(document_metadata, [i]))
+            else:
+                metrics.increment("chunk_dedup_reused")
+                results[i] = self.chunk_deduplicator.reuse(qa_pairs, chunks[i])
+        return results
+    
+    def _build_system_prompt(self, prompt: str) -> str:
+        """
+        根据用户提示词构建系统提示词。
+        
+        参数:
+            prompt: 自定义提示词
+            
+        返回:
+            系统提示词
         """
         # 如果提示词中没有指定JSON格式要求，添加默认的格式说明
         if "JSON format" not in prompt and "json format" not in prompt:
-            system_prompt = """
+            return """
             您是一位专门从文档中生成问答对的专家。
             请从提供的文档块中提取有意义的问答对。
             重点关注关键概念、事实和重要细节。
@@ -113,65 +404,392 @@ class QAExtractor:
             4. 每个答案都必须直接来自文档支持
             5. 不要编造信息或添加文档中没有的知识
             """
-        else:
-            system_prompt = "您是一位专门从文档中生成问答对的专家。"
+        return "您是一位专门从文档中生成问答对的专家。"
+    
+    def _build_user_prompt(self, prompt: str, chunk: str) -> str:
+        """
+        将自定义提示词与文本块组合为用户消息。
         
+        参数:
+            prompt: 自定义提示词
+            chunk: 文本块内容
+            
+        返回:
+            用户消息内容
+        """
         # 构建完整的提示词
         if not prompt.strip().endswith(":"):
-            user_prompt = f"{prompt}:\n\n{chunk}"
-        else:
-            user_prompt = f"{prompt}\n\n{chunk}"
+            return f"{prompt}:\n\n{chunk}"
+        return f"{prompt}\n\n{chunk}"
+    
+    def _build_packed_user_prompt(self, prompt: str, chunks: List[str]) -> str:
+        """
+        把多个文本块组合为一条用户消息，每个文本块用带编号的<chunk>标签包围，
+        并要求模型在每个问答对中用chunk_id注明来源文本块。
+        
+        参数:
+            prompt: 自定义提示词
+            chunks: 文本块列表，编号从1开始
+            
+        返回:
+            用户消息内容
+        """
+        tagged = "\n\n".join(f'<chunk id="{i}">\n{chunk}\n</chunk>' for i, chunk in enumerate(chunks, 1))
+        instruction = (
+            f"下面有{len(chunks)}个文本块，每个文本块用<chunk id=\"编号\">和</chunk>包围。"
+            "请分别为每个文本块生成问答对，问答对只能基于其所在文本块的内容，"
+            "并在每个问答对中加入\"chunk_id\"字段，填写该文本块的编号。\n\n"
+        )
+        return self._build_user_prompt(prompt, instruction + tagged)
+    
+    def chunk_token_budget(self, prompt: str, context_window: Optional[int] = None, safety_margin: float = 0.1) -> int:
+        """
+        根据模型上下文窗口和提示词开销计算单个文本块可用的token预算。
+        
+        参数:
+            prompt: 自定义提示词
+            context_window: 模型上下文窗口大小，为None时按模型名称查表
+            safety_margin: 为分词误差预留的比例
+            
+        返回:
+            单个文本块的最大token数
+        """
+        context_window = context_window or context_window_for(self.model_name)
+        overhead = (count_tokens(self._build_system_prompt(prompt))
+                    + count_tokens(self._build_user_prompt(prompt, ""))
+                    + self.MESSAGE_OVERHEAD_TOKENS)
+        available = context_window - self.max_tokens - overhead
+        return max(1, int(available * (1 - safety_margin)))
+    
+    def _generate_qa_from_chunk(self, chunk: str, prompt: str, document_metadata: Dict[str, str],
+                                on_qa_pair: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        从单个文本块生成问答对。
+        
+        参数:
+            chunk: 文本块内容
+            prompt: 自定义提示词
+            document_metadata: 文档的额外元数据，包含文件名和扩展名等信息
+            on_qa_pair: 可选回调，流式模式下每解析出一个完整的问答对（已附上原文本块）就立即调用
+            
+        返回:
+            问答对列表，每个问答对包含问题、答案和原文本块
+        """
+        messages = [
+            {"role": "system", "content": self._build_system_prompt(prompt)},
+            {"role": "user", "content": self._build_user_prompt(prompt, chunk)}
+        ]
+        emit = None
+        if on_qa_pair is not None:
+            def emit(qa_pair: Dict[str, Any]) -> None:
+                qa_pair["chunk"] = chunk
+                on_qa_pair(qa_pair)
+        content = self._request_content(messages, document_metadata, on_qa_pair=emit)
+        return self._qa_pairs_with_chunk(content, chunk)
+    
+    def stream_qa_pairs(self, chunk: str, prompt: str, on_qa_pair: Callable[[Dict[str, Any]], None],
+                        document_metadata: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """
+        以流式输出为单个文本块生成问答对，每个问答对一生成完就交给on_qa_pair，
+        调用方可以立即写出，不必等待整个响应结束。需要在初始化时设置stream=True，
+        否则所有问答对在响应结束后一次性回调。
+        
+        参数:
+            chunk: 文本块内容
+            prompt: 自定义提示词
+            on_qa_pair: 每个问答对（已附上原文本块）到达时调用；已回调过问答对的请求失败时不再重试
+            document_metadata: 可选的文档元数据
+            
+        返回:
+            按完整响应解析的问答对列表，与on_qa_pair收到的问答对基本一致
+            
+        异常:
+            StreamAbortedError: 重试后输出仍然不是JSON
+        """
+        document_metadata = document_metadata or {}
+        if self.stream:
+            return self._generate_qa_from_chunk(chunk, prompt, document_metadata, on_qa_pair=on_qa_pair)
+        qa_pairs = self._generate_qa_from_chunk(chunk, prompt, document_metadata)
+        for qa_pair in qa_pairs:
+            on_qa_pair(qa_pair)
+        return qa_pairs
+    
+    def _generate_qa_from_pack(self, chunks: List[str], prompt: str,
+                               document_metadata: Dict[str, str]) -> List[List[Dict[str, Any]]]:
+        """
+        把多个文本块合并为一个请求，按chunk_id把返回的问答对分配回各文本块。
+        只有一个文本块，或响应无法按chunk_id拆分时，改为逐块请求。
+        
+        参数:
+            chunks: 文本块列表
+            prompt: 自定义提示词
+            document_metadata: 文档元数据
+            
+        返回:
+            与chunks一一对应的问答对列表
+        """
+        if len(chunks) == 1:
+            return [self._generate_qa_from_chunk(chunks[0], prompt, document_metadata)]
+        
+        messages = [
+            {"role": "system", "content": self._build_system_prompt(prompt)},
+            {"role": "user", "content": self._build_packed_user_prompt(prompt, chunks)}
+        ]
+        content = self._request_content(messages, document_metadata)
+        packed = self._demultiplex_response(content, chunks)
+        if packed is not None:
+            metrics.increment("llm_packed_chunks", len(chunks))
+            return packed
+        
+        logger.warning(f"{document_metadata.get('file_name', '')} 的合并请求响应无法按chunk_id拆分，改为逐块请求")
+        return [self._generate_qa_from_chunk(chunk, prompt, self._select_chunks(document_metadata, [i]))
+                for i, chunk in enumerate(chunks)]
+    
+    def _request_content(self, messages: List[Dict[str, str]], document_metadata: Dict[str, str],
+                         on_qa_pair: Optional[Callable[[Dict[str, Any]], None]] = None) -> str:
+        """
+        获取请求的响应内容：先查询响应缓存，未命中时带重试地调用API并写入缓存。
+        流式模式下边接收边增量解析，输出明显不是JSON时中止请求并立即重试，中止的内容不写入缓存；
+        每次尝试都被中止时抛出StreamAbortedError，文本块按失败处理，不会作为空结果记为完成。
+        
+        参数:
+            messages: 请求消息列表
+            document_metadata: 文档元数据，用于日志和token用量归集（document_id和chunk_indices）
+            on_qa_pair: 可选回调，流式模式下每解析出一个完整的问答对就调用；命中缓存时对缓存中的问答对逐个调用
+            
+        返回:
+            模型返回的原始文本
+            
+        异常:
+            StreamAbortedError: 流式输出在每次尝试中都没有出现JSON
+        """
+        temperature = self.temperature
+        max_tokens = self.max_tokens
+        
+        # 先查询响应缓存，命中时无需调用API
+        cache_key = None
+        if self.cache is not None:
+            cache_key = LLMResponseCache.make_key(self.model_name, self.base_url, messages, temperature, max_tokens)
+            cached_content = self.cache.get(cache_key)
+            if cached_content is not None:
+                logger.info(f"命中响应缓存: {document_metadata.get('file_name', '')}")
+                if on_qa_pair is not None:
+                    for qa_pair in self._extract_json_from_response(cached_content):
+                        on_qa_pair(qa_pair)
+                return cached_content
         
         # 使用重试机制调用API
         max_retries = 3
         retry_delay = 2
         
         for attempt in range(max_retries):
+            if attempt:
+                metrics.increment("llm_retries")
+            parser = IncrementalJsonArrayParser(not_json_chars=self.stream_abort_chars) if self.stream else None
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=4000
-                )
+                if parser is None:
+                    response = self._create_chat_completion(messages, temperature, max_tokens)
+                else:
+                    started = time.perf_counter()
+                    
+                    def on_delta(delta: str) -> bool:
+                        """增量解析新到达的文本，返回True时中止流式请求。"""
+                        first = parser.objects == 0
+                        qa_pairs = parser.feed(delta)
+                        if qa_pairs and first:
+                            metrics.observe("llm_first_qa_pair", time.perf_counter() - started)
+                        if on_qa_pair is not None:
+                            for qa_pair in qa_pairs:
+                                on_qa_pair(qa_pair)
+                        return parser.not_json
+                    
+                    response = self._create_chat_completion(messages, temperature, max_tokens, on_delta=on_delta)
                 
                 content = response.choices[0].message.content
+                chunk_indices = document_metadata.get('chunk_indices') or [None]
+                self._record_usage(getattr(response, 'usage', None), messages, content,
+                                   [(document_metadata.get('document_id', ''), index) for index in chunk_indices])
                 
-                # 从响应中提取JSON
-                qa_pairs = self._extract_json_from_response(content)
-                
-                # 将原始文本块添加到每个问答对中
-                for qa_pair in qa_pairs:
-                    qa_pair["chunk"] = chunk
+                if getattr(response, 'aborted', False):
+                    metrics.increment("llm_stream_aborted")
+                    raise StreamAbortedError(f"{document_metadata.get('file_name', '')} 的响应在前 {len(content)} 个字符中"
+                                             f"没有出现JSON，已中止请求: {content[:100]}")
                 
-                return qa_pairs
+                if cache_key is not None and content:
+                    self.cache.set(cache_key, content)
+                return content
                 
             except Exception as e:
                 logger.error(f"第 {attempt+1}/{max_retries} 次尝试失败: {e}")
+                if parser is not None and on_qa_pair is not None and parser.objects:
+                    # 已经交付的问答对无法撤回，重试会产生重复
+                    logger.error("流式请求已交付部分问答对，不再重试")
+                    raise
                 if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+                    if isinstance(e, StreamAbortedError):
+                        # 中止是因为输出内容而不是服务端出错，无需等待
+                        continue
+                    # 服务端给出了Retry-After时按其等待，否则指数退避
+                    retry_after = RateLimiter.retry_after_from_error(e)
+                    time.sleep(retry_after if retry_after is not None else retry_delay)
                     retry_delay *= 2  # 指数退避策略
                 else:
                     logger.error(f"在 {max_retries} 次尝试后仍无法提取问答对")
                     raise
         
-        return []  # 由于上面的raise语句，正常情况下不会执行到这里
+        return ""  # 由于上面的raise语句，正常情况下不会执行到这里
     
-    def _extract_json_from_response(self, response_text: str) -> List[Dict[str, Any]]:
+    def _record_usage(self, usage: Any, messages: List[Dict[str, str]], content: str,
+                      targets: List[Tuple[str, Optional[int]]]) -> None:
+        """
+        记录一次请求的token用量，归集到它包含的文档和文本块。
+        
+        参数:
+            usage: 接口返回的usage（SDK对象或批处理结果中的字典）；服务端没有返回时（如中止的流式请求）为None，
+                   此时按本地分词器估算提示词和已收到输出的token数
+            messages: 请求消息列表
+            content: 模型返回的文本
+            targets: 请求包含的(文档标识, 文本块序号)列表
+        """
+        if usage is None:
+            counts = {
+                "prompt_tokens": sum(count_tokens(m["content"]) for m in messages) + self.MESSAGE_OVERHEAD_TOKENS,
+                "completion_tokens": count_tokens(content or "")
+            }
+        else:
+            get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+            details = get('prompt_tokens_details')
+            cached = details.get('cached_tokens') if isinstance(details, dict) else getattr(details, 'cached_tokens', None)
+            counts = {
+                "prompt_tokens": get('prompt_tokens') or 0,
+                "completion_tokens": get('completion_tokens') or 0,
+                "cached_tokens": cached or 0
+            }
+        self.token_usage.record(counts, targets)
+    
+    def _create_chat_completion(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                                on_delta: Optional[Callable[[str], bool]] = None):
+        """
+        调用聊天补全接口。配置了限流器时先按预估token数申请额度，
+        调用结束后把耗时、限流情况和实际token用量反馈给限流器。
+        
+        参数:
+            messages: 请求消息列表
+            temperature: 采样温度
+            max_tokens: 最大生成token数
+            on_delta: 指定时使用流式输出，每收到一段文本调用一次，返回True时中止请求
+            
+        返回:
+            接口返回的响应对象；流式输出时为拼接后的等价对象，aborted属性表示是否中止
+        """
+        estimated_tokens = 0
+        if self.rate_limiter is not None:
+            estimated_tokens = sum(count_tokens(m["content"]) for m in messages) + self.MESSAGE_OVERHEAD_TOKENS
+            with metrics.span("rate_limit_wait"):
+                self.rate_limiter.acquire(estimated_tokens)
+        
+        started = time.monotonic()
+        try:
+            with metrics.span("llm_request"):
+                if on_delta is None:
+                    response = self.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    )
+                else:
+                    response = self._consume_stream(messages, temperature, max_tokens, on_delta)
+        except Exception as e:
+            throttled = RateLimiter.is_rate_limit_error(e)
+            metrics.increment("llm_requests", status="rate_limited" if throttled else "error")
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(throttled=throttled, retry_after=RateLimiter.retry_after_from_error(e))
+            raise
+        
+        metrics.increment("llm_requests", status="ok")
+        if self.rate_limiter is not None:
+            usage = getattr(response, 'usage', None)
+            total_tokens = getattr(usage, 'total_tokens', None)
+            self.rate_limiter.release(
+                latency=time.monotonic() - started,
+                token_correction=total_tokens - estimated_tokens if isinstance(total_tokens, int) else 0
+            )
+        return response
+    
+    def _consume_stream(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                        on_delta: Callable[[str], bool]):
+        """
+        发起流式请求并逐段读取输出，on_delta返回True时关闭连接中止生成。
+        
+        返回:
+            与非流式响应结构相同的对象（choices[0].message.content、usage），另有aborted属性
+        """
+        request = dict(model=self.model_name, messages=messages, temperature=temperature,
+                       max_tokens=max_tokens, stream=True)
+        if self._stream_include_usage:
+            try:
+                stream = self.client.chat.completions.create(**request, stream_options={"include_usage": True})
+            except Exception as e:
+                if not self._is_unsupported_parameter_error(e):
+                    raise
+                # 部分兼容OpenAI的服务端不支持stream_options，不带该参数重试一次，之后的请求也不再携带
+                logger.warning(f"服务端拒绝了stream_options，改为不请求流式用量统计: {e}")
+                self._stream_include_usage = False
+                stream = self.client.chat.completions.create(**request)
+        else:
+            stream = self.client.chat.completions.create(**request)
+        parts = []
+        usage = None
+        aborted = False
+        try:
+            for event in stream:
+                # 开启include_usage时最后一个事件只携带usage，choices为空
+                usage = getattr(event, 'usage', None) or usage
+                if not event.choices:
+                    continue
+                delta = getattr(event.choices[0].delta, 'content', None)
+                if not delta:
+                    continue
+                parts.append(delta)
+                if on_delta(delta):
+                    aborted = True
+                    break
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+        message = types.SimpleNamespace(content="".join(parts))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage, aborted=aborted)
+    
+    @staticmethod
+    def _is_unsupported_parameter_error(error: Exception) -> bool:
+        """
+        判断请求是否因为参数不被支持而被拒绝：服务端返回400/422，或旧版SDK不认识该关键字参数。
+        """
+        if isinstance(error, TypeError):
+            return 'stream_options' in str(error)
+        status = getattr(error, 'status_code', None)
+        if status is None:
+            status = getattr(getattr(error, 'response', None), 'status_code', None)
+        return status in (400, 422)
+    
+    def _extract_json_from_response(self, response_text: str, packed: bool = False) -> List[Dict[str, Any]]:
         """
         从模型响应中提取并解析JSON。
         
         参数:
             response_text: 模型的原始文本响应
+            packed: 是否为合并请求的响应；为True时还接受按文本块分组的格式
+                   （{"1": [...], "2": [...]}或[{"chunk_id": 1, "qa_pairs": [...]}, ...]），
+                   展开为带chunk_id的问答对
             
         返回:
             解析后的问答对列表
         """
         # 使用JsonUtils.safe_parse_json进行解析
-        parsed_data = JsonUtils.safe_parse_json(response_text, debug_prefix="QA提取器")
+        with metrics.span("json_parse"):
+            parsed_data = JsonUtils.safe_parse_json(response_text, debug_prefix="QA提取器")
         
         # 处理结果为空的情况
         if not parsed_data:
@@ -192,6 +810,9 @@ class QAExtractor:
                 return qa_pairs
             return []
         
+        if packed:
+            parsed_data = self._flatten_packed(parsed_data)
+        
         # 确保返回的是列表
         if isinstance(parsed_data, list):
             return parsed_data
@@ -209,6 +830,56 @@ class QAExtractor:
         logger.error(f"解析的JSON不是QA对列表格式: {parsed_data}")
         return []
     
+    def _flatten_packed(self, parsed_data: Any) -> Any:
+        """把按文本块分组的合并请求响应展开为带chunk_id的问答对列表，其他格式原样返回。"""
+        list_keys = ["qa", "qa_pairs", "qas", "pairs"]
+        if isinstance(parsed_data, dict) and parsed_data and all(
+                self._CHUNK_ID_PATTERN.search(str(key)) and isinstance(value, list) for key, value in parsed_data.items()):
+            return [dict(pair, chunk_id=key) for key, pairs in parsed_data.items()
+                    for pair in pairs if isinstance(pair, dict)]
+        if isinstance(parsed_data, list) and any(
+                isinstance(item, dict) and "chunk_id" in item and any(key in item for key in list_keys)
+                for item in parsed_data):
+            flattened = []
+            for item in parsed_data:
+                if not isinstance(item, dict):
+                    continue
+                group = next((item[key] for key in list_keys if isinstance(item.get(key), list)), None)
+                if group is None:
+                    flattened.append(item)
+                else:
+                    flattened.extend(dict(pair, chunk_id=item["chunk_id"]) for pair in group if isinstance(pair, dict))
+            return flattened
+        return parsed_data
+    
+    def _demultiplex_response(self, content: str, chunks: List[str]) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        按chunk_id把合并请求返回的问答对分配回各文本块，并为每个问答对附上其文本块原文。
+        
+        参数:
+            content: 模型的原始文本响应
+            chunks: 请求中的文本块，chunk_id从1开始编号
+            
+        返回:
+            与chunks一一对应的问答对列表；有问答对但没有一个带有效chunk_id时返回None
+        """
+        qa_pairs = self._extract_json_from_response(content, packed=True)
+        grouped: List[List[Dict[str, Any]]] = [[] for _ in chunks]
+        unmatched = 0
+        for qa_pair in qa_pairs:
+            match = self._CHUNK_ID_PATTERN.search(str(qa_pair.pop("chunk_id", "")))
+            position = int(match.group()) - 1 if match else -1
+            if 0 <= position < len(chunks):
+                qa_pair["chunk"] = chunks[position]
+                grouped[position].append(qa_pair)
+            else:
+                unmatched += 1
+        if unmatched:
+            if unmatched == len(qa_pairs):
+                return None
+            logger.warning(f"合并请求的响应中有 {unmatched} 个问答对缺少有效的chunk_id，已丢弃")
+        return grouped
+    
     def batch_process_documents(self, documents: List[Dict[str, Any]], prompt: str) -> Dict[str, List[Dict[str, Any]]]:
         """
         批量处理多个文档。
@@ -234,6 +905,348 @@ class QAExtractor:
         
         return results
     
+    def extract_qa_pairs_batch(self, documents: List[Dict[str, Any]], prompt: str,
+                               completed_chunks: Optional[List[Dict[int, List[Dict[str, Any]]]]] = None,
+                               poll_interval: float = 30.0, max_wait: float = 24 * 3600,
+                               max_requests_per_batch: int = 50000,
+                               on_chunk_done: Optional[Callable[[int, int, List[Dict[str, Any]]], None]] = None,
+                               on_batch_update: Optional[Callable[[str, Dict[str, Any]], None]] = None
+                               ) -> List[Dict[int, List[Dict[str, Any]]]]:
+        """
+        通过离线批处理接口为多个文档提取问答对。
+        所有未完成文本块的请求写入JSONL批处理文件并提交，轮询直到批处理结束，
+        再按custom_id把结果映射回对应的文档和文本块。
+        启用文本块去重时，内容相同的文本块只提交一个请求，结果分配给所有出现位置；
+        启用合并时，连续的小文本块（可以来自不同文档）合并为一个请求。
+        状态查询和结果下载失败时按BATCH_API_RETRIES重试；某个批处理提交失败、或重试后仍无法取回结果时，
+        记录错误并继续处理其他批处理，其中的文本块不出现在结果中，留给调用方改为实时调用。
+        
+        参数:
+            documents: 文档字典列表，每个字典包含'chunks'或'file_content'字段
+            prompt: 自定义提示词
+            completed_chunks: 可选，与documents一一对应的已完成文本块结果，这些块不再提交
+            poll_interval: 轮询批处理状态的间隔秒数
+            max_wait: 等待批处理完成的最长秒数，超时后取消批处理
+            max_requests_per_batch: 单个批处理文件的最大请求数，超出时拆分为多个批处理
+            on_chunk_done: 可选回调，每个文本块得到结果时立即以(文档序号, 文本块序号, 问答对列表)调用，
+                          每个批处理的结果在它结束时就交付，不必等待其他批处理
+            on_batch_update: 可选回调，批处理创建后立即以(批处理ID, {"status": "submitted", "requests": 请求数})调用，
+                            结束时再以最终状态（completed、failed、expired、cancelled、timeout或unreachable）
+                            和成功的请求数answered调用，供调用方保存批处理ID
+            
+        返回:
+            与documents一一对应的字典列表，键为本次成功获得结果的文本块序号，值为该块的问答对；
+            失败或超时的文本块不出现在结果中
+        """
+        completed_chunks = completed_chunks or [{} for _ in documents]
+        results: List[Dict[int, List[Dict[str, Any]]]] = [{} for _ in documents]
+        
+        def store(doc_index: int, chunk_index: int, qa_pairs: List[Dict[str, Any]]) -> None:
+            """保存一个文本块的结果，并立即通知调用方。"""
+            results[doc_index][chunk_index] = qa_pairs
+            if on_chunk_done is not None:
+                on_chunk_done(doc_index, chunk_index, qa_pairs)
+        
+        requests: List[Dict[str, Any]] = []
+        # 待请求的不同文本块：(去重键, 共享结果的(文档序号, 文本块序号, 文本块内容)列表)，第一个为请求中使用的原文
+        items: List[Tuple[Optional[str], List[Tuple[int, int, str]]]] = []
+        # 去重键 -> items中的位置
+        item_positions: Dict[str, int] = {}
+        # custom_id -> (缓存键, 请求中包含的items位置列表, 请求消息)
+        request_index: Dict[str, Tuple[Optional[str], List[int], List[Dict[str, str]]]] = {}
+        document_ids = [self._document_id(document) for document in documents]
+        
+        document_chunks = [
+            document.get('chunks') or ([document['file_content']] if document.get('file_content') else [])
+            for document in documents
+        ]
+        if self.chunk_deduplicator is not None:
+            for doc_index, chunks in enumerate(document_chunks):
+                for chunk_index, pairs in completed_chunks[doc_index].items():
+                    if chunk_index < len(chunks):
+                        self.chunk_deduplicator.seed(ChunkDeduplicator.make_key(chunks[chunk_index], prompt), pairs)
+        
+        for doc_index, chunks in enumerate(document_chunks):
+            for chunk_index, chunk in enumerate(chunks):
+                if chunk_index in completed_chunks[doc_index]:
+                    continue
+                
+                dedup_key = None
+                if self.chunk_deduplicator is not None:
+                    dedup_key = ChunkDeduplicator.make_key(chunk, prompt)
+                    known = self.chunk_deduplicator.peek(dedup_key)
+                    if known is not None:
+                        store(doc_index, chunk_index, self.chunk_deduplicator.reuse(known, chunk))
+                        continue
+                    if dedup_key in item_positions:
+                        # 与本次已提交的文本块相同，共享同一个请求的结果
+                        items[item_positions[dedup_key]][1].append((doc_index, chunk_index, chunk))
+                        continue
+                    item_positions[dedup_key] = len(items)
+                items.append((dedup_key, [(doc_index, chunk_index, chunk)]))
+        
+        def deliver(position: int, qa_pairs: List[Dict[str, Any]]) -> None:
+            """把一个不同文本块的结果交付给它的所有出现位置。"""
+            dedup_key, targets = items[position]
+            (doc_index, chunk_index, _), duplicates = targets[0], targets[1:]
+            store(doc_index, chunk_index, qa_pairs)
+            if dedup_key is not None:
+                self.chunk_deduplicator.seed(dedup_key, qa_pairs)
+                for doc_index, chunk_index, chunk in duplicates:
+                    store(doc_index, chunk_index, self.chunk_deduplicator.reuse(qa_pairs, chunk))
+        
+        def deliver_content(positions: List[int], content: str) -> bool:
+            """解析一个请求的响应内容并交付，合并请求无法按chunk_id拆分时返回False。"""
+            chunks = [items[position][1][0][2] for position in positions]
+            if len(positions) == 1:
+                deliver(positions[0], self._qa_pairs_with_chunk(content, chunks[0]))
+                return True
+            packed = self._demultiplex_response(content, chunks)
+            if packed is None:
+                return False
+            for position, qa_pairs in zip(positions, packed):
+                deliver(position, qa_pairs)
+            return True
+        
+        # 批处理提交后无法中途停止，设置了token预算时每个请求按提示词的预估token数加上max_tokens预留预算，
+        # 预算不足的文本块不提交，留给之后的实时调用（同样受预算限制）
+        remaining_budget = self.token_usage.remaining()
+        budget_skipped = 0
+        
+        # 启用合并时，跨文档把连续的小文本块合并为一个请求
+        for group in self._pack_groups([targets[0][2] for _, targets in items]):
+            chunks = [items[position][1][0][2] for position in group]
+            user_prompt = (self._build_user_prompt(prompt, chunks[0]) if len(chunks) == 1
+                           else self._build_packed_user_prompt(prompt, chunks))
+            messages = [
+                {"role": "system", "content": self._build_system_prompt(prompt)},
+                {"role": "user", "content": user_prompt}
+            ]
+            
+            cache_key = None
+            if self.cache is not None:
+                cache_key = LLMResponseCache.make_key(self.model_name, self.base_url, messages,
+                                                      self.temperature, self.max_tokens)
+                cached_content = self.cache.get(cache_key)
+                if cached_content is not None and deliver_content(group, cached_content):
+                    continue
+            
+            if remaining_budget is not None:
+                estimated_tokens = (sum(count_tokens(m["content"]) for m in messages)
+                                    + self.MESSAGE_OVERHEAD_TOKENS + self.max_tokens)
+                if estimated_tokens > remaining_budget:
+                    budget_skipped += len(group)
+                    continue
+                remaining_budget -= estimated_tokens
+            
+            doc_index, chunk_index, _ = items[group[0]][1][0]
+            custom_id = f"{doc_index}-{chunk_index}"
+            request_index[custom_id] = (cache_key, group, messages)
+            requests.append({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model_name,
+                    "messages": messages,
+                    "temperature": self.temperature,
+                    "max_tokens": self.max_tokens
+                }
+            })
+        
+        if budget_skipped:
+            logger.warning(f"token预算不足，{budget_skipped} 个文本块没有提交到批处理")
+        if not requests:
+            return results
+        
+        # 先提交所有批处理再统一轮询，多个批处理在服务端并行执行。
+        # 提交不重试：创建请求超时时批处理可能已经创建，重试会重复计费；提交失败的请求留给之后的实时调用
+        batch_ids = []
+        for start in range(0, len(requests), max_requests_per_batch):
+            batch_requests = requests[start:start + max_requests_per_batch]
+            try:
+                batch_id = self._submit_batch(batch_requests)
+            except Exception as e:
+                logger.error(f"提交批处理失败，其中 {len(batch_requests)} 个请求改为实时调用: {e}")
+                continue
+            batch_ids.append(batch_id)
+            if on_batch_update is not None:
+                on_batch_update(batch_id, {"status": "submitted", "requests": len(batch_requests)})
+        logger.info(f"已提交 {len(batch_ids)} 个批处理，共 {len(requests)} 个请求")
+        
+        deadline = time.monotonic() + max_wait
+        answered = 0
+        for batch_id in batch_ids:
+            try:
+                batch = self._wait_for_batch(batch_id, poll_interval, deadline)
+                output_lines = self._read_batch_file(getattr(batch, 'output_file_id', None))
+                error_lines = self._read_batch_file(getattr(batch, 'error_file_id', None))
+            except Exception as e:
+                # 重试后仍无法查询状态或下载结果：尽量取消批处理，避免与之后的实时调用重复计费
+                logger.error(f"无法取回批处理 {batch_id} 的结果，其中的文本块改为实时调用: {e}")
+                self._cancel_batch(batch_id)
+                if on_batch_update is not None:
+                    on_batch_update(batch_id, {"status": "unreachable", "error": str(e)})
+                continue
+            
+            batch_answered = 0
+            for line in output_lines:
+                record = self._parse_batch_line(batch_id, line)
+                if record is None:
+                    continue
+                target = request_index.get(record.get("custom_id"))
+                if target is None:
+                    continue
+                cache_key, positions, messages = target
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code", 200) != 200:
+                    logger.error(f"批处理请求 {record.get('custom_id')} 失败: {record.get('error') or response.get('body')}")
+                    continue
+                try:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    logger.error(f"批处理请求 {record.get('custom_id')} 的响应格式无效")
+                    continue
+                # 用量归集到请求中实际发送的文本块，共享结果的重复文本块不计
+                self._record_usage(response["body"].get("usage"), messages, content,
+                                   [(document_ids[items[position][1][0][0]], items[position][1][0][1])
+                                    for position in positions])
+                if not deliver_content(positions, content):
+                    # 未交付的文本块留给之后的实时调用补齐
+                    logger.error(f"批处理请求 {record.get('custom_id')} 的合并响应无法按chunk_id拆分")
+                    continue
+                if cache_key is not None and content:
+                    self.cache.set(cache_key, content)
+                batch_answered += 1
+            
+            for line in error_lines:
+                record = self._parse_batch_line(batch_id, line)
+                if record is not None:
+                    logger.error(f"批处理请求 {record.get('custom_id')} 失败: {record.get('error') or record.get('response')}")
+            
+            answered += batch_answered
+            if on_batch_update is not None:
+                on_batch_update(batch_id, {"status": batch.status if batch is not None else "timeout",
+                                           "answered": batch_answered})
+        
+        logger.info(f"批处理完成，{answered}/{len(requests)} 个请求成功")
+        return results
+    
+    def _qa_pairs_with_chunk(self, content: str, chunk: str) -> List[Dict[str, Any]]:
+        """从响应内容中解析问答对，并为每个问答对附上原始文本块。"""
+        qa_pairs = self._extract_json_from_response(content)
+        for qa_pair in qa_pairs:
+            qa_pair["chunk"] = chunk
+        return qa_pairs
+    
+    @staticmethod
+    def _parse_batch_line(batch_id: str, line: str) -> Optional[Dict[str, Any]]:
+        """解析批处理结果文件或错误文件中的一行，无法解析时记录错误并返回None。"""
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            logger.error(f"批处理 {batch_id} 的结果文件中有无法解析的行: {line[:100]}")
+            return None
+        return record
+    
+    def _call_batch_api(self, description: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        调用批处理相关的查询或下载接口，失败时最多重试BATCH_API_RETRIES次。
+        服务端给出了Retry-After时按其等待，否则从BATCH_RETRY_DELAY开始指数退避。
+        
+        参数:
+            description: 用于日志的操作描述
+            func: 要调用的客户端方法
+            
+        返回:
+            func的返回值；重试后仍然失败时抛出最后一次的异常
+        """
+        delay = self.BATCH_RETRY_DELAY
+        for attempt in range(self.BATCH_API_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.BATCH_API_RETRIES - 1:
+                    raise
+                logger.warning(f"{description}失败（第 {attempt+1}/{self.BATCH_API_RETRIES} 次），稍后重试: {e}")
+                retry_after = RateLimiter.retry_after_from_error(e)
+                time.sleep(retry_after if retry_after is not None else delay)
+                delay *= 2
+    
+    def _cancel_batch(self, batch_id: str) -> None:
+        """尽量取消批处理，失败时只记录错误。"""
+        try:
+            self.client.batches.cancel(batch_id)
+        except Exception as e:
+            logger.error(f"取消批处理 {batch_id} 失败: {e}")
+    
+    def _submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        将请求写入JSONL文件，上传并创建批处理。
+        
+        参数:
+            requests: 批处理请求列表，每项包含custom_id、method、url和body
+            
+        返回:
+            批处理ID
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as f:
+            for request in requests:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            batch_file_path = f.name
+        try:
+            with open(batch_file_path, 'rb') as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+        finally:
+            os.remove(batch_file_path)
+        
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"已创建批处理 {batch.id}，包含 {len(requests)} 个请求")
+        return batch.id
+    
+    def _wait_for_batch(self, batch_id: str, poll_interval: float, deadline: float):
+        """
+        轮询批处理状态直到结束。查询失败时按_call_batch_api重试，重试后仍然失败时抛出异常。
+        
+        参数:
+            batch_id: 批处理ID
+            poll_interval: 轮询间隔秒数
+            deadline: 截止时间（time.monotonic()时间戳），超时后取消批处理
+            
+        返回:
+            结束（完成、失败、过期或被取消）的批处理对象，过期或取消的批处理可能已有部分结果；超时时返回None
+        """
+        while True:
+            batch = self._call_batch_api(f"查询批处理 {batch_id} 的状态", self.client.batches.retrieve, batch_id)
+            status = batch.status
+            if status == "completed":
+                return batch
+            if status in ("failed", "expired", "cancelled"):
+                logger.error(f"批处理 {batch_id} 结束，状态: {status}，错误: {getattr(batch, 'errors', None)}")
+                return batch
+            if time.monotonic() >= deadline:
+                logger.error(f"等待批处理 {batch_id} 超时，取消批处理")
+                self._cancel_batch(batch_id)
+                return None
+            
+            counts = getattr(batch, 'request_counts', None)
+            if counts is not None:
+                logger.info(f"批处理 {batch_id} 状态: {status}，已完成 {counts.completed}/{counts.total}")
+            time.sleep(poll_interval)
+    
+    def _read_batch_file(self, file_id: Optional[str]) -> List[str]:
+        """下载批处理的结果文件或错误文件，返回非空行列表。下载失败时按_call_batch_api重试。"""
+        if not file_id:
+            return []
+        content = self._call_batch_api(f"下载批处理文件 {file_id} 的内容", self.client.files.content, file_id).text
+        return [line for line in content.splitlines() if line.strip()]
+    
     def save_qa_pairs_to_json(self, qa_pairs: Dict[str, List[Dict[str, Any]]], output_dir: str) -> List[str]:
         """
         将问答对保存为JSON文件。
@@ -262,4 +1275,33 @@ class QAExtractor:
             created_files.append(output_file)
             logger.info(f"已将 {len(pairs)} 个问答对保存到 {output_file}")
         
+        return created_files
+    
+    def save_qa_pairs_to_jsonl(self, qa_pairs: Dict[str, List[Dict[str, Any]]], output_dir: str) -> List[str]:
+        """
+        将问答对逐行保存为JSONL文件，每行一个问答对。
+        
+        参数:
+            qa_pairs: 字典，键为文档名，值为问答对列表
+            output_dir: 保存JSONL文件的目录路径
+            
+        返回:
+            已创建的JSONL文件路径列表
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        created_files = []
+        
+        for doc_name, pairs in qa_pairs.items():
+            if not pairs:
+                continue
+            
+            safe_name = "".join([c if c.isalnum() or c in ['-', '_', '.'] else '_' for c in doc_name])
+            output_file = os.path.join(output_dir, f"qa_{safe_name}.jsonl")
+            
+            with JsonlWriter(output_file, mode='w') as writer:
+                writer.write_many(pairs)
+            
+            created_files.append(output_file)
+            logger.info(f"已将 {len(pairs)} 个问答对保存到 {output_file}")
+        
         return created_files 
\ No newline at end of file
@@ -2,6 +2,13 @@
 Utility modules for the QA Documents application.
 """
 
-from .logger import BeijingLogger
+from .logger import BeijingLogger, LazyLogger, disable_log_queue, get_logger
 from .json_utils import JsonUtils
-__all__ = ['BeijingLogger', 'JsonUtils'] 
\ No newline at end of file
+from .llm_cache import LLMResponseCache
+from .parse_cache import ParsedDocumentCache
+from .jsonl_writer import JsonlWriter
+from .metrics import Metrics, metrics
+from .qa_dedup import QADeduplicator
+from .chunk_dedup import ChunkDeduplicator
+from .token_usage import TokenUsage
+__all__ = ['BeijingLogger', 'LazyLogger', 'disable_log_queue', 'get_logger', 'JsonUtils', 'LLMResponseCache', 'ParsedDocumentCache', 'JsonlWriter', 'Metrics', 'metrics', 'QADeduplicator', 'ChunkDeduplicator', 'TokenUsage'] 
\ No newline at end of file
@@ -0,0 +1,104 @@
+# src/utils/chunk_dedup.py
+"""
+本次运行内文本块级别的去重。
+页眉页脚、免责声明、版权页和共用的参考文献等内容会在多个文本块和多个文档中重复出现。
+文本块规范化后按内容哈希登记，同样的内容在一次运行中只调用一次大模型，
+其余出现位置复用第一次的结果。
+"""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_chunk(chunk: str) -> str:
+    """
+    规范化文本块：统一全角/半角字符并合并连续空白。
+    不改变大小写和标点，避免把数字、剂量等内容不同的文本块判为相同。
+    """
+    return _WHITESPACE_PATTERN.sub(' ', unicodedata.normalize('NFKC', chunk)).strip()
+
+
+class ChunkDeduplicator:
+    def __init__(self):
+        """
+        初始化文本块去重器。登记的结果保存在内存中（不含文本块原文），
+        以便之后任意文档中出现的相同文本块都能复用。
+        """
+        self.unique_chunks = 0
+        self.api_calls_saved = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Future] = {}
+
+    @staticmethod
+    def make_key(chunk: str, prompt: str) -> str:
+        """根据提示词和规范化后的文本块生成键，提示词不同时结果不能复用。"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(prompt.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_chunk(chunk).encode('utf-8'))
+        return digest.hexdigest()
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        登记一个文本块。
+
+        参数:
+            key: make_key生成的键
+
+        返回:
+            (future, 是否为首次出现)。首次出现的调用方负责调用大模型并通过resolve交付结果，
+            其他调用方等待future得到结果；结果为None表示首次处理失败，应重新claim
+        """
+        with self._lock:
+            future = self._entries.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._entries[key] = future
+            self.unique_chunks += 1
+            return future, True
+
+    def peek(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """返回已有结果的文本块的问答对（不含文本块原文），没有结果时返回None。"""
+        with self._lock:
+            future = self._entries.get(key)
+        if future is None or not future.done():
+            return None
+        return future.result()
+
+    def resolve(self, key: str, future: Future, qa_pairs: Optional[List[Dict[str, Any]]]) -> None:
+        """
+        交付首次出现的文本块的结果。qa_pairs为None表示处理失败，此时移除登记，
+        之后出现的相同文本块会重新调用大模型。
+        """
+        if qa_pairs is None:
+            with self._lock:
+                if self._entries.get(key) is future:
+                    del self._entries[key]
+                    self.unique_chunks -= 1
+            future.set_result(None)
+            return
+        future.set_result([{k: v for k, v in pair.items() if k != 'chunk'} for pair in qa_pairs])
+
+    def seed(self, key: str, qa_pairs: List[Dict[str, Any]]) -> None:
+        """登记之前已完成（如断点续跑时从进度文件恢复）的文本块结果，已有登记时不覆盖。"""
+        future, first = self.claim(key)
+        if first:
+            self.resolve(key, future, qa_pairs)
+
+    def reuse(self, qa_pairs: List[Dict[str, Any]], chunk: str) -> List[Dict[str, Any]]:
+        """为重复出现的文本块复制问答对并附上它自己的原文，同时计入节省的调用次数。"""
+        with self._lock:
+            self.api_calls_saved += 1
+        return [dict(pair, chunk=chunk) for pair in qa_pairs]
+
+    def stats(self) -> Dict[str, int]:
+        """返回不同文本块的数量和节省的API调用次数。"""
+        with self._lock:
+            return {"unique_chunks": self.unique_chunks, "api_calls_saved": self.api_calls_saved}
@@ -1,7 +1,11 @@
 # src/utils/json_utils.py
 import json
 import re
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# JSON结构中需要关注的字符：括号、引号和转义符
+_JSON_STRUCTURE_CHARS = re.compile(r'[{}\[\]"\\]')
+_JSON_CLOSERS = {'}': '{', ']': '['}
 
 class JsonUtils:
     @staticmethod
@@ -21,7 +25,8 @@ class JsonUtils:
         """
         try:
             return json.loads(json_str)
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, RecursionError) as e:
+            # 嵌套过深时json.loads抛出RecursionError，与格式错误一样处理
             if not fix_format:
                 raise ValueError(f"JSON解析错误: {str(e)}") from e
                 
@@ -164,6 +169,71 @@ class JsonUtils:
             print(f"无法保存JSON到 {file_path}: {str(e)}")
             return False
 
+    @staticmethod
+    def find_json_spans(text: str) -> List[Tuple[int, int]]:
+        """
+        单次线性扫描，定位文本中最外层的已闭合JSON对象或数组
+        
+        只在括号内部跟踪字符串和转义，因此正文中的引号不会干扰扫描。
+        正文中多余的右括号被忽略；遇到右括号时，其与对应左括号之间未闭合的左括号视为正文中的括号并丢弃，
+        因此说明文字里未闭合的括号不会吞掉其后的JSON。不被其他已闭合结构包含的每个结构都作为候选返回。
+        
+        Args:
+            text: 可能包含JSON的文本
+            
+        Returns:
+            (起始位置, 结束位置) 列表，按出现顺序排列，互不重叠
+        """
+        spans = []
+        # 未闭合的左括号及其位置，以及栈中每种左括号的数量（用于O(1)判断右括号能否匹配）
+        stack = []
+        open_counts = {'{': 0, '[': 0}
+        in_string = False
+        skip_pos = -1
+        
+        for match in _JSON_STRUCTURE_CHARS.finditer(text):
+            pos = match.start()
+            char = text[pos]
+            
+            if not stack:
+                if char in '{[':
+                    stack.append((char, pos))
+                    open_counts[char] += 1
+                continue
+            
+            if pos == skip_pos:
+                continue
+            
+            if in_string:
+                if char == '\\':
+                    skip_pos = pos + 1
+                elif char == '"':
+                    in_string = False
+                continue
+            
+            if char == '"':
+                in_string = True
+            elif char in '{[':
+                stack.append((char, pos))
+                open_counts[char] += 1
+            elif char in _JSON_CLOSERS:
+                opener = _JSON_CLOSERS[char]
+                if not open_counts[opener]:
+                    # 没有可以匹配的左括号：正文中多余的右括号
+                    continue
+                # 弹出到对应的左括号为止，中间未闭合的左括号被丢弃
+                while True:
+                    top, start = stack.pop()
+                    open_counts[top] -= 1
+                    if top == opener:
+                        break
+                # 此前记录的、位于该结构内部的候选被它包含
+                while spans and spans[-1][0] > start:
+                    spans.pop()
+                spans.append((start, pos + 1))
+        
+        return spans
+
     @staticmethod
     def extract_json_from_text(text: str) -> Optional[str]:
         """
@@ -200,58 +270,27 @@ class JsonUtils:
                 if fixed:
                     return fixed
         
-        # 尝试查找 { 和匹配的 } 之间的内容（处理嵌套）
-        # 从最长的可能JSON开始尝试
-        json_candidates = []
-        
-        # 找到所有的 { 位置
-        open_positions = [pos for pos, char in enumerate(text) if char == '{']
-        
-        for start_pos in open_positions:
-            # 从此位置开始找匹配的右括号
-            depth = 0
-            for i in range(start_pos, len(text)):
-                if text[i] == '{':
-                    depth += 1
-                elif text[i] == '}':
-                    depth -= 1
-                    if depth == 0:  # 找到匹配的右括号
-                        json_candidates.append(text[start_pos:i+1])
-                        break
-        
-        # 类似地处理数组
-        open_positions = [pos for pos, char in enumerate(text) if char == '[']
-        
-        for start_pos in open_positions:
-            # 从此位置开始找匹配的右括号
-            depth = 0
-            for i in range(start_pos, len(text)):
-                if text[i] == '[':
-                    depth += 1
-                elif text[i] == ']':
-                    depth -= 1
-                    if depth == 0:  # 找到匹配的右括号
-                        json_candidates.append(text[start_pos:i+1])
-                        break
-                        
-        # 按长度从大到小排序候选项（更长的JSON更有可能是完整的）
-        json_candidates.sort(key=len, reverse=True)
-        
-        # 尝试解析每个候选项
-        for candidate in json_candidates:
+        # 单次线性扫描定位顶层JSON结构（识别字符串和转义），从最长的候选开始依次尝试直接解析和修复。
+        # 各候选互不重叠，直接解析的总开销与文本长度成正比；只有比第一个可解析候选更长的候选
+        # （如带尾部逗号的完整问答对数组）才会进入修复
+        spans = JsonUtils.find_json_spans(text)
+        spans.sort(key=lambda span: span[1] - span[0], reverse=True)
+        for start, end in spans:
+            candidate = text[start:end]
             try:
                 json.loads(candidate)
                 return candidate
-            except:
+            except (ValueError, RecursionError):
                 # 尝试修复并验证
                 fixed = JsonUtils.fix_json_format(candidate)
                 if fixed:
                     return fixed
         
-        # 回退到旧方法：使用简单正则表达式
+        # 回退到旧方法：使用简单正则表达式（只有扫描没有找到可解析或可修复的候选时才会执行到这里）
         try:
             # 尝试查找 { 和 } 之间的内容
-            matches = re.findall(r'({.*?})', text, re.DOTALL)
+            # 只在最后一个 } 之前查找，避免每个未闭合的 { 都扫描到文本末尾
+            matches = re.findall(r'({.*?})', text[:text.rfind('}') + 1], re.DOTALL)
             for match in matches:
                 try:
                     json.loads(match)
@@ -263,7 +302,7 @@ class JsonUtils:
                         return fixed
             
             # 尝试查找 [ 和 ] 之间的内容
-            matches = re.findall(r'(\[.*?\])', text, re.DOTALL)
+            matches = re.findall(r'(\[.*?\])', text[:text.rfind(']') + 1], re.DOTALL)
             for match in matches:
                 try:
                     json.loads(match)
@@ -326,4 +365,84 @@ class JsonUtils:
                 print(f"\033[91m[{debug_prefix}无法从文本中提取JSON] {input_data[:200]}...\033[0m" if len(input_data) > 200 else f"\033[91m[{debug_prefix}无法从文本中提取JSON] {input_data}\033[0m")
         
         # 如果所有解析尝试都失败，返回空字典
-        return {} 
\ No newline at end of file
+        return {} 
+
+class IncrementalJsonArrayParser:
+    """
+    增量解析模型流式输出的问答对数组
+    
+    每次feed一段新文本，只扫描新增部分的括号、引号和转义符（与find_json_spans相同的跟踪方式），
+    数组中的对象一闭合就解析并返回，不必等待整个响应结束。数组可以位于顶层，
+    也可以包在{"qa_pairs": [...]}之类的对象中；前面的说明文字和代码块标记会被跳过。
+    """
+    
+    def __init__(self, required_key: str = "question", not_json_chars: int = 200):
+        """
+        Args:
+            required_key: 只返回包含该键的对象，分组等外层对象不返回
+            not_json_chars: 输出达到该字符数仍没有出现 { 时，判定响应不是JSON；为0时不做该判定
+        """
+        self.text = ""
+        self.required_key = required_key
+        self.not_json_chars = not_json_chars
+        self.objects = 0
+        # 未闭合的括号及其位置
+        self._stack: List[Tuple[str, int]] = []
+        self._in_string = False
+        self._skip_pos = -1
+        self._scan_pos = 0
+        self._seen_object = False
+    
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        """
+        追加一段输出文本
+        
+        Args:
+            delta: 新到达的文本
+            
+        Returns:
+            本次新闭合的、位于数组中且包含required_key的对象列表
+        """
+        self.text += delta
+        completed = []
+        text = self.text
+        for match in _JSON_STRUCTURE_CHARS.finditer(text, self._scan_pos):
+            pos = match.start()
+            char = text[pos]
+            if pos == self._skip_pos:
+                continue
+            if self._in_string:
+                if char == '\\':
+                    self._skip_pos = pos + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+            
+            if char in '{[':
+                self._stack.append((char, pos))
+                self._seen_object = self._seen_object or char == '{'
+            elif not self._stack:
+                continue
+            elif char == '"':
+                self._in_string = True
+            elif char in _JSON_CLOSERS:
+                opener, start = self._stack.pop()
+                if opener != _JSON_CLOSERS[char]:
+                    # 括号不匹配（如正文中的方括号），重新开始跟踪
+                    self._stack = []
+                    continue
+                if char == '}' and self._stack and self._stack[-1][0] == '[':
+                    try:
+                        value = json.loads(text[start:pos + 1])
+                    except (ValueError, RecursionError):
+                        continue
+                    if isinstance(value, dict) and self.required_key in value:
+                        completed.append(value)
+        self._scan_pos = len(text)
+        self.objects += len(completed)
+        return completed
+    
+    @property
+    def not_json(self) -> bool:
+        """输出已达到not_json_chars个字符但还没有出现任何JSON对象时为True，可据此提前中止。"""
+        return self.not_json_chars > 0 and not self._seen_object and len(self.text) >= self.not_json_chars
@@ -0,0 +1,180 @@
+# src/utils/llm_cache.py
+"""
+大模型响应的本地持久化缓存。
+以模型名称、基础URL、消息、temperature和max_tokens的哈希作为键，
+将响应内容保存在本地SQLite文件中，并按总大小进行LRU淘汰。
+缓存总大小在打开时统计一次，之后随写入和淘汰增量维护；命中时刷新的访问时间先记在内存中，
+随下一次写入一起提交，或积累到ACCESS_FLUSH_SIZE条时批量提交，读取不会每次都触发磁盘同步。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class LLMResponseCache:
+    # 内存中累积的访问时间更新达到该条数时批量写入数据库
+    ACCESS_FLUSH_SIZE = 256
+
+    def __init__(self, db_path: str, max_size_bytes: int = 512 * 1024 * 1024):
+        """
+        初始化响应缓存。
+
+        参数:
+            db_path: SQLite缓存文件路径
+            max_size_bytes: 缓存内容的最大总字节数，超出后按最近最少使用顺序淘汰；
+                            总大小在打开时统计，同时有其他进程写入同一文件时只反映本进程的写入
+        """
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 命中但尚未写入数据库的访问时间：键 -> 最近一次访问时间
+        self._pending_access: Dict[str, float] = {}
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        # 允许多个提取线程共享同一个连接，访问由self._lock串行化
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, base_url: str, messages: List[Dict[str, str]],
+                 temperature: float, max_tokens: int) -> str:
+        """
+        根据请求参数生成内容寻址的缓存键。
+
+        参数:
+            model: 模型名称
+            base_url: API基础URL
+            messages: 对话消息列表
+            temperature: 采样温度
+            max_tokens: 最大生成token数
+
+        返回:
+            请求参数的SHA-256十六进制摘要
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "base_url": base_url,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的响应内容，命中时在内存中记录访问时间，之后批量写入数据库。
+
+        参数:
+            key: 缓存键
+
+        返回:
+            缓存的响应内容，未命中时返回None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._pending_access[key] = time.time()
+            if len(self._pending_access) >= self.ACCESS_FLUSH_SIZE:
+                self._write_pending_access()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, content: str) -> None:
+        """
+        写入响应内容，并在超出大小限制时淘汰最久未使用的条目。尚未写入的访问时间在同一事务中提交。
+
+        参数:
+            key: 缓存键
+            content: 响应内容
+        """
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            self._pending_access.pop(key, None)
+            self._write_pending_access()
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, content, size, time.time())
+            )
+            self._total_size += size - (row[0] if row else 0)
+            self._evict()
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """把内存中尚未写入的访问时间提交到数据库。"""
+        with self._lock:
+            if self._pending_access:
+                self._write_pending_access()
+                self._conn.commit()
+
+    def _write_pending_access(self) -> None:
+        """把内存中的访问时间写入当前事务（不提交）。调用方需持有锁。"""
+        if self._pending_access:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._pending_access.items()])
+            self._pending_access.clear()
+
+    def _evict(self) -> None:
+        """按最近最少使用顺序删除条目，直到总大小不超过限制。调用方需持有锁。"""
+        if self._total_size <= self.max_size_bytes:
+            return
+
+        # 沿last_access索引从最旧的条目开始读取，删够为止，不读取整张表
+        to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if self._total_size <= self.max_size_bytes:
+                break
+            to_delete.append((key,))
+            self._total_size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回缓存命中统计。
+
+        返回:
+            包含hits、misses和缓存文件路径的字典
+        """
+        with self._lock:
+            return {
+                "path": self.db_path,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def close(self) -> None:
+        """提交尚未写入的访问时间，并关闭底层数据库连接。"""
+        with self._lock:
+            self._write_pending_access()
+            self._conn.commit()
+            self._conn.close()
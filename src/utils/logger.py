@@ -2,19 +2,80 @@
 """
 Custom logger for the QA Documents application.
 Uses Beijing time zone (UTC+8) and provides daily log file rotation.
+By default records are passed through a queue to a background listener thread,
+so file and console I/O never blocks the calling (worker) threads.
 """
 
+import atexit
 import logging
-from datetime import datetime, timedelta, timezone
+import logging.handlers
 import os
-import sys
-import io
+import queue
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 当前生效的BeijingLogger，fork出的子进程据此重建处理器
+_active_logger: Optional["BeijingLogger"] = None
+_shared_logger: Optional["BeijingLogger"] = None
+_shared_lock = threading.Lock()
+# 为None时由环境变量LOG_QUEUE决定是否使用队列，disable_log_queue()将其设为False
+_default_use_queue: Optional[bool] = None
+# 所有LazyLogger实例，fork后清除它们缓存的日志记录器
+_lazy_loggers: "weakref.WeakSet[LazyLogger]" = weakref.WeakSet()
+
+
+class BeijingDailyFileHandler(logging.FileHandler):
+    def __init__(self, log_dir: str, encoding: str = 'utf-8'):
+        """
+        按北京时间每天写入 <log_dir>/<YYYY-MM-DD>.log 的文件处理器。
+        日期切换只需在写入时比较记录时间戳与下一个零点，不再每次格式化日期字符串。
+
+        参数:
+            log_dir: 日志目录
+            encoding: 文件编码
+        """
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+        self.current_date, self.next_rollover = self._date_and_next_midnight(time.time())
+        super().__init__(self._log_path(self.current_date), encoding=encoding, delay=True)
+
+    @staticmethod
+    def _date_and_next_midnight(timestamp: float):
+        now = datetime.fromtimestamp(timestamp, BEIJING_TZ)
+        next_midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return now.strftime('%Y-%m-%d'), next_midnight.timestamp()
+
+    def _log_path(self, date_str: str) -> str:
+        return os.path.join(self.log_dir, date_str + ".log")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Handler.handle已持有处理器锁，这里可以直接切换文件
+        if record.created >= self.next_rollover:
+            self.current_date, self.next_rollover = self._date_and_next_midnight(record.created)
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(self._log_path(self.current_date))
+        super().emit(record)
 
-# 配置标准输出为 UTF-8 编码
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 class BeijingLogger:
-    def __init__(self, log_dir=None, log_level=logging.INFO):
+    def __init__(self, log_dir=None, log_level=logging.INFO, use_queue: Optional[bool] = None):
+        """
+        配置名为BeijingLogger的日志记录器。通常应通过模块级的get_logger()获取共享实例。
+
+        参数:
+            log_dir: 日志目录，默认为项目根目录下的logs
+            log_level: 日志级别
+            use_queue: 是否通过队列交给后台线程写日志，默认读取环境变量LOG_QUEUE（设为0时同步写入）
+        """
         # 使用绝对路径
         if log_dir is None:
             # 当前目录的父目录下的logs目录
@@ -22,78 +83,154 @@ class BeijingLogger:
             self.log_dir = os.path.join(base_dir, "logs")
         else:
             self.log_dir = log_dir
-            
-        print(f"Log directory set to: {self.log_dir}")  # 调试输出，确认日志目录
+
         self.log_level = log_level
-        self.logger = None
-        self.current_date = None
-        self.update_logger()  # 初始化并配置 logger
-
-    def update_logger(self):
-        # 获取当前北京时间
-        now = datetime.now(timezone.utc) + timedelta(hours=8)
-        current_date = now.strftime('%Y-%m-%d')
-
-        # 如果日期发生变化，更新日志文件
-        if self.current_date != current_date:
-            self.current_date = current_date
-            log_file = os.path.join(self.log_dir, current_date + ".log")
-            os.makedirs(self.log_dir, exist_ok=True)
-
-            # 如果 logger 已经存在，移除旧的 handler
-            if self.logger and self.logger.hasHandlers():
-                self.logger.handlers.clear()
-
-            # 创建新的 logger 和 handler
-            self.logger = logging.getLogger("BeijingLogger")  # 确保获取的 logger 实例唯一
-            self.logger.setLevel(self.log_level)
-            self.logger.propagate = False  # 防止日志被传递到根logger
-
-            # 避免重复添加 handler
-            if not self.logger.hasHandlers():
-                # 添加文件处理器
-                try:
-                    file_handler = logging.FileHandler(log_file, encoding="utf-8")
-                    formatter = BeijingFormatter('%(asctime)s - %(levelname)s - %(message)s',
-                                                datefmt='%Y-%m-%d %H:%M:%S')
-                    file_handler.setFormatter(formatter)
-                    self.logger.addHandler(file_handler)
-                    
-                    # 添加控制台处理器
-                    console_handler = logging.StreamHandler()
-                    console_handler.setFormatter(formatter)
-                    self.logger.addHandler(console_handler)
-                    
-                    # 输出日志路径信息
-                    self.logger.info(f"Logger initialized. Logging to: {log_file}")
-                except Exception as e:
-                    print(f"Error setting up logger: {str(e)}")
-                    # 如果无法创建文件处理器，至少添加一个控制台处理器
-                    console_handler = logging.StreamHandler()
-                    formatter = BeijingFormatter('%(asctime)s - %(levelname)s - %(message)s',
-                                                datefmt='%Y-%m-%d %H:%M:%S')
-                    console_handler.setFormatter(formatter)
-                    self.logger.addHandler(console_handler)
-
-    def get_logger(self):
-        return self.LoggerWrapper(self)  # 使用包装类以实现自动更新日志文件
-
-    class LoggerWrapper:
-        def __init__(self, parent_logger):
-            self.parent_logger = parent_logger
-
-        def __getattr__(self, attr):
-            """
-            使用此方法来动态代理 logger 的方法，确保每次调用时检查日期
-            """
-            # 每次调用 logger 的方法前，更新日志文件
-            self.parent_logger.update_logger()
-            return getattr(self.parent_logger.logger, attr)
+        self.use_queue = os.getenv('LOG_QUEUE', '1') != '0' if use_queue is None else use_queue
+        self.logger = logging.getLogger("BeijingLogger")  # 确保获取的 logger 实例唯一
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.handlers: List[logging.Handler] = []
+        self._configure()
+        atexit.register(self.close)
+
+    def _build_handlers(self) -> List[logging.Handler]:
+        """创建文件处理器和控制台处理器，无法创建文件处理器时只使用控制台。"""
+        formatter = BeijingFormatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+        handlers = []
+        try:
+            file_handler = BeijingDailyFileHandler(self.log_dir)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except Exception as e:
+            print(f"Error setting up logger: {str(e)}")
+
+        # 添加控制台处理器
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+        return handlers
+
+    def _configure(self, announce: bool = True) -> None:
+        """移除旧的处理器并按当前设置重新配置，同一时刻只有一个BeijingLogger生效。"""
+        global _active_logger
+        if _active_logger is not None and _active_logger is not self:
+            _active_logger.close()
+        _active_logger = self
+
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.setLevel(self.log_level)
+        self.logger.propagate = False  # 防止日志被传递到根logger
+
+        self.handlers = self._build_handlers()
+        if self.use_queue:
+            # 调用线程只把记录放入队列，格式化后的写入由后台监听线程完成
+            log_queue = queue.SimpleQueue()
+            self.listener = logging.handlers.QueueListener(log_queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        else:
+            self.listener = None
+            for handler in self.handlers:
+                self.logger.addHandler(handler)
+
+        if announce:
+            # 输出日志路径信息
+            self.logger.info(f"Logger initialized. Logging to: {self.log_dir}")
+
+    def _reinit_after_fork(self) -> None:
+        """
+        在fork出的子进程中调用。子进程中没有父进程的监听线程，继承的队列无人消费，
+        因此丢弃继承的监听器和处理器后重新配置。
+        """
+        self.listener = None
+        self.handlers = []
+        self._configure(announce=False)
+
+    def get_logger(self) -> logging.Logger:
+        """返回配置好的logging.Logger。"""
+        return self.logger
+
+    def close(self) -> None:
+        """停止后台监听线程，写出队列中剩余的记录并关闭处理器。"""
+        if self.listener is not None:
+            try:
+                self.listener.stop()
+            except Exception:
+                pass
+            self.listener = None
+        for handler in self.handlers:
+            try:
+                handler.flush()
+                handler.close()
+            except Exception:
+                pass
+
+
+def get_logger() -> logging.Logger:
+    """
+    返回进程内共享的日志记录器，首次调用时创建。
+
+    返回:
+        logging.Logger实例
+    """
+    global _shared_logger
+    with _shared_lock:
+        if _shared_logger is None:
+            _shared_logger = BeijingLogger(use_queue=_default_use_queue)
+    return _shared_logger.get_logger()
+
+
+def disable_log_queue() -> None:
+    """
+    让当前进程改为同步写日志，已创建的共享日志记录器会先写出队列中的记录再重新配置。
+    用于进程池的工作进程：它们以os._exit退出，不会执行atexit注册的close()，
+    队列中尚未被监听线程写出的记录会丢失。
+    """
+    global _default_use_queue
+    with _shared_lock:
+        _default_use_queue = False
+        if _shared_logger is not None and _shared_logger.use_queue:
+            _shared_logger.close()
+            _shared_logger.use_queue = False
+            _shared_logger._configure(announce=False)
+
+
+class LazyLogger:
+    """
+    共享日志记录器的代理，第一次写日志时才调用get_logger()创建处理器和后台线程，
+    模块可以在导入时持有它而不产生日志目录、线程等副作用。
+    得到的日志记录器缓存在实例上，之后的日志调用不再获取全局锁；fork后缓存由at-fork钩子清除。
+    """
+
+    def __init__(self):
+        self._logger: Optional[logging.Logger] = None
+        _lazy_loggers.add(self)
+
+    def __getattr__(self, name):
+        logger = self._logger
+        if logger is None:
+            logger = self._logger = get_logger()
+        return getattr(logger, name)
+
+
+def _after_fork_in_child() -> None:
+    global _shared_lock
+    # fork时锁可能被其他线程持有，子进程中重新创建
+    _shared_lock = threading.Lock()
+    if _active_logger is not None and _active_logger.use_queue:
+        _active_logger._reinit_after_fork()
+    for lazy_logger in list(_lazy_loggers):
+        lazy_logger._logger = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
 
 class BeijingFormatter(logging.Formatter):
     def converter(self, timestamp):
         # 使用北京时间
-        dt = datetime.fromtimestamp(timestamp, timezone.utc) + timedelta(hours=8)
+        dt = datetime.fromtimestamp(timestamp, BEIJING_TZ)
         return dt
 
     def formatTime(self, record, datefmt=None):
@@ -0,0 +1,236 @@
+# src/utils/metrics.py
+"""
+轻量级的阶段耗时与计数指标。
+各阶段用metrics.span()计时，耗时按固定分桶累计为直方图，可跨进程合并；
+汇总结果写入summary.json，也可导出为Prometheus文本格式供node exporter的textfile收集器读取。
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 直方图分桶上界（秒），覆盖从JSON解析的毫秒级到MinerU轮询的分钟级
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, math.inf)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _make_key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_key(key: MetricKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        """初始化空的指标集合。"""
+        self._lock = threading.Lock()
+        # 键 -> [各分桶计数列表, 次数, 总耗时, 最大耗时]
+        self._timings: Dict[MetricKey, list] = {}
+        self._counters: Dict[MetricKey, float] = {}
+
+    @contextmanager
+    def span(self, name: str, **labels: Any) -> Iterator[None]:
+        """
+        记录代码块的耗时，代码块抛出异常时同样计时。
+
+        参数:
+            name: 阶段名称
+            labels: 可选的标签，如backend="pymupdf"
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """
+        记录一次耗时。
+
+        参数:
+            name: 阶段名称
+            seconds: 耗时（秒）
+            labels: 可选的标签
+        """
+        key = _make_key(name, labels)
+        bucket = next(i for i, upper in enumerate(BUCKETS) if seconds <= upper)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = self._timings[key] = [[0] * len(BUCKETS), 0, 0.0, 0.0]
+            timing[0][bucket] += 1
+            timing[1] += 1
+            timing[2] += seconds
+            timing[3] = max(timing[3], seconds)
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """
+        累加计数器。
+
+        参数:
+            name: 计数器名称
+            value: 增量
+            labels: 可选的标签
+        """
+        key = _make_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        导出可序列化的原始指标，用于从工作进程传回主进程合并。
+
+        参数:
+            reset: 导出后是否清空当前指标
+
+        返回:
+            包含timings和counters的字典
+        """
+        with self._lock:
+            data = {
+                "timings": [[key[0], list(key[1]), list(t[0]), t[1], t[2], t[3]] for key, t in self._timings.items()],
+                "counters": [[key[0], list(key[1]), value] for key, value in self._counters.items()]
+            }
+            if reset:
+                self._timings = {}
+                self._counters = {}
+        return data
+
+    def merge(self, data: Optional[Dict[str, Any]]) -> None:
+        """
+        合并snapshot()导出的指标。
+
+        参数:
+            data: snapshot()的返回值
+        """
+        if not data:
+            return
+        with self._lock:
+            for name, labels, buckets, count, total, maximum in data.get("timings", []):
+                key = (name, tuple(tuple(item) for item in labels))
+                timing = self._timings.get(key)
+                if timing is None:
+                    timing = self._timings[key] = [[0] * len(BUCKETS), 0, 0.0, 0.0]
+                timing[0] = [a + b for a, b in zip(timing[0], buckets)]
+                timing[1] += count
+                timing[2] += total
+                timing[3] = max(timing[3], maximum)
+            for name, labels, value in data.get("counters", []):
+                key = (name, tuple(tuple(item) for item in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        """清空所有指标。"""
+        with self._lock:
+            self._timings = {}
+            self._counters = {}
+
+    @staticmethod
+    def _quantile(buckets: list, count: int, maximum: float, q: float) -> float:
+        """按分桶线性插值估计分位数，结果不超过观测到的最大值。"""
+        target = q * count
+        cumulative = 0
+        lower = 0.0
+        for upper, bucket_count in zip(BUCKETS, buckets):
+            if bucket_count and cumulative + bucket_count >= target:
+                upper = min(upper, maximum)
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = upper
+        return maximum
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        生成适合写入summary.json的汇总。
+
+        返回:
+            字典，timings中每个阶段包含次数、总耗时、平均值、p50、p95和最大值，counters为各计数器的值
+        """
+        with self._lock:
+            timings = {}
+            for key in sorted(self._timings):
+                buckets, count, total, maximum = self._timings[key]
+                timings[_format_key(key)] = {
+                    "count": count,
+                    "total_seconds": round(total, 4),
+                    "mean_seconds": round(total / count, 4) if count else 0.0,
+                    "p50_seconds": round(self._quantile(buckets, count, maximum, 0.5), 4),
+                    "p95_seconds": round(self._quantile(buckets, count, maximum, 0.95), 4),
+                    "max_seconds": round(maximum, 4)
+                }
+            counters = {_format_key(key): self._counters[key] for key in sorted(self._counters)}
+        return {"timings": timings, "counters": counters}
+
+    def to_prometheus(self, prefix: str = "qa_documents") -> str:
+        """
+        导出为Prometheus文本格式。耗时为直方图<prefix>_<name>_seconds，计数器为<prefix>_<name>_total。
+
+        参数:
+            prefix: 指标名前缀
+
+        返回:
+            Prometheus文本格式的指标
+        """
+        def label_text(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            timing_names = sorted({key[0] for key in self._timings})
+            for name in timing_names:
+                metric = f"{prefix}_{name}_seconds"
+                lines.append(f"# HELP {metric} {name}阶段耗时")
+                lines.append(f"# TYPE {metric} histogram")
+                for key in sorted(k for k in self._timings if k[0] == name):
+                    buckets, count, total, _ = self._timings[key]
+                    cumulative = 0
+                    for upper, bucket_count in zip(BUCKETS, buckets):
+                        cumulative += bucket_count
+                        le = "+Inf" if math.isinf(upper) else repr(upper)
+                        lines.append(f"{metric}_bucket{label_text(key[1], [('le', le)])} {cumulative}")
+                    lines.append(f"{metric}_sum{label_text(key[1])} {total}")
+                    lines.append(f"{metric}_count{label_text(key[1])} {count}")
+
+            counter_names = sorted({key[0] for key in self._counters})
+            for name in counter_names:
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# HELP {metric} {name}计数")
+                lines.append(f"# TYPE {metric} counter")
+                for key in sorted(k for k in self._counters if k[0] == name):
+                    lines.append(f"{metric}{label_text(key[1])} {self._counters[key]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_path: str, prefix: str = "qa_documents") -> None:
+        """
+        将指标原子地写入Prometheus textfile，避免node exporter读到写了一半的文件。
+
+        参数:
+            file_path: 输出文件路径，node exporter要求以.prom结尾
+            prefix: 指标名前缀
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(tmp_path, file_path)
+
+
+# 进程内共享的指标实例
+metrics = Metrics()
@@ -0,0 +1,121 @@
+# src/utils/parse_cache.py
+"""
+文档解析结果缓存。
+以文件内容哈希、胜出的提取后端和max_chunk_size为键，
+将 {file_content, chunks, file_extension} 压缩保存到本地目录，避免重复解析大型PDF。
+文本块尽量以其在全文中的偏移量保存，只有无法在全文中定位的块才保存原文。
+"""
+
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from .run_manifest import hash_file
+
+
+class ParsedDocumentCache:
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir: str):
+        """
+        初始化解析缓存。
+
+        参数:
+            cache_dir: 缓存文件所在目录
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, content_hash: str, backend: str, max_chunk_size: Any) -> str:
+        safe_backend = "".join(c if c.isalnum() or c in '-_' else '_' for c in backend)
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}-{safe_backend}-{max_chunk_size}.zlib")
+
+    def load(self, file_path: str, backends: Iterable[str], max_chunk_size: Any,
+             content_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        按后端优先级查找缓存的解析结果。
+
+        参数:
+            file_path: 文档路径
+            backends: 当前可用的提取后端名称，按优先级排列
+            max_chunk_size: 分块参数，如DocumentProcessor.chunking_key
+            content_hash: 可选，已计算好的文件内容哈希
+
+        返回:
+            缓存的文档字典（包含file_name、file_extension、file_content、chunks和extractor），未命中时返回None
+        """
+        content_hash = content_hash or hash_file(file_path)
+        for backend in backends:
+            entry_path = self._entry_path(content_hash, backend, max_chunk_size)
+            if not os.path.exists(entry_path):
+                continue
+            try:
+                with open(entry_path, 'rb') as f:
+                    payload = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+                if payload.get("version") != self.FORMAT_VERSION:
+                    continue
+            except (IOError, ValueError, zlib.error):
+                continue
+
+            content = payload["file_content"]
+            chunks = [
+                content[item[0]:item[0] + item[1]] if isinstance(item, list) else item
+                for item in payload["chunks"]
+            ]
+            return {
+                'file_name': os.path.basename(file_path),
+                'file_extension': payload["file_extension"],
+                'file_content': content,
+                'chunks': chunks,
+                'extractor': backend
+            }
+        return None
+
+    def store(self, file_path: str, document: Dict[str, Any], max_chunk_size: Any,
+              content_hash: Optional[str] = None) -> None:
+        """
+        保存解析结果。文档必须包含extractor字段标明胜出的提取后端。
+
+        参数:
+            file_path: 文档路径
+            document: process_single_file返回的文档字典
+            max_chunk_size: 分块参数，如DocumentProcessor.chunking_key
+            content_hash: 可选，已计算好的文件内容哈希
+        """
+        backend = document.get('extractor')
+        content = document.get('file_content')
+        if not backend or content is None:
+            return
+
+        content_hash = content_hash or hash_file(file_path)
+        payload = {
+            "version": self.FORMAT_VERSION,
+            "file_extension": document.get('file_extension', ''),
+            "file_content": content,
+            "chunks": self._encode_chunks(content, document.get('chunks', []))
+        }
+        entry_path = self._entry_path(content_hash, backend, max_chunk_size)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        # 先写临时文件再替换，避免并发进程读到写了一半的缓存
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'), 6))
+        os.replace(tmp_path, entry_path)
+
+    @staticmethod
+    def _encode_chunks(content: str, chunks: List[str]) -> List[Any]:
+        """将文本块编码为[偏移量, 长度]，无法在全文中按顺序定位的块保留原文。"""
+        encoded = []
+        cursor = 0
+        for chunk in chunks:
+            pos = content.find(chunk, cursor)
+            if pos < 0:
+                pos = content.find(chunk)
+            if pos >= 0:
+                encoded.append([pos, len(chunk)])
+                cursor = pos + len(chunk)
+            else:
+                encoded.append(chunk)
+        return encoded
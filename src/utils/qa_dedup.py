@@ -0,0 +1,249 @@
+# src/utils/qa_dedup.py
+"""
+问答对的近似去重。
+对规范化后的问题和答案取字符n-gram，计算单次哈希分桶的MinHash签名（one permutation hashing），
+再用LSH分段索引查找候选，估计的Jaccard相似度达到阈值的问答对视为重复并丢弃。
+索引默认保存在内存中，可以限制条目数，超出时淘汰最早的条目；指定SQLite文件时保存在磁盘上，内存占用与问答对数量无关，且可以跨多次运行使用。
+"""
+
+import hashlib
+import operator
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_NON_WORD_PATTERN = re.compile(r'[\W_]+')
+_EMPTY_BIN = (1 << 64) - 1
+_DENSIFY_STEP = 0x9E3779B97F4A7C15
+
+
+def normalize_text(text: str) -> str:
+    """统一全角/半角和大小写，并去掉空白和标点。"""
+    return _NON_WORD_PATTERN.sub('', unicodedata.normalize('NFKC', str(text or '')).lower())
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+class _MemoryIndex:
+    """
+    内存中的LSH索引，每个条目约占3.6KB（签名约1KB，其余为各分段的桶）。
+    条目数超过max_entries时淘汰最早加入的条目，被淘汰的问答对不再参与去重。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self.evicted = 0
+        self._buckets: Dict[int, List[int]] = {}
+        # 条目编号 -> (签名, 所属文档, 分段键)，字典按加入顺序保存，最早的条目排在最前
+        self._entries: Dict[int, Tuple[bytes, str, array]] = {}
+        self._documents: Dict[str, Set[int]] = {}
+        self._next_id = 0
+
+    def candidates(self, band_keys: List[int]) -> List[bytes]:
+        ids = set()
+        for key in band_keys:
+            ids.update(self._buckets.get(key, ()))
+        return [self._entries[entry_id][0] for entry_id in ids]
+
+    def add(self, document: str, signature: bytes, band_keys: List[int]) -> None:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (signature, document, array('q', band_keys))
+        self._documents.setdefault(document, set()).add(entry_id)
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(entry_id)
+        if self.max_entries and len(self._entries) > self.max_entries:
+            self._remove_entry(next(iter(self._entries)))
+            self.evicted += 1
+
+    def _remove_entry(self, entry_id: int) -> None:
+        _, document, band_keys = self._entries.pop(entry_id)
+        entry_ids = self._documents[document]
+        entry_ids.discard(entry_id)
+        if not entry_ids:
+            del self._documents[document]
+        for key in band_keys:
+            bucket = self._buckets[key]
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def remove_document(self, document: str) -> None:
+        for entry_id in list(self._documents.get(document, ())):
+            self._remove_entry(entry_id)
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _SqliteIndex:
+    """保存在SQLite文件中的LSH索引。"""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, document TEXT NOT NULL, signature BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, id INTEGER NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_key ON bands(key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_id ON bands(id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_document ON entries(document)")
+        self._conn.commit()
+
+    def candidates(self, band_keys: List[int]) -> List[bytes]:
+        rows = self._conn.execute(
+            "SELECT signature FROM entries WHERE id IN (SELECT id FROM bands WHERE key IN (%s))"
+            % ",".join("?" * len(band_keys)),
+            band_keys
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def add(self, document: str, signature: bytes, band_keys: List[int]) -> None:
+        entry_id = self._conn.execute(
+            "INSERT INTO entries (document, signature) VALUES (?, ?)", (document, signature)
+        ).lastrowid
+        self._conn.executemany(
+            "INSERT INTO bands (key, id) VALUES (?, ?)",
+            [(key, entry_id) for key in band_keys]
+        )
+
+    def remove_document(self, document: str) -> None:
+        self._conn.execute("DELETE FROM bands WHERE id IN (SELECT id FROM entries WHERE document = ?)", (document,))
+        self._conn.execute("DELETE FROM entries WHERE document = ?", (document,))
+        self._conn.commit()
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+
+class QADeduplicator:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, ngram: int = 3,
+                 index_path: Optional[str] = None, max_entries: Optional[int] = None):
+        """
+        初始化问答对去重器。
+
+        参数:
+            threshold: 估计的Jaccard相似度不低于该值时视为重复
+            num_perm: MinHash签名长度，必须能被bands整除
+            bands: LSH分段数；每段num_perm/bands行，候选召回的相似度拐点约为(1/bands)^(bands/num_perm)
+            ngram: 字符n-gram的长度
+            index_path: 可选的SQLite索引文件，不指定时索引保存在内存中
+            max_entries: 内存索引的条目数上限（每个保留的问答对一个条目，约4KB），
+                超出时淘汰最早的条目；为None或0时不限制。使用SQLite索引时忽略
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm必须能被bands整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.index_path = index_path
+        self.kept = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._index = _SqliteIndex(index_path) if index_path else _MemoryIndex(max_entries)
+
+    def signature(self, pair: Dict[str, Any]) -> array:
+        """
+        计算问答对的MinHash签名：每个n-gram只哈希一次，按哈希值分到num_perm个桶中取最小值，
+        空桶从右侧最近的非空桶借值（旋转致密化）。
+        """
+        text = normalize_text(pair.get('question', '')) + '\x1f' + normalize_text(pair.get('answer', ''))
+        signature = array('Q', [_EMPTY_BIN]) * self.num_perm
+        shingles = {text[i:i + self.ngram] for i in range(max(len(text) - self.ngram + 1, 1))}
+        for shingle in shingles:
+            value = _hash64(shingle.encode('utf-8'))
+            slot = value % self.num_perm
+            value //= self.num_perm
+            if value < signature[slot]:
+                signature[slot] = value
+        if _EMPTY_BIN in signature:
+            filled = signature.tolist()
+            for slot in range(self.num_perm):
+                if filled[slot] != _EMPTY_BIN:
+                    continue
+                for offset in range(1, self.num_perm):
+                    borrowed = filled[(slot + offset) % self.num_perm]
+                    if borrowed != _EMPTY_BIN:
+                        # 借来的值加上与偏移量相关的常数，使不同位置借到同一个值时仍可区分
+                        signature[slot] = (borrowed + offset * _DENSIFY_STEP) & _EMPTY_BIN
+                        break
+        return signature
+
+    def _band_keys(self, signature: array) -> List[int]:
+        """每段签名连同段号哈希为一个有符号64位整数，作为LSH桶的键，不同段的键互不冲突。"""
+        raw = signature.tobytes()
+        size = self.rows * signature.itemsize
+        return [int.from_bytes(hashlib.blake2b(bytes([i]) + raw[i * size:(i + 1) * size], digest_size=8).digest(),
+                               'little', signed=True)
+                for i in range(self.bands)]
+
+    def _similarity(self, signature: array, other: bytes) -> float:
+        other_signature = array('Q')
+        other_signature.frombytes(other)
+        return sum(map(operator.eq, signature, other_signature)) / self.num_perm
+
+    def filter(self, pairs: List[Dict[str, Any]], document: str) -> List[Dict[str, Any]]:
+        """
+        过滤与已见过的问答对（包括本批次中较早的问答对）近似重复的问答对，保留的问答对加入索引。
+        可以在多个线程中调用。
+
+        参数:
+            pairs: 问答对列表
+            document: 问答对所属的文档标识（如相对路径），用于remove_document
+
+        返回:
+            去重后的问答对列表，保持原有顺序
+        """
+        kept = []
+        with self._lock:
+            for pair in pairs:
+                signature = self.signature(pair)
+                band_keys = self._band_keys(signature)
+                if any(self._similarity(signature, other) >= self.threshold
+                       for other in self._index.candidates(band_keys)):
+                    self.dropped += 1
+                    continue
+                self._index.add(document, signature.tobytes(), band_keys)
+                self.kept += 1
+                kept.append(pair)
+            self._index.commit()
+        return kept
+
+    def remove_document(self, document: str) -> None:
+        """
+        从索引中移除某个文档的问答对。文档重新处理（包括断点续跑）前调用，
+        避免它与自己上一次的结果判为重复。
+
+        参数:
+            document: 文档标识
+        """
+        with self._lock:
+            self._index.remove_document(document)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回保留和丢弃的问答对数量，以及内存索引淘汰的条目数。"""
+        return {"kept": self.kept, "dropped": self.dropped, "threshold": self.threshold,
+                "evicted": getattr(self._index, 'evicted', 0)}
+
+    def close(self) -> None:
+        """关闭索引。"""
+        with self._lock:
+            self._index.close()
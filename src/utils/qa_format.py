@@ -0,0 +1,128 @@
+# src/utils/qa_format.py
+"""
+问答对输出格式v2。
+原格式（v1）是问答对的平铺列表，每个问答对都带着完整的文本块原文，并以indent=2写出；
+v2每个文档只保存一份文本块表（序号、原文和所在章节），问答对通过chunk_id引用文本块，以紧凑JSON写出。
+本模块提供v2文档的构建、写出、读取，以及转换回v1平铺格式的工具。
+
+转换为v1格式:
+    python -m src.utils.qa_format output/2024-01-01/doc.v2.json doc.json
+"""
+
+import argparse
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+FORMAT_NAME = "qa_documents"
+FORMAT_VERSION = 2
+# v2输出文件的扩展名
+FILE_EXTENSION = ".v2.json"
+
+
+def chunk_section(chunk: str) -> Optional[str]:
+    """
+    返回文本块所在的章节：heading分块策略生成的文本块以标题路径（如"# 指南 > 2. 病情评估"）开头，
+    Markdown输出的文本块以标题行开头。没有标题行时返回None。
+    """
+    first_line = chunk.lstrip().split("\n", 1)[0]
+    if not first_line.startswith("#"):
+        return None
+    return first_line.lstrip("#").strip() or None
+
+
+def build_document(chunk_results: Dict[int, List[Dict[str, Any]]], chunks: List[str],
+                   file_path: str = "") -> Dict[str, Any]:
+    """
+    构建v2文档。文本块表只包含有问答对引用的文本块，文本块的id为它在文档中的序号。
+
+    参数:
+        chunk_results: 字典，键为文本块序号，值为该块的问答对（问答对中的chunk字段会被去掉）
+        chunks: 文档的全部文本块
+        file_path: 文档的相对路径
+
+    返回:
+        v2文档字典，包含format、version、file_path、chunks和qa_pairs
+    """
+    chunk_table = []
+    qa_pairs = []
+    for index in sorted(chunk_results):
+        pairs = chunk_results[index]
+        if not pairs:
+            continue
+        entry = {"id": index, "text": chunks[index]}
+        section = chunk_section(chunks[index])
+        if section:
+            entry["section"] = section
+        chunk_table.append(entry)
+        qa_pairs.extend(dict({k: v for k, v in pair.items() if k != 'chunk'}, chunk_id=index) for pair in pairs)
+    return {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "file_path": file_path,
+        "chunks": chunk_table,
+        "qa_pairs": qa_pairs
+    }
+
+
+def write_document(document: Dict[str, Any], file_path: str) -> None:
+    """以紧凑JSON（无缩进和多余空格）写出v2文档。"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def read_document(file_path: str) -> Dict[str, Any]:
+    """
+    读取v2文档。
+
+    参数:
+        file_path: v2文件路径
+
+    返回:
+        v2文档字典
+
+    异常:
+        ValueError: 文件不是v2格式
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    if not isinstance(document, dict) or document.get("format") != FORMAT_NAME or document.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{file_path} 不是v{FORMAT_VERSION}格式的问答对文件")
+    return document
+
+
+def chunk_texts(document: Dict[str, Any]) -> Dict[int, str]:
+    """返回v2文档中文本块id到原文的映射。"""
+    return {entry["id"]: entry["text"] for entry in document.get("chunks", [])}
+
+
+def to_flat(document: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    把v2文档转换为v1平铺格式：每个问答对去掉chunk_id，附上所引用文本块的原文（chunk字段）。
+
+    参数:
+        document: v2文档字典
+
+    返回:
+        问答对列表，与直接以json格式输出的结果相同
+    """
+    texts = chunk_texts(document)
+    return [dict({k: v for k, v in pair.items() if k != 'chunk_id'}, chunk=texts.get(pair.get("chunk_id"), ""))
+            for pair in document.get("qa_pairs", [])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把v2格式的问答对文件转换为v1平铺格式")
+    parser.add_argument("input", help="v2格式的问答对文件")
+    parser.add_argument("output", help="转换后的JSON文件路径")
+    args = parser.parse_args()
+
+    qa_pairs = to_flat(read_document(args.input))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
+    print(f"已将 {len(qa_pairs)} 个问答对转换为平铺格式: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# src/utils/rate_limiter.py
+"""
+大模型调用的限流与自适应并发控制。
+用令牌桶同时限制每分钟请求数（RPM）和每分钟token数（TPM），
+遵循服务端返回的Retry-After提示，并根据429限流和响应延迟以加性增、乘性减的方式
+调整允许同时进行的请求数，使吞吐量稳定在配额上限附近。
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """返回桶中攒够amount所需的秒数，调用前需先refill。"""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_concurrency: int = 8, min_concurrency: int = 1, latency_tolerance: float = 2.0):
+        """
+        初始化限流器。
+
+        参数:
+            rpm: 每分钟最大请求数，为None时不限制
+            tpm: 每分钟最大token数，为None时不限制
+            max_concurrency: 允许同时进行的最大请求数
+            min_concurrency: 被限流时并发数下降的下限
+            latency_tolerance: 平均延迟超过历史最低平均延迟的多少倍时停止增加并发
+        """
+        self.request_bucket = _TokenBucket(rpm) if rpm else None
+        self.token_bucket = _TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.latency_tolerance = latency_tolerance
+
+        self.concurrency_limit = self.max_concurrency
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled_count = 0
+        self.request_count = 0
+        self._successes_since_change = 0
+        self._latency_ewma: Optional[float] = None
+        self._latency_floor: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        阻塞直到可以发出一个请求：并发数未满、未处于Retry-After等待期、且RPM/TPM预算足够。
+
+        参数:
+            tokens: 本次请求预估消耗的token数
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if self.in_flight >= self.concurrency_limit:
+                    wait = max(wait, 0.05) if wait > 0 else None
+                else:
+                    for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+                        if bucket is not None:
+                            bucket.refill(now)
+                            wait = max(wait, bucket.wait_time(amount))
+                    if wait <= 0:
+                        if self.request_bucket is not None:
+                            self.request_bucket.level -= 1
+                        if self.token_bucket is not None:
+                            self.token_bucket.level -= min(tokens, self.token_bucket.capacity)
+                        self.in_flight += 1
+                        self.request_count += 1
+                        return
+                # 并发已满时等待release通知，否则等到预算恢复或限流期结束
+                self._cond.wait(timeout=wait)
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False,
+                retry_after: Optional[float] = None, token_correction: int = 0) -> None:
+        """
+        请求结束后归还并发名额，并根据结果调整并发上限。
+
+        参数:
+            latency: 请求耗时（秒），仅成功请求提供
+            throttled: 请求是否被服务端限流（HTTP 429）
+            retry_after: 服务端建议的重试等待秒数
+            token_correction: 实际token用量与预估值之差，用于修正TPM预算
+        """
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+
+            if self.token_bucket is not None and token_correction:
+                self.token_bucket.refill(now)
+                self.token_bucket.level -= token_correction
+
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+            if throttled:
+                # 乘性减：被限流时并发上限减半
+                self.throttled_count += 1
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit // 2)
+                self._successes_since_change = 0
+            elif latency is not None:
+                self._observe_latency(latency)
+                self._successes_since_change += 1
+                # 加性增：连续成功一轮且延迟没有明显恶化时并发上限加一
+                if (self._successes_since_change >= self.concurrency_limit
+                        and self.concurrency_limit < self.max_concurrency
+                        and not self._latency_degraded()):
+                    self.concurrency_limit += 1
+                    self._successes_since_change = 0
+
+            self._cond.notify_all()
+
+    def _observe_latency(self, latency: float) -> None:
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        if self._latency_floor is None or self._latency_ewma < self._latency_floor:
+            self._latency_floor = self._latency_ewma
+
+    def _latency_degraded(self) -> bool:
+        if self._latency_ewma is None or not self._latency_floor:
+            return False
+        return self._latency_ewma > self._latency_floor * self.latency_tolerance
+
+    @staticmethod
+    def retry_after_from_error(error: Exception) -> Optional[float]:
+        """
+        从API异常附带的HTTP响应头中读取重试等待时间。
+
+        参数:
+            error: API调用抛出的异常
+
+        返回:
+            建议等待的秒数，没有提示时返回None
+        """
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if not headers:
+            return None
+
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000.0
+            except ValueError:
+                pass
+
+        retry_after = headers.get('retry-after')
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def is_rate_limit_error(error: Exception) -> bool:
+        """判断异常是否为HTTP 429限流错误。"""
+        if getattr(error, 'status_code', None) == 429:
+            return True
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None) == 429
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回限流器统计信息。
+
+        返回:
+            包含请求数、限流次数和当前并发上限的字典
+        """
+        with self._cond:
+            return {
+                "requests": self.request_count,
+                "throttled": self.throttled_count,
+                "concurrency_limit": self.concurrency_limit,
+                "max_concurrency": self.max_concurrency,
+                "latency_ewma": round(self._latency_ewma, 3) if self._latency_ewma is not None else None
+            }
@@ -0,0 +1,236 @@
+# src/utils/run_manifest.py
+"""
+增量运行清单。
+记录每个输入文件的内容哈希、大小、修改时间、分块大小、提示词哈希和处理状态，
+使重新运行时可以跳过未变化且已完成的文件，并从已完成的文本块处继续处理中断的文件。
+批处理模式下还记录每个已提交批处理的ID和状态，运行中断或出错时仍可以找到已经计费的批处理。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+# 部分文本块重试后仍然失败的文件，下次运行时只重新处理失败的文本块
+STATUS_PARTIAL = "partial"
+# token预算用完时未处理完的文件，下次运行时从已完成的文本块处继续
+STATUS_BUDGET_EXHAUSTED = "budget_exhausted"
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    计算文件内容的SHA-256哈希。
+
+    参数:
+        file_path: 文件路径
+        block_size: 每次读取的字节数
+
+    返回:
+        文件内容的十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """返回文本的SHA-256十六进制摘要。"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class RunManifest:
+    MANIFEST_NAME = "manifest.json"
+    PROGRESS_DIR = ".progress"
+
+    def __init__(self, output_dir: str):
+        """
+        加载（或新建）输出目录下的运行清单。
+
+        参数:
+            output_dir: 输出根目录，清单保存为其中的manifest.json
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.MANIFEST_NAME)
+        self.progress_dir = os.path.join(output_dir, self.PROGRESS_DIR)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # 批处理ID -> 状态、请求数等
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = data.get("files", {})
+                self.batches = data.get("batches", {})
+            except (IOError, ValueError, AttributeError):
+                # 清单损坏时重新开始，已写出的结果文件不受影响
+                self.entries = {}
+                self.batches = {}
+
+    def fingerprint(self, file_path: str, rel_path: str) -> Dict[str, Any]:
+        """
+        计算文件指纹。大小和修改时间与清单记录一致时复用已记录的内容哈希，避免重复读取大文件。
+
+        参数:
+            file_path: 文件绝对路径
+            rel_path: 文件相对路径（清单中的键）
+
+        返回:
+            包含content_hash、size和mtime的字典
+        """
+        stat = os.stat(file_path)
+        entry = self.entries.get(rel_path)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime and entry.get("content_hash"):
+            content_hash = entry["content_hash"]
+        else:
+            content_hash = hash_file(file_path)
+        return {"content_hash": content_hash, "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def _matches(self, entry: Dict[str, Any], fingerprint: Dict[str, Any], settings: Dict[str, Any]) -> bool:
+        """判断清单记录是否与当前文件内容和处理参数一致。"""
+        if entry.get("content_hash") != fingerprint["content_hash"]:
+            return False
+        return all(entry.get(key) == value for key, value in settings.items())
+
+    def is_completed(self, rel_path: str, fingerprint: Dict[str, Any], settings: Dict[str, Any]) -> bool:
+        """
+        判断文件是否在相同内容和参数下已经处理完成，且输出文件仍然存在。
+
+        参数:
+            rel_path: 文件相对路径
+            fingerprint: fingerprint()返回的文件指纹
+            settings: 影响结果的处理参数（如chunk_size、prompt_hash、model）
+
+        返回:
+            可以跳过时返回True
+        """
+        entry = self.entries.get(rel_path)
+        if not entry or entry.get("status") != STATUS_COMPLETED or not self._matches(entry, fingerprint, settings):
+            return False
+        output_file = entry.get("output_file")
+        return not output_file or os.path.exists(output_file)
+
+    def start(self, rel_path: str, fingerprint: Dict[str, Any], settings: Dict[str, Any],
+              resume: bool = True) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        标记文件开始处理，并返回上次中断时已完成的文本块结果。
+        文件内容或处理参数发生变化时丢弃旧的进度。
+
+        参数:
+            rel_path: 文件相对路径
+            fingerprint: 文件指纹
+            settings: 处理参数
+            resume: 为False时总是丢弃旧的进度，从头处理
+
+        返回:
+            字典，键为已完成的文本块序号，值为该块的问答对列表
+        """
+        entry = self.entries.get(rel_path)
+        progress_path = self._progress_path(rel_path)
+        completed_chunks: Dict[int, List[Dict[str, Any]]] = {}
+
+        if resume and entry and entry.get("status") != STATUS_COMPLETED and self._matches(entry, fingerprint, settings):
+            completed_chunks = self._load_progress(progress_path)
+        elif os.path.exists(progress_path):
+            os.remove(progress_path)
+
+        with self._lock:
+            new_entry = dict(fingerprint)
+            new_entry.update(settings)
+            new_entry.update({
+                "status": STATUS_IN_PROGRESS,
+                "chunks_done": len(completed_chunks),
+                "updated_at": time.time()
+            })
+            self.entries[rel_path] = new_entry
+            self._save()
+        return completed_chunks
+
+    def record_chunk(self, rel_path: str, chunk_index: int, qa_pairs: List[Dict[str, Any]]) -> None:
+        """
+        追加一个已完成文本块的结果到进度文件。可在多个线程中调用。
+
+        参数:
+            rel_path: 文件相对路径
+            chunk_index: 文本块序号
+            qa_pairs: 该文本块生成的问答对
+        """
+        line = json.dumps({"chunk_index": chunk_index, "qa_pairs": qa_pairs}, ensure_ascii=False)
+        with self._lock:
+            os.makedirs(self.progress_dir, exist_ok=True)
+            with open(self._progress_path(rel_path), 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+            entry = self.entries.get(rel_path)
+            if entry is not None:
+                entry["chunks_done"] = entry.get("chunks_done", 0) + 1
+
+    def finish(self, rel_path: str, status: str = STATUS_COMPLETED, **fields: Any) -> None:
+        """
+        记录文件的最终状态，完成时删除进度文件。
+
+        参数:
+            rel_path: 文件相对路径
+            status: 最终状态（completed、failed、partial或budget_exhausted）
+            fields: 需要一并记录的字段，如output_file、chunks_total、qa_pairs
+        """
+        with self._lock:
+            entry = self.entries.setdefault(rel_path, {})
+            entry.update(fields)
+            entry["status"] = status
+            entry["updated_at"] = time.time()
+            self._save()
+        if status == STATUS_COMPLETED:
+            progress_path = self._progress_path(rel_path)
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
+
+    def record_batch(self, batch_id: str, fields: Dict[str, Any]) -> None:
+        """
+        记录批处理的状态并立即写出清单。批处理创建后马上调用，使之后出错或中断时仍保留它的ID。
+
+        参数:
+            batch_id: 批处理ID
+            fields: 需要记录的字段，如status、requests、answered
+        """
+        with self._lock:
+            entry = self.batches.setdefault(batch_id, {"created_at": time.time()})
+            entry.update(fields)
+            entry["updated_at"] = time.time()
+            self._save()
+
+    def get(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """返回文件在清单中的记录。"""
+        return self.entries.get(rel_path)
+
+    def _progress_path(self, rel_path: str) -> str:
+        return os.path.join(self.progress_dir, f"{hash_text(rel_path)[:32]}.jsonl")
+
+    def _load_progress(self, progress_path: str) -> Dict[int, List[Dict[str, Any]]]:
+        """读取进度文件，忽略崩溃时可能写了一半的最后一行。"""
+        completed_chunks: Dict[int, List[Dict[str, Any]]] = {}
+        if not os.path.exists(progress_path):
+            return completed_chunks
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                completed_chunks[int(record["chunk_index"])] = record.get("qa_pairs", [])
+        return completed_chunks
+
+    def _save(self) -> None:
+        """原子地写出清单文件。调用方需持有锁。"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "files": self.entries, "batches": self.batches}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,80 @@
+# src/utils/text_quality.py
+"""
+提取文本的乱码检测。
+对文本（较长时只取均匀分布的若干采样窗口）统计各类字符的数量并计算比例，
+每次调用的开销与文本总长度基本无关，可以逐页调用。
+"""
+
+import re
+from typing import Dict
+
+# 超过该字符数的文本只检测SAMPLE_WINDOWS个均匀分布的窗口，总采样长度为该值
+SAMPLE_CHARS = 16000
+SAMPLE_WINDOWS = 8
+
+# 判定阈值：含中文的文本中文比例过低或空白/替换符比例过高时为乱码，不含中文的文本非ASCII比例过高时为乱码
+MIN_CHINESE_RATIO = 0.2
+MAX_SYMBOL_RATIO = 0.3
+MAX_NON_ASCII_RATIO = 0.3
+
+_CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_NON_CHINESE_PATTERN = re.compile(r'[^\u4e00-\u9fff]+')
+_NON_SYMBOL_PATTERN = re.compile(r'[^\u0000-\u0020\u3000\uFFFD]+')
+
+
+def stratified_sample(text: str, sample_chars: int = SAMPLE_CHARS, windows: int = SAMPLE_WINDOWS) -> str:
+    """
+    从文本中均匀选取windows个窗口拼接为采样，文本不长于sample_chars时原样返回。
+
+    参数:
+        text: 待采样的文本
+        sample_chars: 采样的总字符数
+        windows: 窗口数
+
+    返回:
+        采样文本
+    """
+    if len(text) <= sample_chars:
+        return text
+    window = sample_chars // windows
+    stride = len(text) / windows
+    return "".join(text[int(i * stride):int(i * stride) + window] for i in range(windows))
+
+
+def char_class_counts(text: str) -> Dict[str, int]:
+    """
+    统计文本中各字符类别的数量。每个类别都在C层完成一次扫描（删除其他字符后取长度），
+    不在Python中逐字符循环。
+
+    参数:
+        text: 待统计的文本
+
+    返回:
+        字典，包含total（总字符数）、chinese（CJK统一汉字）、symbol（控制字符、空格、全角空格和替换符）和non_ascii
+    """
+    return {
+        "total": len(text),
+        "chinese": len(_NON_CHINESE_PATTERN.sub('', text)),
+        "symbol": len(_NON_SYMBOL_PATTERN.sub('', text)),
+        "non_ascii": len(text) - len(text.encode('ascii', 'ignore'))
+    }
+
+
+def is_garbled(text: str, sample_chars: int = SAMPLE_CHARS) -> bool:
+    """
+    判断提取的文本是否乱码，长文本按分层采样估计各类字符比例。
+
+    参数:
+        text: 待检测的文本，可以是整篇文档，也可以是单页
+        sample_chars: 采样的总字符数
+
+    返回:
+        是否为乱码
+    """
+    # 是否含中文决定使用哪条规则，用整篇文本判断，找到第一个汉字即停止扫描
+    has_chinese = _CHINESE_PATTERN.search(text) is not None
+    counts = char_class_counts(stratified_sample(text, sample_chars))
+    total = max(counts["total"], 1)
+    if has_chinese:
+        return counts["chinese"] / total < MIN_CHINESE_RATIO or counts["symbol"] / total > MAX_SYMBOL_RATIO
+    return counts["non_ascii"] / total > MAX_NON_ASCII_RATIO
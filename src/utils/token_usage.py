@@ -0,0 +1,125 @@
+# src/utils/token_usage.py
+"""
+大模型token用量统计与预算。
+按请求记录提示词、输出和缓存命中的token数，并归集到文档和文本块；
+合并请求的用量在其包含的文本块之间平均分摊。可选的预算用于在用量达到上限后停止调度新的请求。
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _empty_entry() -> Dict[str, int]:
+    entry = {"requests": 0}
+    entry.update((field, 0) for field in USAGE_FIELDS)
+    return entry
+
+
+def _split(value: int, parts: int) -> List[int]:
+    """把value尽量平均地拆成parts份，余数分给前面几份，各份之和等于value。"""
+    base, remainder = divmod(value, parts)
+    return [base + (1 if i < remainder else 0) for i in range(parts)]
+
+
+class TokenUsage:
+    def __init__(self, budget: Optional[int] = None):
+        """
+        初始化token用量统计。
+
+        参数:
+            budget: 可选的token预算（提示词与输出token之和），为None时不限制
+        """
+        self.budget = budget
+        self.chunks_skipped = 0
+        self._lock = threading.Lock()
+        self._totals = _empty_entry()
+        self._documents: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, usage: Dict[str, int], targets: Sequence[Tuple[str, Optional[int]]]) -> None:
+        """
+        记录一次请求的token用量。可在多个线程中调用。
+
+        参数:
+            usage: 包含prompt_tokens、completion_tokens和cached_tokens的字典
+            targets: 本次请求包含的(文档标识, 文本块序号)列表，文本块序号未知时为None；
+                    用量在这些文本块之间平均分摊，再汇总到各自的文档
+        """
+        targets = list(targets) or [("", None)]
+        shares = {field: _split(int(usage.get(field) or 0), len(targets)) for field in USAGE_FIELDS}
+        with self._lock:
+            self._totals["requests"] += 1
+            for field in USAGE_FIELDS:
+                self._totals[field] += sum(shares[field])
+            counted_documents = set()
+            for position, (document, chunk_index) in enumerate(targets):
+                document_entry = self._document_entry(document)
+                for field in USAGE_FIELDS:
+                    document_entry[field] += shares[field][position]
+                if document not in counted_documents:
+                    counted_documents.add(document)
+                    document_entry["requests"] += 1
+                if chunk_index is not None:
+                    chunk_entry = document_entry["chunks"].setdefault(chunk_index, _empty_entry())
+                    chunk_entry["requests"] += 1
+                    for field in USAGE_FIELDS:
+                        chunk_entry[field] += shares[field][position]
+
+    def skip(self, document: str, count: int) -> None:
+        """记录因预算用完而没有调度的文本块数。"""
+        with self._lock:
+            self.chunks_skipped += count
+            self._document_entry(document)["chunks_skipped"] += count
+
+    @property
+    def total_tokens(self) -> int:
+        """本次运行已使用的提示词与输出token之和。"""
+        with self._lock:
+            return self._totals["prompt_tokens"] + self._totals["completion_tokens"]
+
+    def remaining(self) -> Optional[int]:
+        """返回剩余的token预算，未设置预算时返回None。"""
+        if self.budget is None:
+            return None
+        return max(self.budget - self.total_tokens, 0)
+
+    @property
+    def exhausted(self) -> bool:
+        """预算是否已经用完。"""
+        return self.budget is not None and self.total_tokens >= self.budget
+
+    def document(self, document: str) -> Dict[str, Any]:
+        """
+        返回某个文档的token用量。
+
+        参数:
+            document: 文档标识
+
+        返回:
+            字典，包含requests、各类token数、chunks_skipped，以及chunks（文本块序号到该块用量的映射）
+        """
+        with self._lock:
+            entry = self._documents.get(document)
+            if entry is None:
+                return dict(_empty_entry(), chunks_skipped=0, chunks={})
+            result = dict(entry)
+            result["chunks"] = {index: dict(chunk) for index, chunk in sorted(entry["chunks"].items())}
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """返回本次运行的请求数、各类token总数、预算和跳过的文本块数。"""
+        with self._lock:
+            result = dict(self._totals)
+            result["total_tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+            result["budget"] = self.budget
+            result["chunks_skipped"] = self.chunks_skipped
+            return result
+
+    def _document_entry(self, document: str) -> Dict[str, Any]:
+        """返回文档的用量记录，不存在时创建。调用方需持有锁。"""
+        entry = self._documents.get(document)
+        if entry is None:
+            entry = dict(_empty_entry(), chunks_skipped=0, chunks={})
+            self._documents[document] = entry
+        return entry
@@ -0,0 +1,119 @@
+# src/utils/tokenizer.py
+"""
+本地token计数工具。
+安装了tiktoken时使用其编码器精确计数；否则按中日韩字符约1个token、
+其他字符约4个字符1个token进行估算，保证在没有额外依赖时也能按token预算分块。
+"""
+
+import math
+import re
+from typing import List, Optional
+
+# 常见模型的上下文窗口（token数），按模型名前缀匹配
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4.1": 1000000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "deepseek-chat": 64000,
+    "deepseek-reasoner": 64000,
+    "qwen-long": 1000000,
+    "qwen-max": 32768,
+    "qwen-plus": 131072,
+    "qwen-turbo": 131072,
+    "glm-4": 128000,
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 32768
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """按需加载tiktoken编码器，未安装时返回None。"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本的token数。
+
+    参数:
+        text: 输入文本
+
+    返回:
+        token数（未安装tiktoken时为估算值）
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk_count = len(text) - len(_CJK_PATTERN.sub('', text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+def split_text_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    将文本硬切分为不超过max_tokens的片段，用于无法按句子切分的超长文本。
+
+    参数:
+        text: 输入文本
+        max_tokens: 每个片段的最大token数
+
+    返回:
+        文本片段列表
+    """
+    max_tokens = max(1, max_tokens)
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+    pieces = []
+    start = 0
+    while start < len(text):
+        remaining = text[start:]
+        # 按剩余文本的平均字符/token比例估算窗口，再向下收缩到预算以内
+        ratio = len(remaining) / max(count_tokens(remaining), 1)
+        end = min(len(text), start + max(1, int(max_tokens * ratio)))
+        while end - start > 1 and count_tokens(text[start:end]) > max_tokens:
+            end = start + max(1, int((end - start) * 0.9))
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+def context_window_for(model_name: Optional[str], default: int = DEFAULT_CONTEXT_WINDOW) -> int:
+    """
+    根据模型名称返回上下文窗口大小，未知模型返回默认值。
+
+    参数:
+        model_name: 模型名称
+        default: 未知模型的默认上下文窗口
+
+    返回:
+        上下文窗口的token数
+    """
+    if not model_name:
+        return default
+    name = model_name.lower()
+    # 优先匹配最长的前缀，避免 gpt-4o 被 gpt-4 匹配
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if name.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return default